@@ -0,0 +1,217 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mlvc.MLVC import MLVC
+
+
+class AsyncRun(object):
+    """
+    Awaitable handle of a run created by AsyncMLVC.create_run. File, database
+    and log writes run on AsyncMLVC's executor. log / log_metric calls stay on
+    the event loop only when they cannot block: `async_logging` with the
+    "drop" queue full policies and no columnar metric store, which flushes to
+    disk.
+    """
+
+    def __init__(self, async_mlvc, run):
+        self.async_mlvc = async_mlvc
+        self.run = run
+        self.run_id = run.run_id
+
+    def offload(self, fn, *args, **kwargs):
+        return self.async_mlvc.offload(fn, *args, **kwargs)
+
+    def logs_without_blocking(self):
+        settings = self.run.settings
+        live_streamer = self.run.live_streamer
+        return (settings["async_logging"] and settings["log_queue_full_policy"] == "drop"
+                and self.run.metric_store is None
+                and (live_streamer is None or live_streamer.full_policy == "drop"))
+
+    async def call_log(self, fn, *args):
+        if self.logs_without_blocking():
+            return fn(*args)
+        return await self.offload(fn, *args)
+
+    # ******************** Add Data ******************** #
+    async def add_annotation(self, ann_input, ann_input_type):
+        await self.offload(self.run.add_annotation, ann_input, ann_input_type)
+
+    async def add_code_file(self, file_path):
+        await self.offload(self.run.add_code_file, file_path)
+
+    async def add_config(self, config_input):
+        await self.offload(self.run.add_config, config_input)
+
+    async def add_result(self, result_obj):
+        await self.offload(self.run.add_result, result_obj)
+
+    async def add_artifact(self, file_path, name=None, artifact_type="file", step=None, metadata=None, link=False):
+        """
+        Returns an asyncio future of the artifact record once placing it has started, see Run.add_artifact.
+        """
+        future = await self.offload(self.run.add_artifact, file_path, name, artifact_type, step, metadata, link)
+        return asyncio.wrap_future(future)
+
+    # ******************** Add Logs ******************** #
+    async def log(self, line):
+        await self.call_log(self.run.log, line)
+
+    async def log_metric(self, metric_input, step=None):
+        await self.call_log(self.run.log_metric, metric_input, step)
+
+    async def log_metrics_batch(self, metrics, steps=None):
+        # Summaries of whole columns are CPU work, always off the event loop
+        return await self.offload(self.run.log_metrics_batch, metrics, steps)
+
+    async def log_distribution(self, metric_input, step=None, bins=None):
+        # Histograms of large arrays are CPU work, always off the event loop
+        return await self.offload(self.run.log_distribution, metric_input, step, bins)
+
+    def get_metric_summary(self):
+        return self.run.get_metric_summary()
+
+    # ******************** Profiling ******************** #
+    def timer(self, name):
+        return self.run.timer(name)
+
+    def step(self, num_samples=None):
+        self.run.step(num_samples)
+
+    # ******************** Commit ******************** #
+    async def commit(self, enqueue_upload=False):
+        await self.offload(self.run.commit, enqueue_upload)
+
+    async def upload(self, progress_callback=None):
+        await self.async_mlvc.upload(self.run_id, progress_callback)
+
+    async def get_doc(self):
+        return await self.offload(self.run.get_doc)
+
+
+class AsyncMLVC(object):
+    """
+    asyncio façade of MLVC for services driving many runs from one event
+    loop. Blocking work (run setup, file copies, database writes, commits)
+    runs on a thread pool of `async_io_workers` threads, uploads go through
+    AsyncMLVCApi on aiohttp when it is installed and through the blocking
+    MLVC.upload on the pool otherwise. Runs are independent AsyncRun handles,
+    there is no current run.
+    """
+
+    def __init__(self, mlvc=None, executor=None):
+        self.mlvc = mlvc or MLVC()
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=self.mlvc.settings["async_io_workers"],
+                                                       thread_name_prefix="mlvc-async")
+        self.api = None
+        self.api_lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def offload(self, fn, *args, **kwargs):
+        return asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def get_api(self):
+        """
+        AsyncMLVCApi, None when aiohttp is not installed.
+        """
+        with self.api_lock:
+            if self.api is None:
+                try:
+                    from mlvc.mlvc_async_api import AsyncMLVCApi
+                except ImportError:
+                    return None
+                self.api = AsyncMLVCApi(self.mlvc.settings)
+            return self.api
+
+    def set_params(self, project_id, model_id):
+        self.mlvc.set_params(project_id, model_id)
+
+    def set_settings(self, **kwargs):
+        self.mlvc.set_settings(**kwargs)
+
+    # ******************** Runs ******************** #
+    async def create_run(self, name="", description="", run_id=None, capture_output=False):
+        """
+        Runs of a service do not own its stdout / stderr, capture_output=True opts in as in MLVC.create_run.
+        """
+        run = await self.offload(self.mlvc.create_run, name, description, run_id, capture_output)
+        return AsyncRun(self, run)
+
+    async def get_run(self, run_id):
+        return await self.offload(self.mlvc.get_run, run_id)
+
+    async def commit(self, run_id, enqueue_upload=False):
+        await self.offload(self.mlvc.commit, run_id, enqueue_upload)
+
+    # ******************** Upload ******************** #
+    # Status checks, packaging and manifests are MLVC's upload steps, only the API calls are async here
+    async def upload(self, run_id, progress_callback=None):
+        """
+        Async MLVC.upload / MLVC.sync, following the `upload_mode` setting.
+        """
+        api = await self.offload(self.get_api)
+        if api is None:
+            return await self.offload(self.mlvc.upload, run_id, progress_callback)
+        if self.mlvc.settings["upload_mode"] == "sync":
+            return await self.sync(run_id)
+        run_id, run_doc, run_zip_file_path = await self.offload(self.mlvc.prepare_upload, run_id)
+        project_id = run_doc["project_id"]
+        model_id = run_doc["model_id"]
+
+        remote_run_id = await self.ensure_remote_run(run_id, run_doc)
+        if run_zip_file_path is None:
+            chunks = self.iter_in_executor(self.mlvc.iter_upload_chunks(run_doc))
+            await api.upload_run_stream(project_id, model_id, remote_run_id, chunks, progress_callback)
+        else:
+            await api.upload_run_files(project_id, model_id, remote_run_id, run_zip_file_path)
+
+        await self.offload(self.mlvc.mark_uploaded, run_id)
+
+    async def sync(self, run_id):
+        api = await self.offload(self.get_api)
+        if api is None:
+            return await self.offload(self.mlvc.sync, run_id)
+        run_id, run_doc, manifest = await self.offload(self.mlvc.prepare_sync, run_id)
+        remote_run_id = await self.ensure_remote_run(run_id, run_doc)
+        await api.sync_run_files(run_doc["project_id"], run_doc["model_id"], remote_run_id, manifest,
+                                 lambda rel_paths: self.offload(self.mlvc.make_sync_archive, run_id, run_doc,
+                                                                manifest, rel_paths))
+        await self.offload(self.mlvc.mark_uploaded, run_id)
+
+    async def ensure_remote_run(self, run_id, run_doc):
+        """
+        MLVC.ensure_remote_run with the final document of an upload.
+        """
+        api = self.get_api()
+        remote_run_id = run_doc["remote_run_id"]
+        if not remote_run_id:
+            remote_run_id = await api.create_run(run_doc["project_id"], run_doc["model_id"], run_doc)
+            await self.offload(self.mlvc.set_remote_run_id, run_id, run_doc, remote_run_id)
+        else:
+            await api.update_run(run_doc["project_id"], run_doc["model_id"], remote_run_id, run_doc)
+        return remote_run_id
+
+    async def iter_in_executor(self, iterator):
+        """
+        Async iterator over a blocking iterator, every item is produced on the executor.
+        """
+        done = object()
+        while True:
+            item = await self.offload(next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    async def close(self):
+        if self.api is not None:
+            await self.api.close()
+        if self.own_executor:
+            self.executor.shutdown(wait=False)
@@ -1,136 +1,243 @@
-import json
-import sys
 import os
 import time
+import threading
 from shutil import copyfile
 from secrets import token_hex
-import logging
 
 from mlvc.base import MLVCBase
-from mlvc.utils.gen_utils import write_json_to_file, read_lines_from_file, make_tarfile, make_dir_if_not_exist
-from mlvc.utils.log_helper import StdoutLogger, make_logger, remove_logger
+from mlvc.run import Run
+from mlvc.utils.gen_utils import write_json_to_file, read_json_from_file, make_dir_if_not_exist
+from mlvc.utils.archive_utils import iter_tar_gz_chunks, make_archive, make_files_archive
+from mlvc.storage.manifest import build_manifest, filter_needed_paths
+from mlvc.storage.file_copy import hash_file
+from mlvc.config.settings import update_settings
 
-from mlvc.modules.git.gitutils import GITUtils
-from mlvc.modules.system.system_stats import SystemStats
+from mlvc.modules.metrics.metric_summary import MetricSummary
+from mlvc.modules.metrics.metric_store import ColumnarMetricStore
+from mlvc.modules.annotations import columnar
+from mlvc.modules.profiler.profiler import PhaseTimer
+from mlvc.modules.distributed.shards import get_rank_info, resolve_run_id
 
 
 class MLVC(MLVCBase):
 
     def __init__(self):
         super(MLVC, self).__init__()
-        self.git_utils = GITUtils()
 
     def set_params(self, project_id, model_id):
         self.project_id = project_id
         self.model_id = model_id
 
-    def create_run(self, name="", description=""):
+    def set_settings(self, **kwargs):
+        update_settings(self.settings, kwargs)
+
+    def create_run(self, name="", description="", run_id=None, capture_output=True):
+        """
+        Creates a run and returns its Run handle, which also becomes the current
+        run used by the methods of this class when no run_id is given. Several
+        runs can be active at the same time.
+
+        stdout / stderr belong to the process, so only one run captures them
+        (following the `output_capture` setting): the first active run created
+        with capture_output=True. Runs created while it is active do not
+        capture, and a run created after it is committed captures again.
+
+        Under a distributed launcher (RANK / WORLD_SIZE set) rank 0 creates the
+        run and the other ranks attach to it, each rank writing its logs,
+        metrics and system stats to its own shard under ranks/<rank>/. Shards
+        reach rank 0 through torch.distributed or torchrun's store when
+        available, otherwise ~/.mlvc must be on a filesystem shared by the ranks.
+        """
         self.check_project_init()
         # Create run id and folder
-        self.run_id = token_hex(16)
-        self.run_dir = os.path.join(self.mlvc_dir, self.run_id)
-        make_dir_if_not_exist(self.run_dir)
-
-        # Collect Git details
-        git_folder = os.path.join(self.run_dir, "git")
-        make_dir_if_not_exist(git_folder)
-        repo_details = self.git_utils.get_repo_details()
-        git_diff_file_name = "code_diff.patch"
-        self.git_utils.write_diff(os.path.join(git_folder, git_diff_file_name))
-        repo_details["diff_file_name"] = git_diff_file_name
-
-        # Make loggers
-        log_details = self.init_loggers()
-
-        # Start system stats thread
-        self.system_stats_thread = SystemStats(self.system_stats_logger)
-        self.system_stats_thread.start()
-
-        # Build run object
-        run = {
-            "project_id": self.project_id,
-            "model_id": self.model_id,
-            "run_id": self.run_id,
-            "remote_run_id": "",
-            "name": name,
-            "description": description,
-            "run_dir": self.run_dir,
-
-            "system_info": self.system_stats_thread.get_system_info(),
-
-            "ann": {},
-
-             "code": {
-                "git": repo_details,
-                "files": []
-            },
-
-            "config": {},
-
-            "model": {},
-
-            "logs": log_details,
-            
-            "results": {},
-
-            "artifacts": {},
-
-            "extra_info": {},
-            "status": "draft",
-
-            "created_at": time.time(),
-        }
-        self.mlvc_db.insert_run(run)
+        rank, world_size = get_rank_info()
+        if run_id is None and world_size > 1:
+            run_id = resolve_run_id(rank, self.mlvc_dir, self.settings["distributed_rendezvous_timeout"])
+        run = Run(self, run_id or token_hex(16), rank, world_size)
+        with self.runs_lock:
+            if run.run_id in self.runs:
+                raise Exception("MLVC run {} already active".format(run.run_id))
+            # stdout / stderr belong to the process, the first active run captures them
+            capture_output = capture_output and self.output_capture_run is None
+            if capture_output:
+                self.output_capture_run = run
+            self.runs[run.run_id] = run
+        try:
+            run.start(name, description, capture_output)
+        except Exception:
+            self.deactivate_run(run)
+            raise
+        self.current_run = run
+        return run
+
+    def get_active_run(self, run_id=None):
+        if run_id is None:
+            return self.current_run
+        return self.runs.get(run_id)
+
+    def acquire_system_stats(self):
+        """
+        The system stats sampler shared by the active runs, started with the first of them.
+        """
+        from mlvc.modules.system.system_stats import SystemStats
+        with self.runs_lock:
+            if self.system_stats is None:
+                self.system_stats = SystemStats(interval=self.settings["system_stats_interval"],
+                                                buffer_size=self.settings["system_stats_buffer_size"],
+                                                flush_every=self.settings["system_stats_flush_every"],
+                                                downsample=self.settings["system_stats_downsample"],
+                                                max_overhead=self.settings["system_stats_max_overhead"],
+                                                process_metrics=self.settings["system_stats_process_metrics"])
+                self.system_stats.start()
+            return self.system_stats
+
+    def deactivate_run(self, run):
+        """
+        Forgets a finished run and its loggers, the system stats sampler stops with the last
+        active run. A committed run stays the current run, e.g. for upload().
+        """
+        run.forget_loggers()
+        system_stats = None
+        with self.runs_lock:
+            self.runs.pop(run.run_id, None)
+            if self.output_capture_run is run:
+                self.output_capture_run = None
+            if not self.runs:
+                system_stats, self.system_stats = self.system_stats, None
+        if system_stats is not None:
+            system_stats.stop()
+
+    def is_primary_rank(self, run_id=None):
+        """
+        False for ranks other than 0 of an active distributed run, which do not write the run document.
+        """
+        run = self.get_active_run(run_id)
+        return run is None or run.is_primary_rank()
 
     # ******************** Add Data ******************** #
     def add_annotation(self, ann_input, ann_input_type, run_id=None):
+        """
+        Stores the run's annotations. `ann_input_type` is one of "json",
+        "json_file", "csv_file", "dataframe" (written as `dataframe_ann_format`),
+        "arrow" (pyarrow Table / RecordBatch), "numpy" (array), "parquet_file",
+        "arrow_file" or "npy_file". Columnar files are described in the run
+        document by row count and schema, read from their footer / header.
+        """
+        if not self.is_primary_rank(run_id):
+            return
         run_id, run_doc = self.get_run(run_id)
         run_dir = run_doc["run_dir"]
         
         ann_folder = os.path.join(run_dir, "ann")
         make_dir_if_not_exist(ann_folder)
 
-        if ann_input_type == "json_file":
-            ann_file_name = "data.json"
-            ann_file_path = os.path.join(ann_folder, ann_file_name)
-            copyfile(ann_input, ann_file_path)
-        if ann_input_type == "json":
-            ann_file_name = "data.json"
-            ann_file_path = os.path.join(ann_folder, ann_file_name)
-            write_json_to_file(ann_input, ann_file_path)
-        elif ann_input_type == "csv_file":
-            ann_file_name = "data.csv"
-            ann_file_path = os.path.join(ann_folder, ann_file_name)
-            copyfile(ann_input, ann_file_path)
+        file_types = {"json_file": "json", "csv_file": "csv", "parquet_file": "parquet", "arrow_file": "arrow",
+                      "npy_file": "npy"}
+        digest = None
+        if ann_input_type in file_types:
+            ann_format = file_types[ann_input_type]
+            ann_file_name = columnar.FILE_NAMES[ann_format]
+            digest = self.place_file(ann_input, run_id, run_dir, os.path.join("ann", ann_file_name))
+        elif ann_input_type == "json":
+            ann_format = "json"
+            ann_file_name = columnar.FILE_NAMES[ann_format]
+            write_json_to_file(ann_input, os.path.join(ann_folder, ann_file_name))
         elif ann_input_type == "dataframe":
-            ann_file_name = "data.csv"
+            ann_format = self.settings["dataframe_ann_format"]
+            ann_file_name = columnar.FILE_NAMES[ann_format]
             ann_file_path = os.path.join(ann_folder, ann_file_name)
-            ann_input.to_csv(ann_file_path)
+            if ann_format == "arrow":
+                columnar.write_arrow(ann_input, ann_file_path)
+            elif ann_format == "parquet":
+                columnar.write_parquet(ann_input, ann_file_path)
+            else:
+                ann_input.to_csv(ann_file_path)
+        elif ann_input_type == "arrow":
+            ann_format = "arrow"
+            ann_file_name = columnar.FILE_NAMES[ann_format]
+            columnar.write_arrow(ann_input, os.path.join(ann_folder, ann_file_name))
+        elif ann_input_type == "numpy":
+            ann_format = "npy"
+            ann_file_name = columnar.FILE_NAMES[ann_format]
+            columnar.write_npy(ann_input, os.path.join(ann_folder, ann_file_name))
         else:
             raise Exception("No proper input type mentioned")
 
+        ann_file_path = os.path.join(ann_folder, ann_file_name)
         ann_obj = {
             "type": ann_input_type,
+            "format": ann_format,
             "file_name": ann_file_name,
+            "size": os.path.getsize(ann_file_path),
+            "sha256": digest or hash_file(ann_file_path),
         }
-        self.mlvc_db.update_run(run_id, ann_obj)
+        if ann_format in ("parquet", "arrow", "npy"):
+            ann_obj.update(columnar.describe_file(ann_file_path, ann_format))
+        elif ann_input_type == "json" and isinstance(ann_input, (list, dict)):
+            ann_obj["num_rows"] = len(ann_input)
+        self.mlvc_db.update_run(run_id, {"ann": ann_obj})
+
+    def get_annotation(self, run_id=None):
+        """
+        Annotations of a run, read lazily for columnar formats (see columnar.open_file).
+        """
+        run_id, run_doc = self.get_run(run_id)
+        ann_obj = run_doc["ann"]
+        if not ann_obj:
+            return None
+        ann_file_path = os.path.join(run_doc["run_dir"], "ann", ann_obj["file_name"])
+        if ann_obj["format"] == "json":
+            return read_json_from_file(ann_file_path)
+        if ann_obj["format"] == "csv":
+            import pandas as pd
+            return pd.read_csv(ann_file_path)
+        return columnar.open_file(ann_file_path, ann_obj["format"])
 
     # ******************** Add Code ******************** #
     def add_code_file(self, file_path, run_id=None):
+        if not self.is_primary_rank(run_id):
+            return
         run_id, run_doc = self.get_run(run_id)
         run_dir = run_doc["run_dir"]
 
         file_name = os.path.basename(file_path)
         code_dir = os.path.join(run_dir, "code")
         make_dir_if_not_exist(code_dir)
-        copyfile(file_path, os.path.join(code_dir, file_name))
+        self.place_file(file_path, run_id, run_dir, os.path.join("code", file_name))
         code_files = run_doc["code"]["files"]
         code_files.append(file_name)
 
         self.mlvc_db.update_run(run_id, self.mlvc_db.set_nested(["code", "files"], code_files))
 
+    def place_file(self, src_path, run_id, run_dir, rel_path):
+        """
+        Puts a file in the run directory. With dedup_storage it goes through the
+        blob store and the run's `blobs` manifest maps `rel_path` to its hash.
+        """
+        dest_path = os.path.join(run_dir, rel_path)
+        if not self.settings["dedup_storage"]:
+            copyfile(src_path, dest_path)
+            return None
+        digest = self.blob_store.add_file(src_path, dest_path)
+        self.record_blob(run_id, rel_path, digest)
+        return digest
+
+    def record_blob(self, run_id, rel_path, digest):
+        self.mlvc_db.update_run(run_id, self.mlvc_db.set_nested(["blobs", rel_path], digest))
+
+    # ******************** Add Artifacts ******************** #
+    def add_artifact(self, file_path, name=None, artifact_type="file", step=None, metadata=None, link=False,
+                     run_id=None):
+        self.check_project_init()
+        run = self.get_active_run(run_id)
+        if run is None:
+            raise Exception("MLVC run not created")
+        return run.add_artifact(file_path, name, artifact_type, step, metadata, link)
+
     # ******************** Add Config ******************** #
     def add_config(self, config_input, run_id=None):
+        if not self.is_primary_rank(run_id):
+            return
         run_id, run_doc = self.get_run(run_id)
 
         config = run_doc["config"]
@@ -142,15 +249,73 @@ class MLVC(MLVCBase):
     def log(self, line):
         self.check_project_init()
         self.check_run_init()
-        self.run_logger.debug(line)
+        self.current_run.log(line)
 
-    def log_metric(self, metric_input):
+    def log_metric(self, metric_input, step=None):
         self.check_project_init()
         self.check_run_init()
-        self.metric_logger.debug(metric_input)
+        self.current_run.log_metric(metric_input, step)
+
+    def log_metrics_batch(self, metrics, steps=None):
+        self.check_project_init()
+        self.check_run_init()
+        return self.current_run.log_metrics_batch(metrics, steps)
+
+    def log_distribution(self, metric_input, step=None, bins=None):
+        self.check_project_init()
+        self.check_run_init()
+        return self.current_run.log_distribution(metric_input, step, bins)
+
+    def get_metric_summary(self):
+        self.check_project_init()
+        self.check_run_init()
+        return self.current_run.get_metric_summary()
+
+    def get_metric_series(self, key, run_id=None):
+        if run_id is None:
+            self.check_project_init()
+            self.check_run_init()
+        run = self.get_active_run(run_id)
+        if run is not None:
+            run.flush_metric_store()
+        run_id, run_doc = self.get_run(run_id)
+        metric_store = self.get_metric_store(run_doc)
+        if metric_store is None:
+            raise Exception("Run has no columnar metric store")
+        return metric_store.get_series(key)
+
+    @staticmethod
+    def get_metric_store(run_doc):
+        store_details = run_doc["logs"].get("metric_store")
+        if store_details is None:
+            return None
+        return ColumnarMetricStore(os.path.join(run_doc["run_dir"], store_details["dir_name"]))
+
+    # ******************** Profiling ******************** #
+    def timer(self, name):
+        """
+        Context manager / decorator timing a phase of the training loop, e.g.
+        `with mlvc.timer("data"):` or `@mlvc.timer("forward")`.
+        """
+        def get_profiler():
+            self.check_run_init()
+            return self.current_run.profiler
+        return PhaseTimer(get_profiler, name)
+
+    def step(self, num_samples=None):
+        self.check_project_init()
+        self.check_run_init()
+        self.current_run.step(num_samples)
+
+    def get_profile(self):
+        self.check_project_init()
+        self.check_run_init()
+        return self.current_run.get_profile()
 
     # ******************** Add Results ******************** #
     def add_result(self, result_obj, run_id=None):
+        if not self.is_primary_rank(run_id):
+            return
         run_id, run_doc = self.get_run(run_id)
 
         results = run_doc["results"]
@@ -160,55 +325,195 @@ class MLVC(MLVCBase):
 
     # ******************** Commit / Upload ******************** #
     @staticmethod
-    def append_final_metrics(run_doc):
-        run_dir = run_doc["run_dir"]
-        metric_logs = read_lines_from_file(os.path.join(run_dir, run_doc["logs"]["metric"]["file_name"]))
+    def append_final_metrics(run_doc, metric_summary=None):
+        if metric_summary is None:
+            # Run committed from another process, read back its metric store or stream through its metric log
+            metric_store = MLVC.get_metric_store(run_doc)
+            if metric_store is not None:
+                metric_summary = metric_store.get_summary()
+            else:
+                run_dir = run_doc["run_dir"]
+                metric_summary = MetricSummary.from_log_file(os.path.join(run_dir, run_doc["logs"]["metric"]["file_name"]))
         run_results = run_doc["results"]
-        metric_final_results = {}
-        for log in metric_logs:
-            log_json = json.loads(log)
-            for key, val in log_json["payload"].items():
-                metric_final_results[key] = val
-        for key, val in metric_final_results.items():
+        for key, val in metric_summary.get_last_values().items():
             if key not in run_results:
                 run_results[key] = val
-        return run_results
+        return run_results, metric_summary.get_summary()
 
-    def commit(self, run_id=None):
+    def commit(self, run_id=None, enqueue_upload=False):
+        run = self.get_active_run(run_id)
+        if run is not None:
+            return run.commit(enqueue_upload)
         if run_id is None:
             self.check_project_init()
             self.check_run_init()
-            # Stop system logger
-            self.system_stats_thread.stop()
-            # Remove Loggers
-            self.remove_loggers()
+        # Run started by another process
+        self.submit_run(run_id, enqueue_upload=enqueue_upload)
+
+    def submit_run(self, run_id, metric_summary=None, profile=None, ranks=None, enqueue_upload=False):
         run_id, run_doc = self.get_run(run_id)
-        
+
         # Training time
         training_time = time.time() - run_doc["created_at"]
         # Get final metric results
-        final_results = self.append_final_metrics(run_doc)
+        final_results, final_metric_summary = self.append_final_metrics(run_doc, metric_summary)
 
         # Update
-        self.mlvc_db.update_run(run_id, {"status": "submitted", "training_time": training_time, "results": final_results})
+        run_update = {"status": "submitted", "training_time": training_time, "results": final_results,
+                      "metric_summary": final_metric_summary}
+        if profile is not None:
+            run_update["profile"] = profile
+        if ranks is not None:
+            run_update["ranks"] = ranks
+        self.mlvc_db.update_run(run_id, run_update)
+        self.mlvc_db.release_run(run_id)
+
+        if enqueue_upload:
+            self.upload_queue.enqueue(run_id)
+            if self.settings["upload_in_background"]:
+                self.upload_pending(wait=False)
+
+    def upload(self, run_id=None, progress_callback=None):
+        if self.settings["upload_mode"] == "sync":
+            return self.sync(run_id)
+        run_id, run_doc, run_zip_file_path = self.prepare_upload(run_id)
+        project_id = run_doc["project_id"]
+        model_id = run_doc["model_id"]
 
-    def upload(self, run_id=None):
+        remote_run_id = self.ensure_remote_run(run_id, run_doc)
+        if run_zip_file_path is None:
+            self.mlvc_api.upload_run_stream(project_id, model_id, remote_run_id, self.iter_upload_chunks(run_doc),
+                                            progress_callback)
+        else:
+            self.mlvc_api.upload_run_files(project_id, model_id, remote_run_id, run_zip_file_path)
+
+        self.mark_uploaded(run_id)
+
+    def sync(self, run_id=None):
+        """
+        Incremental upload. The run's manifest (path, size and hash of every
+        file) is exchanged with the server and only new or changed files are
+        sent, so it can be repeated after an upload to push later changes or
+        to finish a partial upload.
+        """
+        run_id, run_doc, manifest = self.prepare_sync(run_id)
+        remote_run_id = self.ensure_remote_run(run_id, run_doc)
+        self.mlvc_api.sync_run_files(run_doc["project_id"], run_doc["model_id"], remote_run_id, manifest,
+                                     lambda rel_paths: self.make_sync_archive(run_id, run_doc, manifest, rel_paths))
+        self.mark_uploaded(run_id)
+
+    def ensure_remote_run(self, run_id, run_doc=None):
+        """
+        Remote id of the run, creating the remote run (e.g. for live streaming) if it has none yet.
+        With the final `run_doc` of an upload, an existing remote run (of an interrupted upload or
+        of live streaming) is updated with it.
+        """
+        if run_doc is None:
+            run_id, run_doc = self.get_run(run_id)
+            final = False
+        else:
+            final = True
+        remote_run_id = run_doc["remote_run_id"]
+        if not remote_run_id:
+            remote_run_id = self.mlvc_api.create_run(run_doc["project_id"], run_doc["model_id"], run_doc)
+            self.set_remote_run_id(run_id, run_doc, remote_run_id)
+        elif final:
+            self.mlvc_api.update_run(run_doc["project_id"], run_doc["model_id"], remote_run_id, run_doc)
+        return remote_run_id
+
+    # ******************** Upload Steps ******************** #
+    def prepare_upload(self, run_id):
+        """
+        Checks the run can be uploaded and packages it following `upload_mode`, the archive
+        format goes in the run document so the server can decode it.
+        Returns (run_id, run_doc, archive path), the path is None for streamed uploads.
+        """
         run_id, run_doc = self.get_run(run_id)
         if run_doc["status"] != "submitted":
             raise Exception("Run either not commited or already uploaded")
-        run_dir = run_doc["run_dir"]
-        project_id = run_doc["project_id"]
-        model_id = run_doc["model_id"]
 
-        remote_run_id = self.mlvc_api.create_run(project_id, model_id, run_doc)
+        upload_mode = self.settings["upload_mode"]
+        run_zip_file_path = None
+        if upload_mode == "stream":
+            archive_format = {"container": "tar", "codec": "gzip", "streamed": True}
+        elif upload_mode == "tarball":
+            run_zip_file_path, archive_format = make_archive(os.path.join(self.mlvc_dir, run_id), run_doc["run_dir"],
+                                                             self.settings["archive_codec"],
+                                                             self.settings["archive_compress_level"],
+                                                             self.settings["archive_workers"],
+                                                             self.settings["archive_block_size"])
+        else:
+            raise Exception("Unknown upload mode: {}".format(upload_mode))
+        run_doc["archive"] = archive_format
+        self.mlvc_db.update_run(run_id, {"archive": archive_format})
+        return run_id, run_doc, run_zip_file_path
+
+    def iter_upload_chunks(self, run_doc):
+        return iter_tar_gz_chunks(run_doc["run_dir"], self.settings["upload_chunk_size"])
+
+    def prepare_sync(self, run_id):
+        """
+        Checks the run can be synced and stores its manifest. Returns (run_id, run_doc, manifest).
+        """
+        run_id, run_doc = self.get_run(run_id)
+        if run_doc["status"] not in ("submitted", "uploaded"):
+            raise Exception("Run not commited")
+
+        manifest = build_manifest(run_doc["run_dir"], self.blob_store)
+        archive_format = {"container": "tar", "codec": "gzip", "incremental": True}
+        run_doc.update({"archive": archive_format, "manifest": manifest})
+        self.mlvc_db.update_run(run_id, {"archive": archive_format, "manifest": manifest})
+        return run_id, run_doc, manifest
+
+    def make_sync_archive(self, run_id, run_doc, manifest, needed):
+        """
+        Archive of the files requested by the server, only paths of the run's manifest are accepted.
+        """
+        sync_file_path = os.path.join(self.mlvc_dir, run_id + ".sync.tar.gz")
+        return make_files_archive(sync_file_path, run_doc["run_dir"], filter_needed_paths(needed, manifest))
+
+    def set_remote_run_id(self, run_id, run_doc, remote_run_id):
+        run_doc["remote_run_id"] = remote_run_id
         self.mlvc_db.update_run(run_id, {"remote_run_id": remote_run_id})
 
-        run_zip_file_path = os.path.join(self.mlvc_dir, run_id + ".tar.gz")
-        make_tarfile(run_zip_file_path, run_dir)
-        self.mlvc_api.upload_run_files(project_id, model_id, remote_run_id, run_zip_file_path)
-        
+    def mark_uploaded(self, run_id):
         self.mlvc_db.update_run(run_id, {"status": "uploaded"})
 
+    def upload_pending(self, max_workers=None, wait=True):
+        """
+        Drains the persistent upload queue with `max_workers` parallel uploads.
+        With wait=False the workers run on daemon threads which are returned,
+        jobs interrupted by the process exiting are picked up again later.
+        """
+        max_workers = max_workers or self.settings["upload_workers"]
+        workers = [threading.Thread(target=self.upload_worker, name="mlvc-upload-worker", daemon=True)
+                   for _ in range(max_workers)]
+        for worker in workers:
+            worker.start()
+        if wait:
+            for worker in workers:
+                worker.join()
+        return workers
+
+    def upload_worker(self):
+        while True:
+            run_id = self.upload_queue.claim()
+            if run_id is None:
+                return
+            try:
+                run_id, run_doc = self.get_run(run_id)
+                if run_doc is None:
+                    raise Exception("Run {} not found".format(run_id))
+                # Uploaded before a crash but never marked
+                if run_doc["status"] != "uploaded" or self.settings["upload_mode"] == "sync":
+                    self.upload(run_id)
+                self.upload_queue.mark_uploaded(run_id)
+            except Exception as e:
+                self.upload_queue.mark_failed(run_id, e)
+
+    def get_upload_jobs(self, state=None):
+        return self.upload_queue.get_jobs(state)
+
     # ******************** Db Queries ******************** #
     def get_run(self, run_id=None):
         if run_id is None:
@@ -221,34 +526,14 @@ class MLVC(MLVCBase):
     def get_all_runs(self):
         return self.mlvc_db.get_all_runs()
 
-    def remove_all_runs(self):
-        self.mlvc_db.remove_all_runs()
-
-    # ******************** Logging ******************** #
-    def init_loggers(self):
-        logger_details = {
-            "stdout": {"file_name": "stdout.log"},
-            "run": {"file_name": "run.log"},
-            "metric": {"file_name": "metric.log"},
-            "system": {"file_name": "system_stats.log"},
-        }
+    def query_runs(self, filters=None, sort_by=None, descending=False, limit=None, fields=None):
+        return self.mlvc_db.query_runs(filters, sort_by, descending, limit, fields)
 
-        stdout_log_file_path = os.path.join(self.run_dir, logger_details["stdout"]["file_name"])
-        run_log_file_path = os.path.join(self.run_dir, logger_details["run"]["file_name"])
-        metric_log_file_path = os.path.join(self.run_dir, logger_details["metric"]["file_name"])
-        system_log_file_path = os.path.join(self.run_dir, logger_details["system"]["file_name"])
+    def transaction(self):
+        return self.mlvc_db.transaction()
 
-        sys.stdout = StdoutLogger(stdout_log_file_path)
+    def flush(self):
+        self.mlvc_db.flush()
 
-        self.run_logger = make_logger("run", logging.DEBUG, run_log_file_path)
-        self.metric_logger = make_logger("metric", logging.DEBUG, metric_log_file_path)
-        self.system_stats_logger = make_logger("system_stats", logging.DEBUG, system_log_file_path)
-
-        return logger_details
-
-    def remove_loggers(self):
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
-        remove_logger(self.run_logger)
-        remove_logger(self.metric_logger)
-        remove_logger(self.system_stats_logger)
+    def remove_all_runs(self):
+        self.mlvc_db.remove_all_runs()
@@ -1,36 +1,104 @@
 import os
+import threading
 from os.path import expanduser
 
 from mlvc.utils.singleton import SingletonMeta
-from mlvc.mlvc_api import MLVCApi
-from mlvc.mlvc_db import MLVCDB
+from mlvc.config.settings import load_settings
 from mlvc.utils.gen_utils import read_json_from_file, make_dir_if_not_exist
 
 
 class MLVCBase(object):
+    """
+    The API client, run database, blob store, upload queue and git helper are
+    created on first use and their modules (requests, tinydb, GitPython...)
+    imported only then, so importing and constructing MLVC stays cheap for
+    scripts which never touch them.
+    """
     __metaclass__ = SingletonMeta
 
     def __init__(self):
-        self.mlvc_api = MLVCApi()
-        self.mlvc_db = MLVCDB()
-        
+        self.settings = load_settings()
+        self.components = {}
+        self.components_lock = threading.RLock()
+
         # Project Details
         self.project_id = None
         self.model_id = None
 
-        # Current Run vars
-        self.run_id = None
-        self.run_dir = None
-        self.run_logger = None
-        self.metric_logger = None
-        self.system_stats_logger = None
-        self.system_stats_thread = None
+        # Active runs, the current one is used when no run is given
+        self.runs = {}
+        self.runs_lock = threading.RLock()
+        self.current_run = None
+        self.system_stats = None
+        self.output_capture_run = None
 
         # Init functions
         user_home = expanduser("~")
         self.mlvc_dir = os.path.join(user_home, ".mlvc")
         make_dir_if_not_exist(self.mlvc_dir)
 
+    # ******************** Current Run ******************** #
+    @property
+    def run_id(self):
+        return self.current_run.run_id if self.current_run is not None else None
+
+    @property
+    def run_dir(self):
+        return self.current_run.run_dir if self.current_run is not None else None
+
+    # ******************** Lazy Components ******************** #
+    def get_component(self, name, factory):
+        component = self.components.get(name)
+        if component is None:
+            with self.components_lock:
+                component = self.components.get(name)
+                if component is None:
+                    component = self.components[name] = factory()
+        return component
+
+    @property
+    def mlvc_api(self):
+        def factory():
+            from mlvc.mlvc_api import MLVCApi
+            return MLVCApi(self.settings)
+        return self.get_component("mlvc_api", factory)
+
+    @property
+    def mlvc_db(self):
+        def factory():
+            from mlvc.mlvc_db import MLVCDB
+            return MLVCDB(self.settings)
+        return self.get_component("mlvc_db", factory)
+
+    @property
+    def blob_store(self):
+        def factory():
+            from mlvc.storage.blob_store import BlobStore
+            return BlobStore(os.path.join(self.mlvc_dir, "blobs"))
+        return self.get_component("blob_store", factory)
+
+    @property
+    def upload_queue(self):
+        def factory():
+            from mlvc.modules.upload.upload_queue import UploadQueue
+            return UploadQueue(os.path.join(self.mlvc_dir, "upload_queue.sqlite3"),
+                               self.settings["upload_max_retries"], self.settings["upload_retry_backoff"])
+        return self.get_component("upload_queue", factory)
+
+    @property
+    def io_pool(self):
+        def factory():
+            from concurrent.futures import ThreadPoolExecutor
+            return ThreadPoolExecutor(max_workers=self.settings["artifact_io_workers"], thread_name_prefix="mlvc-io")
+        return self.get_component("io_pool", factory)
+
+    @property
+    def git_utils(self):
+        def factory():
+            from mlvc.modules.git.gitutils import GITUtils
+            return GITUtils()
+        return self.get_component("git_utils", factory)
+
     def check_project_init(self):
         essentials_vars = [self.project_id, self.model_id]
         for var in essentials_vars:
@@ -38,7 +106,5 @@ class MLVCBase(object):
                 raise Exception("MLVC project not inititialised")
 
     def check_run_init(self):
-        essentials_vars = [self.run_id, self.run_dir, self.metric_logger, self.system_stats_logger, self.system_stats_thread]
-        for var in essentials_vars:
-            if var is None:
-                raise Exception("MLVC run not created")
\ No newline at end of file
+        if self.current_run is None:
+            raise Exception("MLVC run not created")
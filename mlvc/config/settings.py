@@ -0,0 +1,113 @@
+import os
+from os.path import expanduser
+
+from mlvc.utils.gen_utils import read_json_from_file
+
+
+DEFAULT_SETTINGS = {
+    # Logging
+    "async_logging": False,
+    "log_queue_size": 10000,
+    "log_flush_interval": 1.0,
+    "log_batch_size": 1000,
+    "log_queue_full_policy": "block",
+
+    # stdout / stderr capture, "python" (sys.stdout tee), "fd" (file descriptor tee, also sees C extensions and
+    # subprocesses) or "off". "python" is the default as it works everywhere (notebooks, Windows, redirected or
+    # closed fds) and leaves the process' file descriptors alone, see OutputCapture. Files rotate at
+    # output_max_bytes (0 disables), progress bar \r updates are collapsed
+    "output_capture": "python",
+    "output_max_bytes": 100 * 1024 * 1024,
+    "output_backup_count": 5,
+    "output_compress_rotated": True,
+    "output_collapse_cr": True,
+    "output_flush_interval": 1.0,
+
+    # Metrics, "json", "columnar" or "both"
+    "metric_backend": "json",
+    "metric_store_buffer_size": 4096,
+    # Histogram bins of log_distribution summaries
+    "distribution_bins": 64,
+
+    # System stats sampler
+    "system_stats_interval": 1.0,
+    "system_stats_buffer_size": 600,
+    "system_stats_flush_every": 10,
+    "system_stats_downsample": 10,
+    "system_stats_max_overhead": 0.02,
+    "system_stats_process_metrics": True,
+
+    # Git capture, runs in the background unless git_snapshot_async is off; diffs cached per worktree state
+    "git_snapshot_async": True,
+    "git_cache_size": 32,
+
+    # Distributed runs, how long other ranks wait for rank 0's run id and rank 0's commit waits for their shards
+    "distributed_rendezvous_timeout": 300.0,
+    "distributed_commit_timeout": 600.0,
+
+    # Store code files and annotations once per content under ~/.mlvc/blobs, hardlinked into runs
+    "dedup_storage": True,
+    # File format of "dataframe" annotations: "csv", or "arrow" (IPC, memory-mappable) / "parquet" with pyarrow
+    "dataframe_ann_format": "csv",
+    # Threads copying and hashing artifacts in the background
+    "artifact_io_workers": 4,
+    # Threads running the blocking work of AsyncMLVC
+    "async_io_workers": 32,
+
+    # Run database, "tinydb" or "sqlite" (read when MLVCDB is created)
+    "db_backend": "tinydb",
+    "db_write_back": True,
+    "db_flush_interval": 2.0,
+
+    # Server API
+    "api_url": None,
+    "api_timeout": [10, 120],
+    "api_retries": 5,
+    "api_backoff_factor": 0.5,
+    "api_pool_size": 10,
+
+    # Live streaming of metric and system stats records to the server while the run is training
+    "live_streaming": False,
+    "live_batch_size": 1000,
+    "live_flush_interval": 5.0,
+    "live_queue_size": 100000,
+    "live_queue_full_policy": "drop",
+    "live_spool_max_bytes": 256 * 1024 * 1024,
+    "live_stop_timeout": 30.0,
+
+    # Upload, "tarball" writes ~/.mlvc/<run_id>.tar.gz first, "stream" compresses straight into chunked requests,
+    # "sync" only sends files the server does not have yet
+    "upload_mode": "tarball",
+    "upload_chunk_size": 8 * 1024 * 1024,
+
+    # Upload queue used by commit(enqueue_upload=True) and upload_pending()
+    "upload_workers": 2,
+    "upload_max_retries": 3,
+    "upload_retry_backoff": 30.0,
+    "upload_in_background": False,
+
+    # Tarball codec, "gzip", "pgzip" (parallel gzip), "zstd", "store" or "auto" (picked per file)
+    "archive_codec": "gzip",
+    "archive_compress_level": None,
+    "archive_workers": None,
+    "archive_block_size": 4 * 1024 * 1024,
+}
+
+
+def load_settings():
+    """
+    Default settings overridden by ~/.mlvc/settings.json, if present.
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    settings_file_path = os.path.join(expanduser("~"), ".mlvc", "settings.json")
+    if os.path.exists(settings_file_path):
+        update_settings(settings, read_json_from_file(settings_file_path))
+    return settings
+
+
+def update_settings(settings, overrides):
+    for key, val in overrides.items():
+        if key not in DEFAULT_SETTINGS:
+            raise Exception("Unknown MLVC setting: {}".format(key))
+        settings[key] = val
+    return settings
@@ -1,26 +1,44 @@
 import os
-import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from os.path import expanduser
 
+from mlvc.utils import serialization
+from mlvc.storage.manifest import filter_needed_paths
 from mlvc.utils.singleton import SingletonMeta
 from mlvc.utils.gen_utils import read_json_from_file, make_dir_if_not_exist
+from mlvc.config.settings import load_settings
 
 
 class MLVCApi(object):
+    """
+    MLVC server client. Requests go through one pooled keep-alive session with
+    connect/read timeouts. Idempotent requests are retried with exponential
+    backoff on connection errors and 429/5xx responses, POSTs only when the
+    connection could not be established.
+    """
     __metaclass__ = SingletonMeta
 
     API_URL = "http://localhost:8082"
+    IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS"])
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
-    def __init__(self):
+    def __init__(self, settings=None):
         self.api_key = None
         self.api_secret = None
         self.req_header = None
+        self.session = None
 
         user_home = expanduser("~")
         self.mlvc_dir = os.path.join(user_home, ".mlvc")
         make_dir_if_not_exist(self.mlvc_dir)
+        self.settings = settings or load_settings()
+        if self.settings["api_url"]:
+            self.API_URL = self.settings["api_url"]
+        self.timeout = tuple(self.settings["api_timeout"])
         self.init_keys()
+        self.init_session()
 
     def init_keys(self):
         credentials = read_json_from_file(os.path.join(self.mlvc_dir, "credentials.json"))
@@ -31,6 +49,22 @@ class MLVCApi(object):
             "x-api-secret": self.api_secret
         }
 
+    def init_session(self):
+        retry = Retry(
+            total=self.settings["api_retries"],
+            backoff_factor=self.settings["api_backoff_factor"],
+            status_forcelist=self.RETRY_STATUS_CODES,
+            allowed_methods=self.IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.settings["api_pool_size"], max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
     def create_run(self, project_id, model_id, run_doc):
         run_basic_details = {
             "name": run_doc["name"],
@@ -39,30 +73,124 @@ class MLVCApi(object):
         res = self.post("/v1.0/project/{}/model/{}/run/".format(project_id, model_id),
              data=run_basic_details, headers=self.req_header)
         remote_run_id = res["data"]["id"]
+        self.update_run(project_id, model_id, remote_run_id, run_doc)
+
+        return remote_run_id
+
+    def update_run(self, project_id, model_id, remote_run_id, run_doc):
         self.put("/v1.0/project/{}/model/{}/run/{}".format(project_id, model_id, remote_run_id),
              data=run_doc, headers=self.req_header)
-        
-        return remote_run_id
 
     def upload_run_files(self, project_id, model_id, remote_run_id, run_zip_file_path):
         self.put("/v1.0/project/{}/model/{}/run/{}/upload".format(project_id, model_id, remote_run_id),
              file=run_zip_file_path, headers=self.req_header)
 
-    def post(self, url, data={}, headers=None, file=None):
-        files_payload = {}
-        if file is not None:
-            files_payload = {'file': open(file, 'rb')}
-        r = requests.post(self.API_URL + url, files=files_payload, json=data, headers=headers)
-        print(r.text)
-        res_json = json.loads(r.text)
-        return res_json
-
-    def put(self, url, data={}, headers=None, file=None):
-        files_payload = {}
-        if file is not None:
-            files_payload = {'file': open(file, 'rb')}
-        r = requests.put(self.API_URL + url, files=files_payload, json=data, headers=headers)
-        print(r.text)
-        res_json = json.loads(r.text)
-        return res_json
-    
+    # ******************** Incremental sync ******************** #
+    def get_needed_files(self, project_id, model_id, remote_run_id, manifest):
+        """
+        Sends the run manifest, the server answers with the paths it does not have with the same hash.
+        """
+        res = self.post("/v1.0/project/{}/model/{}/run/{}/sync/manifest".format(project_id, model_id, remote_run_id),
+             data={"manifest": manifest}, headers=self.req_header)
+        return res["data"]["needed"]
+
+    def upload_sync_files(self, project_id, model_id, remote_run_id, archive_file_path):
+        self.put("/v1.0/project/{}/model/{}/run/{}/sync/upload".format(project_id, model_id, remote_run_id),
+             file=archive_file_path, headers=self.req_header)
+
+    def sync_run_files(self, project_id, model_id, remote_run_id, manifest, make_archive_fn):
+        """
+        Manifest exchange followed by an upload of only the new or changed
+        files. `make_archive_fn(paths)` packages the given paths and returns
+        the archive path. Returns the uploaded paths.
+        """
+        # Never trust the server with local paths, only files of the manifest can be sent
+        needed = filter_needed_paths(self.get_needed_files(project_id, model_id, remote_run_id, manifest), manifest)
+        if needed:
+            archive_file_path = make_archive_fn(needed)
+            try:
+                self.upload_sync_files(project_id, model_id, remote_run_id, archive_file_path)
+            finally:
+                os.remove(archive_file_path)
+        return needed
+
+    # ******************** Streaming upload ******************** #
+    def get_upload_offset(self, project_id, model_id, remote_run_id):
+        res = self.get("/v1.0/project/{}/model/{}/run/{}/upload/status".format(project_id, model_id, remote_run_id),
+             headers=self.req_header)
+        return res["data"].get("offset", 0), res["data"].get("complete", False)
+
+    def upload_run_chunk(self, project_id, model_id, remote_run_id, offset, chunk, final):
+        headers = dict(self.req_header)
+        headers.update({
+            "Content-Type": "application/octet-stream",
+            "X-Upload-Offset": str(offset),
+            "X-Upload-Final": "1" if final else "0",
+        })
+        self.put("/v1.0/project/{}/model/{}/run/{}/upload/chunk".format(project_id, model_id, remote_run_id),
+             body=chunk, headers=headers)
+
+    def upload_run_stream(self, project_id, model_id, remote_run_id, chunks, progress_callback=None):
+        """
+        Uploads an archive byte stream chunk by chunk. Each chunk is sent with
+        its offset, chunks the server already has are skipped so a failed
+        upload resumes from where it stopped when called again with the same
+        stream. `progress_callback(bytes_sent)` is called after every chunk.
+        """
+        server_offset, complete = self.get_upload_offset(project_id, model_id, remote_run_id)
+        if complete:
+            return
+        offset = 0
+        pending = None
+        for chunk in chunks:
+            if pending is not None:
+                offset = self.send_chunk(project_id, model_id, remote_run_id, offset, pending, server_offset, False,
+                                         progress_callback)
+            pending = chunk
+        self.send_chunk(project_id, model_id, remote_run_id, offset, pending or b"", server_offset, True,
+                        progress_callback)
+
+    def send_chunk(self, project_id, model_id, remote_run_id, offset, chunk, server_offset, final, progress_callback):
+        end = offset + len(chunk)
+        if end > server_offset or final:
+            skip = max(server_offset - offset, 0)
+            self.upload_run_chunk(project_id, model_id, remote_run_id, offset + skip, chunk[skip:], final)
+        if progress_callback is not None:
+            progress_callback(end)
+        return end
+
+    # ******************** Live streaming ******************** #
+    def send_live_batch(self, project_id, model_id, remote_run_id, seq, body):
+        """
+        Sends a gzip compressed JSON batch of live records. Batches are numbered,
+        a resent batch replaces the one with the same `seq`, so this is retry safe.
+        """
+        headers = dict(self.req_header)
+        headers.update({"Content-Type": "application/json", "Content-Encoding": "gzip"})
+        self.put("/v1.0/project/{}/model/{}/run/{}/live/{}".format(project_id, model_id, remote_run_id, seq),
+             body=body, headers=headers)
+
+    def request(self, method, url, data=None, headers=None, file=None, body=None):
+        if body is not None:
+            r = self.session.request(method, self.API_URL + url, data=body, headers=headers, timeout=self.timeout)
+        elif file is not None:
+            with open(file, 'rb') as fp:
+                r = self.session.request(method, self.API_URL + url, files={'file': fp}, json=data, headers=headers,
+                                         timeout=self.timeout)
+        elif data is not None:
+            headers = dict(headers or {}, **{"Content-Type": "application/json"})
+            r = self.session.request(method, self.API_URL + url, data=serialization.dumpb(data), headers=headers,
+                                     timeout=self.timeout)
+        else:
+            r = self.session.request(method, self.API_URL + url, headers=headers, timeout=self.timeout)
+        r.raise_for_status()
+        return serialization.loads(r.content)
+
+    def get(self, url, headers=None):
+        return self.request("GET", url, headers=headers)
+
+    def post(self, url, data=None, headers=None, file=None):
+        return self.request("POST", url, data=data, headers=headers, file=file)
+
+    def put(self, url, data=None, headers=None, file=None, body=None):
+        return self.request("PUT", url, data=data, headers=headers, file=file, body=body)
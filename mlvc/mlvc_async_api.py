@@ -0,0 +1,184 @@
+import os
+import asyncio
+from os.path import expanduser
+
+import aiohttp
+
+from mlvc.mlvc_api import MLVCApi
+from mlvc.utils import serialization
+from mlvc.storage.manifest import filter_needed_paths
+from mlvc.utils.gen_utils import read_json_from_file
+from mlvc.config.settings import load_settings
+
+
+class RetryableStatus(Exception):
+    pass
+
+
+class AsyncMLVCApi(object):
+    """
+    asyncio counterpart of MLVCApi on aiohttp, used by AsyncMLVC. Requests go
+    through one pooled keep-alive session (up to `api_pool_size` connections)
+    with the same timeouts and retries: idempotent requests are retried with
+    exponential backoff on connection errors and 429/5xx responses, POSTs
+    only when the connection could not be established.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or load_settings()
+        self.API_URL = self.settings["api_url"] or MLVCApi.API_URL
+        self.mlvc_dir = os.path.join(expanduser("~"), ".mlvc")
+        credentials = read_json_from_file(os.path.join(self.mlvc_dir, "credentials.json"))
+        self.req_header = {
+            "x-api-key": credentials["key"],
+            "x-api-secret": credentials["secret"]
+        }
+        self.session = None
+
+    def get_session(self):
+        # Created on first use, inside the running event loop
+        if self.session is None or self.session.closed:
+            connect_timeout, read_timeout = self.settings["api_timeout"]
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.settings["api_pool_size"]),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def create_run(self, project_id, model_id, run_doc):
+        run_basic_details = {
+            "name": run_doc["name"],
+            "description": run_doc["description"]
+        }
+        res = await self.post("/v1.0/project/{}/model/{}/run/".format(project_id, model_id),
+                              data=run_basic_details, headers=self.req_header)
+        remote_run_id = res["data"]["id"]
+        await self.update_run(project_id, model_id, remote_run_id, run_doc)
+
+        return remote_run_id
+
+    async def update_run(self, project_id, model_id, remote_run_id, run_doc):
+        await self.put("/v1.0/project/{}/model/{}/run/{}".format(project_id, model_id, remote_run_id),
+                       data=run_doc, headers=self.req_header)
+
+    async def upload_run_files(self, project_id, model_id, remote_run_id, run_zip_file_path):
+        await self.put("/v1.0/project/{}/model/{}/run/{}/upload".format(project_id, model_id, remote_run_id),
+                       file=run_zip_file_path, headers=self.req_header)
+
+    # ******************** Incremental sync ******************** #
+    async def get_needed_files(self, project_id, model_id, remote_run_id, manifest):
+        res = await self.post("/v1.0/project/{}/model/{}/run/{}/sync/manifest".format(project_id, model_id,
+                                                                                      remote_run_id),
+                              data={"manifest": manifest}, headers=self.req_header)
+        return res["data"]["needed"]
+
+    async def upload_sync_files(self, project_id, model_id, remote_run_id, archive_file_path):
+        await self.put("/v1.0/project/{}/model/{}/run/{}/sync/upload".format(project_id, model_id, remote_run_id),
+                       file=archive_file_path, headers=self.req_header)
+
+    async def sync_run_files(self, project_id, model_id, remote_run_id, manifest, make_archive_fn):
+        """
+        MLVCApi.sync_run_files, `make_archive_fn(paths)` is awaited for the archive path.
+        """
+        needed = filter_needed_paths(await self.get_needed_files(project_id, model_id, remote_run_id, manifest),
+                                     manifest)
+        if needed:
+            archive_file_path = await make_archive_fn(needed)
+            try:
+                await self.upload_sync_files(project_id, model_id, remote_run_id, archive_file_path)
+            finally:
+                os.remove(archive_file_path)
+        return needed
+
+    # ******************** Streaming upload ******************** #
+    async def get_upload_offset(self, project_id, model_id, remote_run_id):
+        res = await self.get("/v1.0/project/{}/model/{}/run/{}/upload/status".format(project_id, model_id,
+                                                                                     remote_run_id),
+                             headers=self.req_header)
+        return res["data"].get("offset", 0), res["data"].get("complete", False)
+
+    async def upload_run_chunk(self, project_id, model_id, remote_run_id, offset, chunk, final):
+        headers = dict(self.req_header)
+        headers.update({
+            "Content-Type": "application/octet-stream",
+            "X-Upload-Offset": str(offset),
+            "X-Upload-Final": "1" if final else "0",
+        })
+        await self.put("/v1.0/project/{}/model/{}/run/{}/upload/chunk".format(project_id, model_id, remote_run_id),
+                       body=chunk, headers=headers)
+
+    async def upload_run_stream(self, project_id, model_id, remote_run_id, chunks, progress_callback=None):
+        """
+        MLVCApi.upload_run_stream over an async iterator of archive chunks, resuming from the server's offset.
+        """
+        server_offset, complete = await self.get_upload_offset(project_id, model_id, remote_run_id)
+        if complete:
+            return
+        offset = 0
+        pending = None
+        async for chunk in chunks:
+            if pending is not None:
+                offset = await self.send_chunk(project_id, model_id, remote_run_id, offset, pending, server_offset,
+                                               False, progress_callback)
+            pending = chunk
+        await self.send_chunk(project_id, model_id, remote_run_id, offset, pending or b"", server_offset, True,
+                              progress_callback)
+
+    async def send_chunk(self, project_id, model_id, remote_run_id, offset, chunk, server_offset, final,
+                         progress_callback):
+        end = offset + len(chunk)
+        if end > server_offset or final:
+            skip = max(server_offset - offset, 0)
+            await self.upload_run_chunk(project_id, model_id, remote_run_id, offset + skip, chunk[skip:], final)
+        if progress_callback is not None:
+            progress_callback(end)
+        return end
+
+    # ******************** Requests ******************** #
+    async def request(self, method, url, data=None, headers=None, file=None, body=None):
+        retries = self.settings["api_retries"]
+        idempotent = method in MLVCApi.IDEMPOTENT_METHODS
+        for attempt in range(retries + 1):
+            can_retry = attempt < retries
+            try:
+                return await self.send(method, url, data, headers, file, body, idempotent and can_retry)
+            except RetryableStatus:
+                pass
+            except aiohttp.ClientConnectorError:
+                if not can_retry:
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not (idempotent and can_retry):
+                    raise
+            await asyncio.sleep(self.settings["api_backoff_factor"] * 2 ** attempt)
+
+    async def send(self, method, url, data, headers, file, body, retry_status):
+        headers = dict(headers or {})
+        if file is not None:
+            with open(file, "rb") as fp:
+                payload = aiohttp.FormData()
+                payload.add_field("file", fp, filename=os.path.basename(file))
+                return await self.send_payload(method, url, payload, headers, retry_status)
+        if body is None and data is not None:
+            headers["Content-Type"] = "application/json"
+            body = serialization.dumpb(data)
+        return await self.send_payload(method, url, body, headers, retry_status)
+
+    async def send_payload(self, method, url, payload, headers, retry_status):
+        async with self.get_session().request(method, self.API_URL + url, data=payload, headers=headers) as r:
+            if retry_status and r.status in MLVCApi.RETRY_STATUS_CODES:
+                raise RetryableStatus(r.status)
+            r.raise_for_status()
+            return serialization.loads(await r.read())
+
+    async def get(self, url, headers=None):
+        return await self.request("GET", url, headers=headers)
+
+    async def post(self, url, data=None, headers=None, file=None):
+        return await self.request("POST", url, data=data, headers=headers, file=file)
+
+    async def put(self, url, data=None, headers=None, file=None, body=None):
+        return await self.request("PUT", url, data=data, headers=headers, file=file, body=body)
@@ -1,16 +1,35 @@
 import os
+import copy
+import atexit
+import threading
+from contextlib import contextmanager
 from os.path import expanduser
-from tinydb import TinyDB, Query
 
 from mlvc.utils.singleton import SingletonMeta
 from mlvc.utils.gen_utils import read_json_from_file, make_dir_if_not_exist
+from mlvc.config.settings import load_settings
+from mlvc.storage.run_query import match_filters, index_equals, sort_runs, project_fields
 
 
 class MLVCDB(object):
+    """
+    Run document database, safe to use from several threads. Documents of runs inserted by this process are kept
+    in a write-back cache: reads are served from memory and updates are
+    coalesced and written to the storage backend on a timer, on `flush()`,
+    when a `transaction()` block exits or when the run is released.
+    """
     __metaclass__ = SingletonMeta
 
-    def __init__(self):
+    def __init__(self, settings=None):
         self.db = None
+        self.settings = settings or load_settings()
+
+        # Write-back cache
+        self.cache = {}
+        self.dirty = set()
+        self.lock = threading.RLock()
+        self.flush_timer = None
+        self.transaction_depth = 0
 
         user_home = expanduser("~")
         self.mlvc_dir = os.path.join(user_home, ".mlvc")
@@ -18,33 +37,123 @@ class MLVCDB(object):
         self.init_db()
 
     def init_db(self):
-        self.db = TinyDB(os.path.join(self.mlvc_dir, "mlvc.json"))
+        settings = self.settings
+        self.write_back = settings["db_write_back"]
+        self.flush_interval = settings["db_flush_interval"]
+        atexit.register(self.flush)
+
+        db_backend = settings["db_backend"]
+        tinydb_file_path = os.path.join(self.mlvc_dir, "mlvc.json")
+        if db_backend == "tinydb":
+            from mlvc.storage.tinydb_storage import TinyDBRunStorage
+            self.db = TinyDBRunStorage(tinydb_file_path)
+        elif db_backend == "sqlite":
+            from mlvc.storage.sqlite_storage import SQLiteRunStorage
+            self.db = SQLiteRunStorage(os.path.join(self.mlvc_dir, "mlvc.sqlite3"))
+            self.db.migrate_from_tinydb(tinydb_file_path)
+        else:
+            raise Exception("Unknown db backend: {}".format(db_backend))
 
     def insert_run(self, run):
-        self.db.insert(run)
-    
+        with self.lock:
+            self.db.insert_run(run)
+            if self.write_back:
+                self.cache[run["run_id"]] = copy.deepcopy(run)
+
     def get_run(self, run_id):
-        query = Query()
-        doc = self.db.get(query.run_id == run_id)
-        return doc
-    
+        with self.lock:
+            if run_id in self.cache:
+                return copy.deepcopy(self.cache[run_id])
+            return self.db.get_run(run_id)
+
     def get_all_runs(self):
-        return self.db.all()
-    
+        with self.lock:
+            self.flush()
+            return self.db.get_all_runs()
+
+    def query_runs(self, filters=None, sort_by=None, descending=False, limit=None, fields=None):
+        """
+        Runs matching `filters`, a dict of dotted paths (e.g. "config.lr") to a
+        value or an (operator, value) tuple with operator one of ==, !=, <, <=,
+        >, >=, in. Equality on indexed fields is answered by the backend
+        indexes, the remaining conditions are checked on the candidates.
+        Results can be sorted by a dotted path, limited to the top `limit` and
+        projected to the dotted paths in `fields`.
+        """
+        filters = filters or {}
+        with self.lock:
+            self.flush()
+            runs = self.db.find_runs(index_equals(filters, self.db.INDEXED_FIELDS))
+        runs = [run for run in runs if match_filters(run, filters)]
+        if sort_by is not None:
+            runs = sort_runs(runs, sort_by, descending, limit)
+        elif limit is not None:
+            runs = runs[:limit]
+        if fields is not None:
+            runs = [project_fields(run, fields) for run in runs]
+        return runs
+
     def update_run(self, run_id, obj):
-        query = Query()
-        self.db.update(obj, query.run_id == run_id)
+        with self.lock:
+            if run_id in self.cache:
+                self.db.apply_update(self.cache[run_id], obj)
+                self.dirty.add(run_id)
+                self.schedule_flush()
+                return
+            self.db.update_run(run_id, obj)
 
     def remove_all_runs(self):
-        self.db.truncate()
+        with self.lock:
+            self.cache = {}
+            self.dirty = set()
+            self.db.remove_all_runs()
+
+    # ******************** Write-back ******************** #
+    def schedule_flush(self):
+        if self.flush_timer is None and self.transaction_depth == 0:
+            self.flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            for run_id in self.dirty:
+                self.db.update_run(run_id, dict(self.cache[run_id]))
+            self.dirty = set()
+
+    def release_run(self, run_id):
+        """
+        Writes back and evicts a run, later reads go to the storage backend.
+        """
+        with self.lock:
+            self.flush()
+            self.cache.pop(run_id, None)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups updates so they are written back once when the block exits.
+        """
+        with self.lock:
+            self.transaction_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    self.flush()
 
     @staticmethod
     def set_nested(path, val):
         def transform(doc):
             current = doc
             for key in path[:-1]:
-                current = current[key]
+                current = current.setdefault(key, {})
 
             current[path[-1]] = val
 
-        return transform
\ No newline at end of file
+        return transform
@@ -0,0 +1,97 @@
+# Annotation format -> file name in the run's ann directory
+FILE_NAMES = {"json": "data.json", "csv": "data.csv", "parquet": "data.parquet", "arrow": "data.arrow", "npy": "data.npy"}
+
+
+# ******************** Write ******************** #
+def to_arrow_table(table):
+    """
+    pyarrow Table of a Table, RecordBatch or pandas DataFrame, numeric columns are not copied.
+    """
+    import pyarrow as pa
+
+    if isinstance(table, pa.Table):
+        return table
+    if isinstance(table, pa.RecordBatch):
+        return pa.Table.from_batches([table])
+    return pa.Table.from_pandas(table)
+
+
+def write_arrow(table, file_path):
+    """
+    Arrow IPC file, uncompressed: the column buffers are written as they are and can be memory-mapped back.
+    """
+    import pyarrow as pa
+
+    table = to_arrow_table(table)
+    with pa.OSFile(file_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def write_parquet(table, file_path):
+    import pyarrow.parquet as pq
+
+    pq.write_table(to_arrow_table(table), file_path)
+
+
+def write_npy(array, file_path):
+    import numpy as np
+
+    # np.save writes the header and then the array buffer straight to the file
+    np.save(file_path, array, allow_pickle=False)
+
+
+# ******************** Describe ******************** #
+def get_arrow_schema(schema):
+    return [{"name": field.name, "type": str(field.type)} for field in schema]
+
+
+def describe_file(file_path, file_format):
+    """
+    Row count and schema of a columnar file, from its footer / header only.
+    """
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        metadata = pq.read_metadata(file_path)
+        return {"num_rows": metadata.num_rows, "schema": get_arrow_schema(metadata.schema.to_arrow_schema())}
+    if file_format == "arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(file_path, "r") as source:
+            reader = pa.ipc.open_file(source)
+            # Batches are memory-mapped, only their lengths are read
+            num_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+            return {"num_rows": num_rows, "schema": get_arrow_schema(reader.schema)}
+    if file_format == "npy":
+        import numpy as np
+
+        # Only the header is parsed, the data stays on disk
+        array = np.load(file_path, mmap_mode="r", allow_pickle=False)
+        return {"num_rows": array.shape[0] if array.shape else 1,
+                "schema": {"shape": list(array.shape), "dtype": array.dtype.str}}
+    raise Exception("Unknown columnar format: {}".format(file_format))
+
+
+# ******************** Read ******************** #
+def open_file(file_path, file_format):
+    """
+    Lazy view of an annotation file: a memory-mapped pyarrow Table (arrow), a
+    pyarrow ParquetFile reading row groups on demand (parquet) or a read only
+    NumPy memmap (npy).
+    """
+    if file_format == "arrow":
+        import pyarrow as pa
+
+        # The table's buffers keep the mapping alive, only the file is closed
+        with pa.memory_map(file_path, "r") as source:
+            return pa.ipc.open_file(source).read_all()
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(file_path, memory_map=True)
+    if file_format == "npy":
+        import numpy as np
+
+        return np.load(file_path, mmap_mode="r")
+    raise Exception("Unknown columnar format: {}".format(file_format))
+
@@ -0,0 +1,296 @@
+import os
+import sys
+import time
+import heapq
+import itertools
+from datetime import timedelta
+from secrets import token_hex
+
+from mlvc.utils import serialization
+from mlvc.utils.gen_utils import make_dir_if_not_exist, write_json_to_file, read_json_from_file
+
+SHARDS_DIR_NAME = "ranks"
+SHARD_FILE_NAME = "shard.json"
+# Per rank logs merged into the run's logs by rank 0
+MERGED_LOG_FILES = ("run.log", "metric.log", "system_stats.log")
+
+# Launchers setting the global rank and world size: torchrun / torch.distributed, Slurm, Open MPI, with the
+# variables which must also be set. srun sets Slurm's for every task of any job step, they only mean distributed
+# training with a rendezvous address or MLVC_DISTRIBUTED=1.
+RANK_ENV_VARS = [("RANK", "WORLD_SIZE", ()), ("SLURM_PROCID", "SLURM_NTASKS", ("MASTER_ADDR", "MLVC_DISTRIBUTED")),
+                 ("OMPI_COMM_WORLD_RANK", "OMPI_COMM_WORLD_SIZE", ())]
+JOB_ENV_VARS = ["TORCHELASTIC_RUN_ID", "SLURM_JOB_ID", "OMPI_MCA_orte_hnp_uri"]
+
+NO_SHARED_FS_ERROR = ("Rank {} cannot see the run directory of rank 0. Without a filesystem shared by the ranks, "
+                      "initialize torch.distributed before creating and committing the run")
+
+# Run ids exchanged by this process through the launcher's store, every rank creates its runs in the same order
+run_id_exchanges = itertools.count()
+# Run ids this process put in MLVC_RUN_ID for its children -> pid, a forked child inherits them but not the pid
+exported_run_ids = {}
+
+
+def get_rank_info():
+    """
+    (rank, world_size) of this process from the launcher environment, (0, 1) outside distributed training.
+    """
+    for rank_var, world_size_var, job_vars in RANK_ENV_VARS:
+        if rank_var in os.environ and world_size_var in os.environ:
+            if job_vars and not any(os.environ.get(var) not in (None, "", "0") for var in job_vars):
+                continue
+            return int(os.environ[rank_var]), int(os.environ[world_size_var])
+    return 0, 1
+
+
+def get_shard_dir(run_dir, rank):
+    return os.path.join(run_dir, SHARDS_DIR_NAME, str(rank))
+
+
+# ******************** Launcher Exchange ******************** #
+def get_process_group():
+    """
+    torch.distributed when the process group is already up, None otherwise. torch is never imported here.
+    """
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.distributed.is_available() or not torch.distributed.is_initialized():
+        return None
+    return torch.distributed
+
+
+def get_launcher_store(timeout):
+    """
+    Client of the TCPStore of torchrun's agent, None under other launchers.
+    """
+    if os.environ.get("TORCHELASTIC_USE_AGENT_STORE") != "True":
+        return None
+    from torch.distributed import TCPStore
+    return TCPStore(os.environ["MASTER_ADDR"], int(os.environ["MASTER_PORT"]), is_master=False,
+                    timeout=timedelta(seconds=timeout))
+
+
+def get_store_key(*parts):
+    # The agent's store outlives restarts of the workers
+    return "/".join(("mlvc", os.environ.get("TORCHELASTIC_RESTART_COUNT", "0")) + tuple(str(part) for part in parts))
+
+
+def broadcast_run_id(rank, timeout):
+    """
+    Shares a run id created by rank 0 through torch.distributed or the launcher's store, None when neither is available.
+    """
+    run_id = token_hex(16) if rank == 0 else None
+    dist = get_process_group()
+    if dist is not None:
+        run_ids = [run_id]
+        dist.broadcast_object_list(run_ids, src=0)
+        return run_ids[0]
+    store = get_launcher_store(timeout)
+    if store is None:
+        return None
+    key = get_store_key("run_id", next(run_id_exchanges))
+    if rank == 0:
+        store.set(key, run_id)
+        return run_id
+    return store.get(key).decode("utf-8")
+
+
+def gather_shards(run_id, rank, world_size, shard, timeout):
+    """
+    Sends the shard of every rank to rank 0 through torch.distributed or the
+    launcher's store. Returns {rank: shard} of the ranks which committed in
+    time on rank 0, {} on the other ranks and None when neither is available.
+    """
+    dist = get_process_group()
+    if dist is not None:
+        shards = [None] * world_size if rank == 0 else None
+        dist.gather_object(shard, shards, dst=0)
+        return {other: other_shard for other, other_shard in enumerate(shards or []) if other_shard is not None}
+    store = get_launcher_store(timeout)
+    if store is None:
+        return None
+    if rank != 0:
+        store.set(get_store_key("shard", run_id, rank), serialization.dumpb(shard))
+        return {}
+    shards = {0: shard}
+    deadline = time.time() + timeout
+    for other in range(1, world_size):
+        key = get_store_key("shard", run_id, other)
+        try:
+            store.wait([key], timedelta(seconds=max(deadline - time.time(), 0.001)))
+        except Exception:
+            # Reported as missing, like a rank which did not write its shard file in time
+            continue
+        shards[other] = serialization.loads(store.get(key))
+    return shards
+
+
+# ******************** Run Id Rendezvous ******************** #
+
+
+def get_job_key():
+    for var in JOB_ENV_VARS:
+        if os.environ.get(var):
+            return "{}-{}".format(var.lower(), os.environ[var])
+    if os.environ.get("MASTER_ADDR") and os.environ.get("MASTER_PORT"):
+        return "master-{}-{}".format(os.environ["MASTER_ADDR"], os.environ["MASTER_PORT"])
+    return None
+
+
+def resolve_run_id(rank, mlvc_dir, timeout=300.0):
+    """
+    Run id shared by every rank of the job. Taken from MLVC_RUN_ID when the
+    launcher sets it, otherwise rank 0 creates one and publishes it through
+    torch.distributed, torchrun's store or a rendezvous file keyed by the job
+    id, which needs ~/.mlvc on a filesystem shared by the ranks.
+    """
+    run_id = os.environ.get("MLVC_RUN_ID")
+    # An id this process exported belongs to its previous run, the next run gets a new one
+    if run_id and exported_run_ids.get(run_id) != os.getpid():
+        return run_id
+
+    run_id = broadcast_run_id(rank, timeout)
+    if run_id is None:
+        job_key = get_job_key()
+        if job_key is None:
+            raise Exception("Cannot share the run id between ranks, set MLVC_RUN_ID for every rank")
+        rendezvous_dir = os.path.join(mlvc_dir, "rendezvous")
+        make_dir_if_not_exist(rendezvous_dir)
+        rendezvous_path = os.path.join(rendezvous_dir, job_key)
+        if rank == 0:
+            run_id = token_hex(16)
+            tmp_path = "{}.{}.tmp".format(rendezvous_path, os.getpid())
+            write_json_to_file({"run_id": run_id, "created_at": time.time()}, tmp_path)
+            os.replace(tmp_path, rendezvous_path)
+        else:
+            run_id = wait_for_rendezvous(rendezvous_path, timeout)
+
+    # Processes spawned by this one (e.g. data loader workers) attach to the same run
+    exported_run_ids[run_id] = os.getpid()
+    os.environ["MLVC_RUN_ID"] = run_id
+    return run_id
+
+
+def wait_for_rendezvous(rendezvous_path, timeout):
+    import psutil
+    # A file left by an earlier job with the same key predates this process
+    started_at = psutil.Process().create_time() - 60
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(rendezvous_path):
+            rendezvous = read_json_from_file(rendezvous_path)
+            if rendezvous["created_at"] >= started_at:
+                return rendezvous["run_id"]
+        time.sleep(0.5)
+    raise Exception("Timed out waiting for rank 0 to create the run, the rendezvous file {} must be on a filesystem "
+                    "shared by the ranks, otherwise set MLVC_RUN_ID or initialize torch.distributed "
+                    "first".format(rendezvous_path))
+
+
+# ******************** Shards ******************** #
+def clear_shard(shard_dir):
+    """
+    Removes the shard a run which used the same directory left behind, rank 0 would take it as this run's.
+    """
+    shard_path = os.path.join(shard_dir, SHARD_FILE_NAME)
+    if os.path.exists(shard_path):
+        os.remove(shard_path)
+
+
+def write_shard(shard_dir, shard):
+    """
+    Written by every rank once its files are closed, also marks the shard as complete.
+    """
+    shard_path = os.path.join(shard_dir, SHARD_FILE_NAME)
+    tmp_path = "{}.{}.tmp".format(shard_path, os.getpid())
+    write_json_to_file(shard, tmp_path)
+    os.replace(tmp_path, shard_path)
+
+
+def wait_for_shards(run_dir, world_size, timeout=600.0):
+    """
+    Waits until every rank wrote its shard, returns {rank: shard} of the ranks which finished in time.
+    Raises when a rank never wrote to the run directory, which is then not shared with it.
+    """
+    shards = {}
+    deadline = time.time() + timeout
+    while len(shards) < world_size and time.time() < deadline:
+        for rank in range(world_size):
+            shard_path = os.path.join(get_shard_dir(run_dir, rank), SHARD_FILE_NAME)
+            if rank not in shards and os.path.exists(shard_path):
+                shards[rank] = read_json_from_file(shard_path)
+        if len(shards) < world_size:
+            time.sleep(0.5)
+    unseen = [rank for rank in range(world_size) if not os.path.isdir(get_shard_dir(run_dir, rank))]
+    if unseen:
+        raise Exception("Ranks {} never wrote to the run directory {}, it must be on a filesystem shared by the "
+                        "ranks or torch.distributed initialized before the commit".format(unseen, run_dir))
+    return shards
+
+
+def exchange_shards(run_dir, run_id, rank, world_size, shard, timeout=600.0):
+    """
+    Distributed commit of one rank: returns {rank: shard} of the ranks which
+    committed in time on rank 0, {} on the other ranks. Shards go through
+    torch.distributed or the launcher's store when available, with the logs of
+    the ranks which cannot see rank 0's run directory. Otherwise rank 0 reads
+    them from the shared run directory, and a rank without it fails.
+    """
+    shard_dir = get_shard_dir(run_dir, rank)
+    write_shard(shard_dir, shard)
+    shared_fs = rank == 0 or os.path.isdir(get_shard_dir(run_dir, 0))
+    shard = dict(shard, shared_fs=shared_fs)
+    if not shared_fs:
+        shard["files"] = {file_name: read_text(os.path.join(shard_dir, file_name)) for file_name in MERGED_LOG_FILES}
+    shards = gather_shards(run_id, rank, world_size, shard, timeout)
+    if shards is None:
+        if not shared_fs:
+            raise Exception(NO_SHARED_FS_ERROR.format(rank))
+        return wait_for_shards(run_dir, world_size, timeout) if rank == 0 else {}
+    for other, other_shard in shards.items():
+        # Logs received from another filesystem go where the merge reads shards
+        files = other_shard.pop("files", None)
+        if files:
+            other_dir = get_shard_dir(run_dir, other)
+            make_dir_if_not_exist(other_dir)
+            for file_name, text in files.items():
+                if text is not None and file_name in MERGED_LOG_FILES:
+                    with open(os.path.join(other_dir, file_name), "w", encoding="utf-8") as fp:
+                        fp.write(text)
+    return shards
+
+
+def read_text(file_path):
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, encoding="utf-8") as fp:
+        return fp.read()
+
+
+def iter_shard_lines(file_path, rank):
+    """
+    (timestamp, line) of a JSON lines log shard with the rank added to every record.
+    """
+    prefix = '{{"rank": {}, '.format(rank)
+    with open(file_path, encoding="utf-8") as fp:
+        for line in fp:
+            line = line.strip()
+            if not line.startswith("{"):
+                continue
+            record = serialization.loads(line)
+            if not record:
+                continue
+            # The formatter writes fixed width ISO timestamps, they sort as strings
+            yield record.get("timestamp", ""), prefix + line[1:]
+
+
+def merge_log_shards(shard_paths, output_path):
+    """
+    Streaming k-way merge of per rank JSON lines logs by timestamp, one line per shard in memory at a time.
+    """
+    iterators = [iter_shard_lines(file_path, rank) for rank, file_path in sorted(shard_paths.items())
+                 if os.path.exists(file_path)]
+    num_lines = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        for _, line in heapq.merge(*iterators, key=lambda item: item[0]):
+            out.write(line + "\n")
+            num_lines += 1
+    return num_lines
@@ -0,0 +1,76 @@
+import os
+import threading
+
+from mlvc.utils.gen_utils import make_dir_if_not_exist
+
+
+class GitSnapshot(threading.Thread):
+    """
+    Captures the repository details and working tree diff of a run in the
+    background, so create_run does not wait for git. Diffs are cached in
+    `cache_dir` under the HEAD + index + worktree state key, runs started from
+    an identical checkout (e.g. a sweep) reuse the stored patch. The
+    `cache_size` most recently used patches are kept.
+    """
+
+    def __init__(self, get_git_utils, cache_dir, cache_size=32):
+        super().__init__()
+        self.daemon = True
+        self.get_git_utils = get_git_utils
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.details = None
+        self.patch_path = None
+        self.error = None
+
+    def run(self):
+        try:
+            git_utils = self.get_git_utils()
+            # Snapshots of concurrent runs take turns, the later ones usually hit the cache
+            with git_utils.lock:
+                self.capture(git_utils)
+        except Exception as e:
+            self.error = e
+
+    def capture(self, git_utils):
+        details = git_utils.get_repo_details()
+        state_key = git_utils.get_state_key()
+        make_dir_if_not_exist(self.cache_dir)
+        patch_path = os.path.join(self.cache_dir, "{}.patch".format(state_key))
+        details["diff_cached"] = os.path.exists(patch_path)
+        if details["diff_cached"]:
+            # Refresh the mtime, pruning drops the least recently used patches
+            os.utime(patch_path)
+        else:
+            tmp_path = "{}.{}.tmp".format(patch_path, os.getpid())
+            git_utils.write_diff(tmp_path)
+            os.replace(tmp_path, patch_path)
+            self.prune_cache()
+        details["state_key"] = state_key
+        self.details = details
+        self.patch_path = patch_path
+
+    def prune_cache(self):
+        patches = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".patch"):
+                file_path = os.path.join(self.cache_dir, file_name)
+                try:
+                    patches.append((os.stat(file_path).st_mtime, file_path))
+                except OSError:
+                    continue
+        patches.sort(reverse=True)
+        for _, file_path in patches[self.cache_size:]:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+    def wait(self):
+        """
+        Waits for the capture, returns (details, patch_path). Raises the capture error, if any.
+        """
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.details, self.patch_path
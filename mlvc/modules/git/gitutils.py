@@ -1,20 +1,104 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+
 from git import Repo
 
 
 class GITUtils(object):
 
+    ADD_BATCH_SIZE = 500
+
     def __init__(self):
         self.repo = Repo(search_parent_directories=True)
+        # Repo keeps persistent git processes which are not thread safe
+        self.lock = threading.Lock()
 
     def get_repo_details(self):
+        try:
+            remote_url = self.repo.remotes.origin.url
+        except AttributeError:
+            remote_url = None
+        try:
+            active_branch = self.repo.active_branch.name
+        except TypeError:
+            # Detached HEAD
+            active_branch = None
         return {
-            "remote_url": self.repo.remotes.origin.url,
-            "active_branch": self.repo.active_branch.name,
+            "remote_url": remote_url,
+            "active_branch": active_branch,
             "commit_id": self.repo.head.object.hexsha
         }
 
+    # ******************** Worktree State ******************** #
+    def get_status(self):
+        """
+        Paths changed against HEAD (staged or not) and untracked paths, as two lists.
+        """
+        # --no-optional-locks keeps status from rewriting the index, which would change the state key
+        output = self.repo.git.execute(["git", "--no-optional-locks", "status", "--porcelain=v1", "-z",
+                                        "--untracked-files=all"], strip_newline_in_stdout=False)
+        changed, untracked = [], []
+        entries = iter(output.split("\0"))
+        for entry in entries:
+            if not entry:
+                continue
+            code, path = entry[:2], entry[3:]
+            if code == "??":
+                untracked.append(path)
+                continue
+            changed.append(path)
+            if "R" in code or "C" in code:
+                # Renames and copies are followed by the original path
+                changed.append(next(entries, ""))
+        return changed, untracked
+
+    def get_state_key(self):
+        """
+        Key of the HEAD commit plus index and worktree state: the stat of the
+        index and of every changed or untracked file. Checkouts with the same
+        key have the same diff.
+        """
+        key = hashlib.sha256(self.repo.head.object.hexsha.encode())
+        index_path = os.path.join(self.repo.git_dir, "index")
+        if os.path.exists(index_path):
+            index_stat = os.stat(index_path)
+            key.update("index:{}:{}\0".format(index_stat.st_size, index_stat.st_mtime_ns).encode())
+        changed, untracked = self.get_status()
+        for prefix, paths in (("changed", changed), ("untracked", untracked)):
+            for path in sorted(paths):
+                try:
+                    file_stat = os.stat(os.path.join(self.repo.working_tree_dir, path))
+                    stamp = "{}:{}".format(file_stat.st_size, file_stat.st_mtime_ns)
+                except OSError:
+                    stamp = "deleted"
+                key.update("{}:{}:{}\0".format(prefix, path, stamp).encode())
+        return key.hexdigest()
+
+    # ******************** Diff ******************** #
     def get_diff(self):
-        return self.repo.git.diff('HEAD~1')
+        """
+        Working tree diff against HEAD, staged and unstaged changes and untracked files included.
+        """
+        changed, untracked = self.get_status()
+        if not untracked:
+            return self.repo.git.diff("HEAD")
+
+        # Untracked files are added as intent-to-add to a copy of the index, so one diff covers them
+        index_path = os.path.join(self.repo.git_dir, "index")
+        tmp_dir = tempfile.mkdtemp(prefix="mlvc_git_")
+        try:
+            tmp_index_path = os.path.join(tmp_dir, "index")
+            if os.path.exists(index_path):
+                shutil.copyfile(index_path, tmp_index_path)
+            env = {"GIT_INDEX_FILE": tmp_index_path}
+            for i in range(0, len(untracked), self.ADD_BATCH_SIZE):
+                self.repo.git.add("--intent-to-add", "--", *untracked[i:i + self.ADD_BATCH_SIZE], env=env)
+            return self.repo.git.diff("HEAD", env=env)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
     def write_diff(self, outfile):
         f = open(outfile, "a")
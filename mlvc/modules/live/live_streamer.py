@@ -0,0 +1,193 @@
+import os
+import gzip
+import time
+import queue
+import threading
+
+from mlvc.utils import serialization
+from mlvc.utils.gen_utils import make_dir_if_not_exist
+
+_STOP = object()
+
+
+class LiveStreamer(threading.Thread):
+    """
+    Streams metric and system stats records of a running run to the server.
+    The training thread only enqueues records; this thread groups them into
+    gzip compressed JSON batches, sent every `flush_interval` seconds or once
+    `batch_size` records are pending, through `send_batch(seq, body)`.
+
+    When the queue is full `full_policy` decides whether the caller blocks
+    ("block") or the record is dropped and counted ("drop"). Batches which
+    cannot be sent are spooled to `spool_dir` and resent in order once the
+    server answers again, retrying with exponential backoff. The spool keeps
+    at most `spool_max_bytes`, the oldest batches are dropped first.
+    """
+
+    FULL_POLICIES = ("block", "drop")
+    SPOOL_SUFFIX = ".json.gz"
+
+    def __init__(self, send_batch, spool_dir, batch_size=1000, flush_interval=5.0, queue_size=100000,
+                 full_policy="drop", spool_max_bytes=256 * 1024 * 1024, retry_backoff=1.0, max_backoff=60.0):
+        super().__init__(name="mlvc-live-streamer")
+        if full_policy not in self.FULL_POLICIES:
+            raise Exception("Unknown queue full policy: {}".format(full_policy))
+        self.daemon = True
+        self.send_batch = send_batch
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.full_policy = full_policy
+        self.spool_max_bytes = spool_max_bytes
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+
+        self.next_seq = 0
+        self.retry_at = 0.0
+        self.failures = 0
+        self.last_error = None
+        self.stats = {"sent_batches": 0, "dropped_records": 0, "spooled_batches": 0, "dropped_batches": 0}
+        # Records are dropped by any producer thread, the other stats only change on this thread
+        self.stats_lock = threading.Lock()
+        make_dir_if_not_exist(self.spool_dir)
+        self.recover_spool()
+
+    # ******************** Producers ******************** #
+    def add(self, record):
+        if self.full_policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.stats_lock:
+                self.stats["dropped_records"] += 1
+
+    def add_metric(self, metric_input, step):
+        self.add({"type": "metric", "timestamp": time.time(), "step": step, "payload": dict(metric_input)})
+
+    def add_metrics_batch(self, columns, steps):
+        self.add({"type": "metric", "timestamp": time.time(), "steps": steps, "payload": columns})
+
+    def add_distribution(self, distributions, step):
+        self.add({"type": "distribution", "timestamp": time.time(), "step": step, "payload": distributions})
+
+    def add_system_stats(self, system_stats):
+        """
+        SystemStats listener.
+        """
+        self.add(dict(system_stats, type="system"))
+
+    # ******************** Batches ******************** #
+    def make_batch(self, records):
+        seq = self.next_seq
+        self.next_seq += 1
+        body = serialization.dumpb({"seq": seq, "records": records})
+        return seq, gzip.compress(body, compresslevel=6)
+
+    def spool_path(self, seq):
+        return os.path.join(self.spool_dir, "{:012d}{}".format(seq, self.SPOOL_SUFFIX))
+
+    def get_spooled(self):
+        return sorted(file_name for file_name in os.listdir(self.spool_dir) if file_name.endswith(self.SPOOL_SUFFIX))
+
+    def recover_spool(self):
+        """
+        Cleans the spool left by a process which stopped while streaming: batches it
+        was still writing are removed, complete ones are resent before new batches.
+        """
+        for file_name in os.listdir(self.spool_dir):
+            if not file_name.endswith(self.SPOOL_SUFFIX):
+                os.remove(os.path.join(self.spool_dir, file_name))
+        spooled = self.get_spooled()
+        if spooled:
+            self.next_seq = int(spooled[-1][:-len(self.SPOOL_SUFFIX)]) + 1
+
+    def spool(self, seq, body):
+        tmp_path = self.spool_path(seq) + ".tmp"
+        with open(tmp_path, "wb") as fp:
+            fp.write(body)
+        os.replace(tmp_path, self.spool_path(seq))
+        self.stats["spooled_batches"] += 1
+
+        # Keep the spool bounded, oldest batches go first
+        spooled = [(file_name, os.path.getsize(os.path.join(self.spool_dir, file_name))) for file_name in self.get_spooled()]
+        total = sum(size for _, size in spooled)
+        for file_name, size in spooled:
+            if total <= self.spool_max_bytes:
+                break
+            os.remove(os.path.join(self.spool_dir, file_name))
+            total -= size
+            self.stats["dropped_batches"] += 1
+
+    def try_send(self, seq, body):
+        try:
+            self.send_batch(seq, body)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self.retry_at = time.monotonic() + min(self.retry_backoff * 2 ** (self.failures - 1), self.max_backoff)
+            return False
+        self.failures = 0
+        self.stats["sent_batches"] += 1
+        return True
+
+    def send_spooled(self):
+        """
+        Resends spooled batches oldest first, returns False when the server is still unreachable.
+        """
+        for file_name in self.get_spooled():
+            if time.monotonic() < self.retry_at:
+                return False
+            file_path = os.path.join(self.spool_dir, file_name)
+            with open(file_path, "rb") as fp:
+                body = fp.read()
+            if not self.try_send(int(file_name[:-len(self.SPOOL_SUFFIX)]), body):
+                return False
+            os.remove(file_path)
+        return True
+
+    def flush_records(self, records):
+        if not records:
+            return
+        seq, body = self.make_batch(records)
+        # Batches go out in order, behind anything spooled
+        if not (self.send_spooled() and self.try_send(seq, body)):
+            self.spool(seq, body)
+        del records[:]
+
+    def run(self):
+        records = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self.flush_records(records)
+                return
+            if item is not None:
+                records.append(item)
+
+            if len(records) >= self.batch_size or time.monotonic() >= deadline:
+                self.flush_records(records)
+                if time.monotonic() >= self.retry_at:
+                    self.send_spooled()
+                deadline = time.monotonic() + self.flush_interval
+
+    def stop(self, timeout=None):
+        """
+        Sends what is queued, waiting at most `timeout` seconds. Batches still unsent stay in the spool.
+        """
+        if self.is_alive():
+            self.queue.put(_STOP)
+            self.join(timeout)
+        num_spooled = len(self.get_spooled())
+        if num_spooled == 0 and not self.is_alive():
+            os.rmdir(self.spool_dir)
+        with self.stats_lock:
+            stats = dict(self.stats)
+        return dict(stats, spooled=num_spooled, last_error=self.last_error)
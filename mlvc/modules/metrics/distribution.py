@@ -0,0 +1,31 @@
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def describe_distribution(values, bins=64):
+    """
+    Summary of a large array or tensor (weights, gradients, activations...)
+    logged instead of its elements: count, mean, std, min, max, percentiles
+    and a histogram of the finite values. Needs NumPy.
+    """
+    import numpy as np
+
+    if hasattr(values, "detach"):
+        # torch tensors, possibly on the GPU
+        values = values.detach().cpu()
+    arr = np.asarray(values, dtype=np.float64).reshape(-1)
+    finite = arr[np.isfinite(arr)]
+    distribution = {"count": int(arr.size), "non_finite": int(arr.size - finite.size)}
+    if finite.size == 0:
+        return distribution
+
+    counts, edges = np.histogram(finite, bins=bins)
+    distribution.update({
+        "mean": float(finite.mean()),
+        "std": float(finite.std()),
+        "min": float(finite.min()),
+        "max": float(finite.max()),
+        "percentiles": dict(zip(("p{}".format(p) for p in PERCENTILES),
+                                np.percentile(finite, PERCENTILES).tolist())),
+        "histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+    })
+    return distribution
@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import threading
+from array import array
+
+from mlvc.utils.gen_utils import write_json_to_file, read_json_from_file, make_dir_if_not_exist
+from mlvc.modules.metrics.metric_summary import MetricSummary
+
+# array.array uses the host's byte order, column files are little-endian everywhere
+SWAP_BYTES = sys.byteorder == "big"
+
+
+def swap_to_little_endian(column_data):
+    """
+    Native order array to little-endian or back, a copy on big-endian hosts.
+    """
+    if not SWAP_BYTES:
+        return column_data
+    swapped = array(column_data.typecode, column_data)
+    swapped.byteswap()
+    return swapped
+
+
+class ColumnarMetricStore(object):
+    """
+    Append-only metric store. Every numeric metric key gets its own step,
+    timestamp and value column files holding raw little-endian int64 / float64
+    arrays, so a series can be memory-mapped without parsing any text.
+
+    Appends are buffered in memory per key and written with array.tofile once
+    `buffer_size` points are pending, or on flush / close.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+    COLUMNS = (("step", "q", "<i8"), ("timestamp", "d", "<f8"), ("value", "d", "<f8"))
+
+    def __init__(self, store_dir, buffer_size=4096):
+        self.store_dir = store_dir
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        make_dir_if_not_exist(self.store_dir)
+
+        self.index_file_path = os.path.join(self.store_dir, self.INDEX_FILE_NAME)
+        self.keys = {}
+        if os.path.exists(self.index_file_path):
+            self.keys = read_json_from_file(self.index_file_path)
+        self.buffers = {}
+        self.num_pending = 0
+
+    def column_file_path(self, key, column):
+        return os.path.join(self.store_dir, "{}.{}.bin".format(self.keys[key], column))
+
+    def append(self, metric_input, step, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            for key, val in metric_input.items():
+                num = MetricSummary.to_number(val)
+                if num is None:
+                    continue
+                buffer = self.buffers.get(key)
+                if buffer is None:
+                    buffer = self.buffers[key] = tuple(array(typecode) for _, typecode, _ in self.COLUMNS)
+                buffer[0].append(step)
+                buffer[1].append(timestamp)
+                buffer[2].append(num)
+                self.num_pending += 1
+            if self.num_pending >= self.buffer_size:
+                self._flush()
+
+    def append_batch(self, columns, steps, timestamp=None):
+        """
+        Appends rows given as columns, {key: list or array}, with their steps.
+        Columns are converted in one NumPy pass when it is installed.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            for key, values in columns.items():
+                arr = MetricSummary.to_float_array(values)
+                if arr is None:
+                    points = [(step, MetricSummary.to_number(val)) for step, val in zip(steps, values)]
+                    points = [(step, num) for step, num in points if num is not None]
+                    step_column = array("q", [step for step, _ in points])
+                    value_column = array("d", [num for _, num in points])
+                else:
+                    # NaN marks values to_number rejects
+                    indices = (arr == arr).nonzero()[0]
+                    step_column = array("q", [steps[i] for i in indices.tolist()])
+                    value_column = array("d")
+                    value_column.frombytes(arr[indices].tobytes())
+                if len(value_column) == 0:
+                    continue
+                buffer = self.buffers.get(key)
+                if buffer is None:
+                    buffer = self.buffers[key] = tuple(array(typecode) for _, typecode, _ in self.COLUMNS)
+                buffer[0].extend(step_column)
+                buffer[1].extend(array("d", [timestamp]) * len(value_column))
+                buffer[2].extend(value_column)
+                self.num_pending += len(value_column)
+            if self.num_pending >= self.buffer_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+    def _flush(self):
+        new_keys = False
+        for key, buffer in self.buffers.items():
+            if len(buffer[0]) == 0:
+                continue
+            if key not in self.keys:
+                self.keys[key] = len(self.keys)
+                new_keys = True
+            for (column, _, _), column_data in zip(self.COLUMNS, buffer):
+                with open(self.column_file_path(key, column), "ab") as fp:
+                    swap_to_little_endian(column_data).tofile(fp)
+                del column_data[:]
+        if new_keys:
+            write_json_to_file(self.keys, self.index_file_path)
+        self.num_pending = 0
+
+    # ******************** Read ******************** #
+    def get_keys(self):
+        return list(self.keys.keys())
+
+    def iter_series(self, key):
+        """
+        Yields (step, timestamp, value) tuples of a key without NumPy.
+        """
+        columns = []
+        for column, typecode, _ in self.COLUMNS:
+            column_data = array(typecode)
+            file_path = self.column_file_path(key, column)
+            with open(file_path, "rb") as fp:
+                column_data.fromfile(fp, os.path.getsize(file_path) // column_data.itemsize)
+            columns.append(swap_to_little_endian(column_data))
+        return zip(*columns)
+
+    def get_series(self, key):
+        """
+        Returns a dict of read-only NumPy arrays (step, timestamp, value)
+        memory-mapped from the column files of a key.
+        """
+        import numpy as np
+
+        series = {}
+        for column, _, dtype in self.COLUMNS:
+            file_path = self.column_file_path(key, column)
+            if os.path.getsize(file_path) == 0:
+                series[column] = np.empty(0, dtype=dtype)
+            else:
+                series[column] = np.memmap(file_path, dtype=dtype, mode="r")
+        return series
+
+    def get_summary(self):
+        """
+        Rebuilds a MetricSummary from the stored columns.
+        """
+        metric_summary = MetricSummary()
+        for key in self.get_keys():
+            for step, _, val in self.iter_series(key):
+                metric_summary.update({key: val}, step)
+        return metric_summary
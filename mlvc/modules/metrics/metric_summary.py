@@ -0,0 +1,227 @@
+import math
+import numbers
+
+from mlvc.utils import serialization
+
+
+class MetricSummary(object):
+    """
+    Running aggregates (last, min, max, mean, count and the steps of the min
+    and max values) of every logged metric key, updated on each log_metric call
+    so commit does not have to re-read the metric log.
+    """
+
+    def __init__(self):
+        self.next_step = 0
+        self.last_values = {}
+        self.aggregates = {}
+        # Latest distribution summary of keys logged with log_distribution
+        self.distributions = {}
+
+    @staticmethod
+    def to_number(val):
+        if isinstance(val, bool):
+            return None
+        if isinstance(val, numbers.Number):
+            val = float(val)
+        elif isinstance(val, str):
+            try:
+                val = float(val)
+            except ValueError:
+                return None
+        else:
+            return None
+        if math.isnan(val):
+            return None
+        return val
+
+    @staticmethod
+    def to_float_array(values):
+        """
+        float64 NumPy array of a column with NaN where to_number gives None, None without NumPy.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            return None
+        arr = np.asarray(values)
+        if arr.ndim != 1:
+            raise Exception("Metric batch columns must be 1-D, got shape {}".format(arr.shape))
+        if arr.dtype.kind in "iuf" and not isinstance(values, np.ndarray) and any(isinstance(val, bool)
+                                                                                 for val in values):
+            # NumPy turns bools mixed with numbers into numbers, to_number skips them
+            arr = np.asarray(values, dtype=object)
+        if arr.dtype.kind in "iuf":
+            return arr.astype(np.float64)
+        if arr.dtype.kind == "b":
+            return np.full(len(arr), np.nan)
+        nums = [MetricSummary.to_number(val) for val in arr.tolist()]
+        return np.array([np.nan if num is None else num for num in nums], dtype=np.float64)
+
+    @staticmethod
+    def to_python(val):
+        # NumPy scalars to plain Python values, so they serialize
+        return val.item() if hasattr(val, "item") and not isinstance(val, (str, bytes)) else val
+
+    def update(self, metric_input, step=None):
+        if step is None:
+            step = self.next_step
+        self.next_step = max(self.next_step, step + 1)
+
+        for key, val in metric_input.items():
+            self.last_values[key] = val
+            num = self.to_number(val)
+            if num is None:
+                continue
+            agg = self.aggregates.get(key)
+            if agg is None:
+                self.aggregates[key] = {
+                    "count": 1, "sum": num,
+                    "min": num, "min_step": step,
+                    "max": num, "max_step": step,
+                }
+                continue
+            agg["count"] += 1
+            agg["sum"] += num
+            if num < agg["min"]:
+                agg["min"] = num
+                agg["min_step"] = step
+            if num > agg["max"]:
+                agg["max"] = num
+                agg["max_step"] = step
+        return step
+
+    def update_batch(self, columns, steps=None):
+        """
+        Updates from a batch of rows given as columns, {key: list or array},
+        with one pass per key. Returns the steps of the rows.
+        """
+        num_rows = None
+        for key, values in columns.items():
+            if getattr(values, "ndim", 1) != 1:
+                raise Exception("Metric batch column {} must be 1-D, got shape {}".format(key, values.shape))
+            if num_rows is None:
+                num_rows = len(values)
+            elif len(values) != num_rows:
+                raise Exception("Metric batch columns have different lengths")
+        num_rows = num_rows or 0
+        if steps is None:
+            steps = list(range(self.next_step, self.next_step + num_rows))
+        else:
+            steps = [int(step) for step in steps]
+            if len(steps) != num_rows:
+                raise Exception("Metric batch has {} steps for {} rows".format(len(steps), num_rows))
+        if num_rows == 0:
+            return steps
+        self.next_step = max(self.next_step, max(steps) + 1)
+
+        for key, values in columns.items():
+            self.last_values[key] = self.to_python(values[-1])
+            arr = self.to_float_array(values)
+            if arr is None:
+                # No NumPy, row by row
+                for step, val in zip(steps, values):
+                    self.update({key: val}, step)
+                continue
+            # NaN marks values to_number rejects
+            indices = (arr == arr).nonzero()[0]
+            if len(indices) == 0:
+                continue
+            valid = arr[indices]
+            min_index = int(indices[valid.argmin()])
+            max_index = int(indices[valid.argmax()])
+            batch_agg = {
+                "count": len(indices), "sum": float(valid.sum()),
+                "min": float(arr[min_index]), "min_step": steps[min_index],
+                "max": float(arr[max_index]), "max_step": steps[max_index],
+            }
+            self.merge_aggregate(key, batch_agg)
+        return steps
+
+    def update_distribution(self, key, distribution, step):
+        self.next_step = max(self.next_step, step + 1)
+        previous = self.distributions.get(key)
+        self.distributions[key] = {"count": (previous["count"] if previous else 0) + 1, "step": step,
+                                   "last": distribution}
+
+    def merge_aggregate(self, key, other_agg):
+        agg = self.aggregates.get(key)
+        if agg is None:
+            self.aggregates[key] = dict(other_agg)
+            return
+        agg["count"] += other_agg["count"]
+        agg["sum"] += other_agg["sum"]
+        if other_agg["min"] < agg["min"]:
+            agg["min"] = other_agg["min"]
+            agg["min_step"] = other_agg["min_step"]
+        if other_agg["max"] > agg["max"]:
+            agg["max"] = other_agg["max"]
+            agg["max_step"] = other_agg["max_step"]
+
+    def get_last_values(self):
+        return dict(self.last_values)
+
+    def get_summary(self):
+        summary = {}
+        for key, last in self.last_values.items():
+            summary[key] = {"last": last}
+            agg = self.aggregates.get(key)
+            if agg is not None:
+                summary[key].update({
+                    "count": agg["count"],
+                    "mean": agg["sum"] / agg["count"],
+                    "min": agg["min"],
+                    "min_step": agg["min_step"],
+                    "max": agg["max"],
+                    "max_step": agg["max_step"],
+                })
+        for key, distribution in self.distributions.items():
+            summary.setdefault(key, {})["distribution"] = distribution
+        return summary
+
+    def merge(self, other):
+        """
+        Folds the aggregates of another summary (e.g. another rank) into this one, last values stay ours.
+        """
+        self.next_step = max(self.next_step, other.next_step)
+        for key, val in other.last_values.items():
+            self.last_values.setdefault(key, val)
+        for key, other_agg in other.aggregates.items():
+            self.merge_aggregate(key, other_agg)
+        for key, distribution in other.distributions.items():
+            self.distributions.setdefault(key, distribution)
+        return self
+
+    def to_dict(self):
+        return {"next_step": self.next_step, "last_values": self.last_values, "aggregates": self.aggregates,
+                "distributions": self.distributions}
+
+    @classmethod
+    def from_dict(cls, data):
+        metric_summary = cls()
+        metric_summary.next_step = data["next_step"]
+        metric_summary.last_values = dict(data["last_values"])
+        metric_summary.aggregates = {key: dict(agg) for key, agg in data["aggregates"].items()}
+        metric_summary.distributions = dict(data.get("distributions", {}))
+        return metric_summary
+
+    @classmethod
+    def from_log_file(cls, metric_log_file_path):
+        """
+        Rebuilds the summary by streaming through a JSON lines metric log.
+        """
+        metric_summary = cls()
+        with open(metric_log_file_path, encoding="utf-8") as fp:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                log_json = serialization.loads(line)
+                if log_json.get("kind") == "distribution":
+                    for key, distribution in log_json["payload"].items():
+                        metric_summary.update_distribution(key, distribution, log_json["step"])
+                elif "steps" in log_json:
+                    metric_summary.update_batch(log_json["payload"], log_json["steps"])
+                else:
+                    metric_summary.update(log_json["payload"], log_json.get("step"))
+        return metric_summary
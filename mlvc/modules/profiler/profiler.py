@@ -0,0 +1,132 @@
+import time
+import threading
+from contextlib import ContextDecorator
+
+from mlvc.modules.profiler.latency_sketch import LatencySketch
+
+
+class PhaseTimer(ContextDecorator):
+    """
+    Times a phase of the training loop, usable as a context manager or a
+    decorator. `get_profiler` is resolved on entry so a decorator can be
+    applied before the run exists. Safe to share between threads.
+    """
+
+    def __init__(self, get_profiler, name):
+        self.get_profiler = get_profiler
+        self.name = name
+        self.local = threading.local()
+
+    def __enter__(self):
+        profiler = self.get_profiler()
+        if not hasattr(self.local, "starts"):
+            self.local.starts = []
+        self.local.starts.append((profiler, time.perf_counter()))
+        profiler.enter_phase(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        profiler, start = self.local.starts.pop()
+        profiler.exit_phase(self.name, time.perf_counter() - start)
+        return False
+
+
+class Profiler(object):
+    """
+    Step level profile of a run: a latency sketch per phase, step markers for
+    step time and throughput, and the average system utilization observed
+    while each phase was running (fed by SystemStats samples).
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.active_phases = {}
+        self.utilization = {}
+
+        # Steps
+        self.step_sketch = LatencySketch(relative_accuracy)
+        self.num_steps = 0
+        self.num_step_samples = 0
+        self.first_step_samples = 0
+        self.first_step_at = None
+        self.last_step_at = None
+
+    # ******************** Phases ******************** #
+    def enter_phase(self, name):
+        with self.lock:
+            self.active_phases[name] = self.active_phases.get(name, 0) + 1
+
+    def exit_phase(self, name, duration):
+        with self.lock:
+            sketch = self.phases.get(name)
+            if sketch is None:
+                sketch = self.phases[name] = LatencySketch(self.relative_accuracy)
+            sketch.add(duration)
+            self.active_phases[name] -= 1
+            if self.active_phases[name] == 0:
+                del self.active_phases[name]
+
+    def step(self, num_samples=None):
+        """
+        Marks the end of a training step, `num_samples` is the batch size used for throughput.
+        """
+        now = time.perf_counter()
+        with self.lock:
+            if self.last_step_at is not None:
+                self.step_sketch.add(now - self.last_step_at)
+            else:
+                self.first_step_at = now
+                self.first_step_samples = num_samples or 0
+            self.last_step_at = now
+            self.num_steps += 1
+            if num_samples is not None:
+                self.num_step_samples += num_samples
+
+    # ******************** Utilization ******************** #
+    def add_system_stats(self, system_stats):
+        """
+        SystemStats listener, attributes a sample to every phase running when it was taken.
+        """
+        gpus = system_stats.get("gpu") or []
+        gpu_load = sum(gpu["load"] for gpu in gpus) / len(gpus) if gpus else None
+        with self.lock:
+            for name in self.active_phases:
+                utilization = self.utilization.setdefault(name, {"samples": 0, "cpu_percent": 0.0, "gpu_load": 0.0})
+                utilization["samples"] += 1
+                utilization["cpu_percent"] += system_stats["cpu"]["percentage"]
+                if gpu_load is not None:
+                    utilization["gpu_load"] += gpu_load
+
+    # ******************** Summary ******************** #
+    def get_summary(self):
+        with self.lock:
+            phases = {}
+            for name, sketch in self.phases.items():
+                phases[name] = sketch.get_summary()
+                utilization = self.utilization.get(name)
+                if utilization is not None:
+                    phases[name]["utilization"] = {
+                        "samples": utilization["samples"],
+                        "cpu_percent": utilization["cpu_percent"] / utilization["samples"],
+                        "gpu_load": utilization["gpu_load"] / utilization["samples"],
+                    }
+
+            # Throughput is measured from the first step marker, which excludes the first batch
+            elapsed = self.last_step_at - self.first_step_at if self.num_steps > 1 else None
+            timed_samples = self.num_step_samples - self.first_step_samples
+            steps = self.step_sketch.get_summary()
+            steps.update({
+                "count": self.num_steps,
+                "samples": self.num_step_samples,
+                "steps_per_sec": (self.num_steps - 1) / elapsed if elapsed else None,
+                "samples_per_sec": timed_samples / elapsed if elapsed and timed_samples else None,
+            })
+            return {"phases": phases, "steps": steps}
+
+    def get_sketches(self):
+        with self.lock:
+            sketches = {name: sketch.to_dict() for name, sketch in self.phases.items()}
+            sketches["__step__"] = self.step_sketch.to_dict()
+            return sketches
@@ -1,3 +1,4 @@
+import os
 import time
 import platform
 import psutil
@@ -6,12 +7,67 @@ import GPUtil
 
 
 class SystemStats(threading.Thread):
+    """
+    Samples system, GPU and training process (pid and children) utilization
+    every `interval` seconds. Samples go into a preallocated ring buffer of
+    `buffer_size` slots and are written to the logger in batches of
+    `flush_every`. Samples pushed out of the ring are averaged in groups of
+    `downsample` into a second, coarse ring holding the older history.
 
-    def __init__(self, logger):
+    The sampler measures its own CPU time, nvidia-smi runs of GPUtil
+    included, and stretches the interval when the moving average of its
+    recent cost goes above `max_overhead` of one core.
+
+    One sampler can feed several runs: every logger added with add_logger gets
+    the samples taken while it was attached.
+    """
+
+    # Weight of the latest sample in the moving average of the overhead
+    OVERHEAD_SMOOTHING = 0.2
+
+    def __init__(self, logger=None, interval=1.0, buffer_size=600, flush_every=10, downsample=10, max_overhead=0.02,
+                 pid=None, process_metrics=True):
         super().__init__()
+        self.daemon = True
         self.should_run = True
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
         self.gpus = GPUtil.getGPUs()
-        self.logger = logger
+
+        self.target_interval = interval
+        self.interval = interval
+        self.max_interval = max(interval, 1.0) * 30
+        self.max_overhead = max_overhead
+        self.flush_every = flush_every
+        self.downsample = downsample
+
+        # Ring buffers
+        self.buffer_size = buffer_size
+        self.samples = [None] * buffer_size
+        self.num_samples = 0
+        self.num_flushed = 0
+        # Logger -> number of samples already written to it
+        self.loggers = {}
+        if logger is not None:
+            self.loggers[logger] = 0
+        self.history = [None] * buffer_size
+        self.num_history = 0
+        self.evicted = []
+
+        # Processes, kept across samples so cpu_percent has a reference point
+        self.process_metrics = process_metrics
+        self.pid = pid or os.getpid()
+        self.processes = {}
+
+        # Callbacks receiving every sample, e.g. the profiler
+        self.listeners = []
+
+        # Own cost
+        self.sampling_cpu_time = 0.0
+        self.overhead = None
+        self.started_at = None
+        self.listener_errors = 0
+        self.last_listener_error = None
 
     def get_system_info(self):
         gpu_info = []
@@ -23,9 +79,10 @@ class SystemStats(threading.Thread):
                 "driver": gpu.driver,
                 "serial": gpu.serial,
             })
+        cpu_freq = psutil.cpu_freq()
         return {
             "os": {
-                "dist": str(platform.dist()),
+                "dist": str(self.get_dist()),
                 "system": platform.system(),
                 "machine": platform.machine(),
                 "platform": platform.platform(),
@@ -38,8 +95,8 @@ class SystemStats(threading.Thread):
                     "logical": psutil.cpu_count(logical=True)
                 },
                 "freq": {
-                    "min": psutil.cpu_freq().min,
-                    "max": psutil.cpu_freq().max
+                    "min": cpu_freq.min if cpu_freq else None,
+                    "max": cpu_freq.max if cpu_freq else None
                 },
             },
             "ram": {
@@ -48,33 +105,253 @@ class SystemStats(threading.Thread):
             "gpus": gpu_info
         }
 
+    @staticmethod
+    def get_dist():
+        # platform.dist() was removed in Python 3.8
+        try:
+            os_release = platform.freedesktop_os_release()
+        except (AttributeError, OSError):
+            return ()
+        return os_release.get("ID", ""), os_release.get("VERSION_ID", ""), os_release.get("VERSION_CODENAME", "")
+
+    # ******************** Sampling ******************** #
+    def get_gpu_stats(self):
+        gpu_stats = []
+        for gpu in GPUtil.getGPUs():
+            gpu_stats.append({
+                "name": gpu.name,
+                "uuid": gpu.uuid,
+                "load": gpu.load,
+                "memory_total": gpu.memoryTotal,
+                "memory_used": gpu.memoryUsed,
+                "memory_free": gpu.memoryFree,
+                "driver": gpu.driver,
+                "serial": gpu.serial,
+                "temperature": gpu.temperature,
+            })
+        return gpu_stats
+
+    def get_process(self, pid):
+        process = self.processes.get(pid)
+        if process is None:
+            process = self.processes[pid] = psutil.Process(pid)
+            process.cpu_percent(None)
+        return process
+
+    def get_process_stats(self):
+        try:
+            root = self.get_process(self.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+
+        totals = {"pid": self.pid, "num_processes": 0, "rss": 0, "cpu_percent": 0.0, "read_bytes": 0,
+                  "write_bytes": 0, "open_files": 0, "threads": 0}
+        children = []
+        alive = set()
+        for process in processes:
+            try:
+                process = self.get_process(process.pid)
+                with process.oneshot():
+                    stats = {
+                        "pid": process.pid,
+                        "rss": process.memory_info().rss,
+                        "cpu_percent": process.cpu_percent(None),
+                        "threads": process.num_threads(),
+                        "open_files": process.num_fds() if hasattr(process, "num_fds") else len(process.open_files()),
+                    }
+                    if hasattr(process, "io_counters"):
+                        io_counters = process.io_counters()
+                        stats["read_bytes"] = io_counters.read_bytes
+                        stats["write_bytes"] = io_counters.write_bytes
+            except psutil.Error:
+                continue
+            alive.add(process.pid)
+            totals["num_processes"] += 1
+            for key in ("rss", "cpu_percent", "threads", "open_files", "read_bytes", "write_bytes"):
+                totals[key] += stats.get(key, 0)
+            if process.pid != self.pid:
+                children.append(stats)
+
+        # Forget exited children
+        for pid in list(self.processes):
+            if pid not in alive:
+                del self.processes[pid]
+        totals["children"] = children
+        return totals
+
+    def sample(self):
+        memory = psutil.virtual_memory()
+        system_stats = {
+            "timestamp": time.time(),
+            "cpu": {
+                "percentage": psutil.cpu_percent(interval=None),
+                "memory": memory.percent
+            },
+            "gpu": self.get_gpu_stats()
+        }
+        if self.process_metrics:
+            system_stats["process"] = self.get_process_stats()
+        return system_stats
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners = self.listeners + [listener]
+
+    def remove_listener(self, listener):
+        with self.lock:
+            self.listeners = [fn for fn in self.listeners if fn is not listener]
+
+    def add_logger(self, logger):
+        with self.lock:
+            self.loggers[logger] = self.num_samples
+
+    def remove_logger(self, logger):
+        """
+        Writes the samples the logger has not seen yet and detaches it.
+        """
+        self.flush()
+        with self.lock:
+            self.loggers.pop(logger, None)
+
+    # ******************** Buffers ******************** #
+    def add_sample(self, system_stats):
+        with self.lock:
+            slot = self.num_samples % self.buffer_size
+            evicted = self.samples[slot]
+            self.samples[slot] = system_stats
+            self.num_samples += 1
+            if evicted is not None:
+                self.evicted.append(evicted)
+                if len(self.evicted) >= self.downsample:
+                    self.history[self.num_history % self.buffer_size] = self.average_samples(self.evicted)
+                    self.num_history += 1
+                    self.evicted = []
+
+    def flush(self):
+        with self.lock:
+            pending = {}
+            for logger, num_flushed in self.loggers.items():
+                first = max(num_flushed, self.num_samples - self.buffer_size)
+                pending[logger] = [self.samples[i % self.buffer_size] for i in range(first, self.num_samples)]
+                self.loggers[logger] = self.num_samples
+            self.num_flushed = self.num_samples
+        for logger, samples in pending.items():
+            for system_stats in samples:
+                logger.debug(system_stats)
+
+    @staticmethod
+    def average_samples(samples):
+        def mean(values):
+            values = [val for val in values if val is not None]
+            return sum(values) / len(values) if values else None
+
+        averaged = {
+            "timestamp": samples[-1]["timestamp"],
+            "num_samples": len(samples),
+            "cpu": {
+                "percentage": mean([s["cpu"]["percentage"] for s in samples]),
+                "memory": mean([s["cpu"]["memory"] for s in samples]),
+            },
+            "gpu": [],
+        }
+        for i, gpu in enumerate(samples[-1]["gpu"]):
+            gpus = [s["gpu"][i] for s in samples if len(s["gpu"]) > i]
+            averaged["gpu"].append({
+                "name": gpu["name"],
+                "uuid": gpu["uuid"],
+                "load": mean([g["load"] for g in gpus]),
+                "memory_used": mean([g["memory_used"] for g in gpus]),
+            })
+        processes = [s["process"] for s in samples if s.get("process")]
+        if processes:
+            averaged["process"] = {key: mean([p[key] for p in processes])
+                                   for key in ("rss", "cpu_percent", "threads", "open_files")}
+        return averaged
+
+    def get_samples(self, since=0.0):
+        """
+        Full rate samples still in the ring buffer taken from `since` on, oldest first.
+        """
+        with self.lock:
+            first = max(0, self.num_samples - self.buffer_size)
+            samples = [self.samples[i % self.buffer_size] for i in range(first, self.num_samples)]
+        return [sample for sample in samples if sample["timestamp"] >= since]
+
+    def get_history(self, since=0.0):
+        """
+        Downsampled history from `since` on, oldest first: the averages of the samples which
+        left the ring buffer, then the samples still in it averaged the same way.
+        """
+        with self.lock:
+            first = max(0, self.num_history - self.buffer_size)
+            history = [self.history[i % self.buffer_size] for i in range(first, self.num_history)]
+            if self.evicted:
+                history.append(self.average_samples(self.evicted))
+        samples = self.get_samples(since)
+        return [averaged for averaged in history if averaged["timestamp"] >= since] + \
+            [self.average_samples(samples[i:i + self.downsample]) for i in range(0, len(samples), self.downsample)]
+
+    @staticmethod
+    def get_cpu_time():
+        # This thread plus the children which exited meanwhile, e.g. the nvidia-smi of every GPUtil.getGPUs()
+        times = os.times()
+        return time.thread_time() + times.children_user + times.children_system
+
+    def update_overhead(self, cpu_time, elapsed):
+        self.sampling_cpu_time += cpu_time
+        if elapsed <= 0:
+            return
+        # Recent samples only, a past burst must not keep the interval stretched
+        overhead = cpu_time / elapsed
+        if self.overhead is None:
+            self.overhead = overhead
+        else:
+            self.overhead += self.OVERHEAD_SMOOTHING * (overhead - self.overhead)
+
+    def get_overhead(self):
+        return {
+            "cpu_time": self.sampling_cpu_time,
+            "overhead": self.overhead or 0.0,
+            "interval": self.interval,
+            "listener_errors": self.listener_errors,
+        }
+
+    def adjust_interval(self):
+        overhead = self.get_overhead()["overhead"]
+        if overhead > self.max_overhead:
+            self.interval = min(self.interval * 1.5, self.max_interval)
+        elif overhead < self.max_overhead / 2 and self.interval > self.target_interval:
+            self.interval = max(self.interval / 1.5, self.target_interval)
+
+    def call_listener(self, listener, system_stats):
+        # A failing listener must not stop the sampling of every run
+        try:
+            listener(system_stats)
+        except Exception as e:
+            self.listener_errors += 1
+            self.last_listener_error = repr(e)
+
     def run(self):
-        while self.should_run:
-            cpu_per = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            mem_per = memory.percent
-            gpu_stats = []
-            for gpu in self.gpus:
-                gpu_stats.append({
-                    "name": gpu.name,
-                    "uuid": gpu.uuid,
-                    "load": gpu.load,
-                    "memory_total": gpu.memoryTotal,
-                    "memory_used": gpu.memoryUsed,
-                    "memory_free": gpu.memoryFree,
-                    "driver": gpu.driver,
-                    "serial": gpu.serial,
-                    "temperature": gpu.temperature,
-                })
-            system_stats = {
-                "cpu": {
-                    "percentage": cpu_per,
-                    "memory": mem_per
-                },
-                "gpu": gpu_stats
-            }
-            self.logger.debug(system_stats)
-            time.sleep(1)
+        self.started_at = time.monotonic()
+        last_sample_at = self.started_at
+        psutil.cpu_percent(interval=None)
+        while not self.stop_event.wait(self.interval):
+            cpu_start = self.get_cpu_time()
+            system_stats = self.sample()
+            self.add_sample(system_stats)
+            for listener in self.listeners:
+                self.call_listener(listener, system_stats)
+            if self.num_samples - self.num_flushed >= self.flush_every:
+                self.flush()
+            now = time.monotonic()
+            self.update_overhead(self.get_cpu_time() - cpu_start, now - last_sample_at)
+            last_sample_at = now
+            self.adjust_interval()
+        self.flush()
 
     def stop(self):
         self.should_run = False
+        self.stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
@@ -0,0 +1,117 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+class UploadQueue(object):
+    """
+    Persistent queue of run uploads backed by SQLite, so jobs survive process
+    restarts. Every run has one job with a state (pending, uploading, uploaded
+    or failed), a retry count and the last error. Jobs are claimed atomically,
+    several processes can drain the same queue.
+
+    Jobs left "uploading" by a process which no longer exists are put back to
+    pending, failed jobs are retried after `retry_backoff` * 2^retries seconds
+    until `max_retries` is reached.
+    """
+
+    PENDING = "pending"
+    UPLOADING = "uploading"
+    UPLOADED = "uploaded"
+    FAILED = "failed"
+
+    def __init__(self, file_path, max_retries=3, retry_backoff=30.0):
+        self.file_path = file_path
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "run_id TEXT PRIMARY KEY, "
+            "state TEXT NOT NULL, "
+            "retries INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt REAL NOT NULL DEFAULT 0, "
+            "pid INTEGER, "
+            "error TEXT, "
+            "updated_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, next_attempt)")
+        self.reset_stale_jobs()
+
+    @staticmethod
+    def pid_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def reset_stale_jobs(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT run_id, pid FROM jobs WHERE state = ?", (self.UPLOADING,)).fetchall()
+            for run_id, pid in rows:
+                if pid is None or not self.pid_alive(pid):
+                    self.conn.execute("UPDATE jobs SET state = ?, pid = NULL, updated_at = ? WHERE run_id = ?",
+                                      (self.PENDING, time.time(), run_id))
+
+    def enqueue(self, run_id):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (run_id, state, retries, next_attempt, updated_at) VALUES (?, ?, 0, 0, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET state = excluded.state, retries = 0, next_attempt = 0, "
+                "error = NULL, updated_at = excluded.updated_at WHERE state != ?",
+                (run_id, self.PENDING, time.time(), self.UPLOADING))
+
+    def claim(self):
+        """
+        Marks the next due job as uploading by this process and returns its run id, None if nothing is due.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT run_id FROM jobs WHERE (state = ? OR (state = ? AND retries < ?)) AND next_attempt <= ? "
+                    "ORDER BY next_attempt, updated_at LIMIT 1",
+                    (self.PENDING, self.FAILED, self.max_retries, now)).fetchone()
+                if row is not None:
+                    self.conn.execute("UPDATE jobs SET state = ?, pid = ?, updated_at = ? WHERE run_id = ?",
+                                      (self.UPLOADING, os.getpid(), now, row[0]))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return None if row is None else row[0]
+
+    def mark_uploaded(self, run_id):
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET state = ?, pid = NULL, error = NULL, updated_at = ? WHERE run_id = ?",
+                              (self.UPLOADED, time.time(), run_id))
+
+    def mark_failed(self, run_id, error):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, pid = NULL, error = ?, retries = retries + 1, "
+                "next_attempt = ? * (1 << retries) + ?, updated_at = ? WHERE run_id = ?",
+                (self.FAILED, str(error), self.retry_backoff, now, now, run_id))
+
+    def get_jobs(self, state=None):
+        query = "SELECT run_id, state, retries, next_attempt, error, updated_at FROM jobs"
+        params = ()
+        if state is not None:
+            query += " WHERE state = ?"
+            params = (state,)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY updated_at", params).fetchall()
+        keys = ("run_id", "state", "retries", "next_attempt", "error", "updated_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
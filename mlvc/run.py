@@ -0,0 +1,528 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future, wait
+
+from mlvc.utils.gen_utils import write_json_to_file, make_dir_if_not_exist
+from mlvc.modules.metrics.metric_summary import MetricSummary
+from mlvc.modules.metrics.metric_store import ColumnarMetricStore
+from mlvc.modules.metrics.distribution import describe_distribution
+from mlvc.storage.file_copy import hash_file, link_file, clone_file, copy_file
+from mlvc.modules.profiler.profiler import Profiler, PhaseTimer
+from mlvc.modules.profiler.latency_sketch import LatencySketch
+from mlvc.modules.git.git_snapshot import GitSnapshot
+from mlvc.modules.live.live_streamer import LiveStreamer
+from mlvc.modules.distributed.shards import (SHARDS_DIR_NAME, MERGED_LOG_FILES, get_shard_dir, clear_shard,
+                                             exchange_shards, merge_log_shards)
+
+
+class Run(object):
+    """
+    Handle of a run being recorded, returned by MLVC.create_run. Every run has
+    its own loggers, metric summary / store and profiler, so several runs can
+    be recorded concurrently in one process (e.g. the trials of a thread pool
+    hyperparameter search) and each can be used from several threads. System
+    stats come from one sampler per process, shared by all active runs.
+    """
+
+    GIT_DIFF_FILE_NAME = "code_diff.patch"
+
+    def __init__(self, mlvc, run_id, rank=0, world_size=1):
+        self.mlvc = mlvc
+        self.settings = mlvc.settings
+        self.run_id = run_id
+        self.project_id = mlvc.project_id
+        self.model_id = mlvc.model_id
+        self.rank = rank
+        self.world_size = world_size
+        self.run_dir = os.path.join(mlvc.mlvc_dir, run_id)
+        self.log_dir = self.run_dir if world_size == 1 else get_shard_dir(self.run_dir, rank)
+        self.lock = threading.RLock()
+        self.committed = False
+
+        self.run_logger = None
+        self.metric_logger = None
+        self.system_stats_logger = None
+        self.metric_summary = MetricSummary()
+        self.metric_store = None
+        self.metric_backend = None
+        self.output_capture = None
+        self.system_stats = None
+        self.started_at = None
+        self.profiler = Profiler()
+        self.git_snapshot = None
+        self.live_streamer = None
+        self.remote_run_id = None
+        # Artifact name -> record, and the futures of artifacts being placed
+        self.artifacts = {}
+        self.artifact_futures = {}
+
+    def is_primary_rank(self):
+        return self.rank == 0
+
+    def check_active(self):
+        if self.committed:
+            raise Exception("MLVC run {} already committed".format(self.run_id))
+
+    def start(self, name="", description="", capture_output=True):
+        make_dir_if_not_exist(self.log_dir)
+        if self.world_size > 1:
+            clear_shard(self.log_dir)
+        self.started_at = time.time()
+
+        # Collect Git details in the background, finished by commit
+        if self.is_primary_rank():
+            make_dir_if_not_exist(os.path.join(self.run_dir, "git"))
+            self.git_snapshot = GitSnapshot(lambda: self.mlvc.git_utils, os.path.join(self.mlvc.mlvc_dir, "git_cache"),
+                                            self.settings["git_cache_size"])
+            self.git_snapshot.start()
+
+        # Make loggers
+        log_details = self.init_loggers(capture_output)
+
+        # Shared system stats sampler, also seen by the profiler to attribute utilization to phases
+        self.system_stats = self.mlvc.acquire_system_stats()
+        self.system_stats.add_logger(self.system_stats_logger)
+        self.system_stats.add_listener(self.profiler.add_system_stats)
+
+        # Other ranks only write their shard, the run document belongs to rank 0
+        if not self.is_primary_rank():
+            return
+
+        # Build run object
+        run = {
+            "project_id": self.project_id,
+            "model_id": self.model_id,
+            "run_id": self.run_id,
+            "remote_run_id": "",
+            "name": name,
+            "description": description,
+            "run_dir": self.run_dir,
+
+            "system_info": self.system_stats.get_system_info(),
+
+            "ann": {},
+
+            "code": {
+                "git": {"diff_file_name": self.GIT_DIFF_FILE_NAME, "status": "pending"},
+                "files": []
+            },
+
+            "config": {},
+
+            "model": {},
+
+            "logs": log_details,
+
+            "results": {},
+
+            "artifacts": {},
+
+            "blobs": {},
+
+            "extra_info": {},
+            "status": "draft",
+
+            "created_at": time.time(),
+        }
+        self.mlvc.mlvc_db.insert_run(run)
+        if not self.settings["git_snapshot_async"]:
+            self.finish_git_snapshot()
+        if self.settings["live_streaming"]:
+            self.start_live_streaming()
+
+    def start_live_streaming(self):
+        self.live_streamer = LiveStreamer(self.send_live_batch,
+                                          os.path.join(self.mlvc.mlvc_dir, "live_spool", self.run_id),
+                                          batch_size=self.settings["live_batch_size"],
+                                          flush_interval=self.settings["live_flush_interval"],
+                                          queue_size=self.settings["live_queue_size"],
+                                          full_policy=self.settings["live_queue_full_policy"],
+                                          spool_max_bytes=self.settings["live_spool_max_bytes"])
+        self.live_streamer.start()
+        self.system_stats.add_listener(self.live_streamer.add_system_stats)
+
+    def send_live_batch(self, seq, body):
+        # Runs on the streamer thread, the remote run is created by the first batch
+        if self.remote_run_id is None:
+            self.remote_run_id = self.mlvc.ensure_remote_run(self.run_id)
+        self.mlvc.mlvc_api.send_live_batch(self.project_id, self.model_id, self.remote_run_id, seq, body)
+
+    def stop_live_streaming(self):
+        if self.live_streamer is None:
+            return None
+        self.system_stats.remove_listener(self.live_streamer.add_system_stats)
+        live_stats = self.live_streamer.stop(self.settings["live_stop_timeout"])
+        self.run_logger.debug({"live_streaming": live_stats})
+        return live_stats
+
+    def finish_git_snapshot(self):
+        """
+        Waits for the git capture of the run and places the diff in the run directory.
+        """
+        if self.git_snapshot is None:
+            return
+        git_snapshot, self.git_snapshot = self.git_snapshot, None
+        try:
+            repo_details, patch_path = git_snapshot.wait()
+        except Exception as e:
+            # A run is not lost because git failed, the error is kept with it
+            self.run_logger.error("Git capture failed: {}".format(e))
+            repo_details = {"status": "failed", "error": str(e)}
+        else:
+            self.mlvc.place_file(patch_path, self.run_id, self.run_dir, os.path.join("git", self.GIT_DIFF_FILE_NAME))
+            repo_details["status"] = "captured"
+        repo_details["diff_file_name"] = self.GIT_DIFF_FILE_NAME
+        self.mlvc.mlvc_db.update_run(self.run_id, self.mlvc.mlvc_db.set_nested(["code", "git"], repo_details))
+
+    # ******************** Add Data ******************** #
+    def add_annotation(self, ann_input, ann_input_type):
+        self.mlvc.add_annotation(ann_input, ann_input_type, run_id=self.run_id)
+
+    def add_code_file(self, file_path):
+        self.mlvc.add_code_file(file_path, run_id=self.run_id)
+
+    def add_config(self, config_input):
+        self.mlvc.add_config(config_input, run_id=self.run_id)
+
+    def add_result(self, result_obj):
+        self.mlvc.add_result(result_obj, run_id=self.run_id)
+
+    # ******************** Artifacts ******************** #
+    def add_artifact(self, file_path, name=None, artifact_type="file", step=None, metadata=None, link=False):
+        """
+        Places a file, e.g. a checkpoint, in the run's artifacts directory
+        without blocking the training loop. A hardlink (only with `link`, for
+        files which get replaced rather than rewritten in place), a reflink or
+        a copy is made and hashed on the background I/O pool, so the source
+        must not change until the returned future is done.
+        With dedup_storage, content already in the blob store is linked instead
+        of copied and the hash is recorded in the run's `blobs` manifest.
+        The future's result is the artifact record, commit waits for all of them.
+        """
+        if not os.path.isfile(file_path):
+            raise Exception("Artifact {} is not a file".format(file_path))
+        artifacts_dir = os.path.join(self.log_dir, "artifacts")
+        dest_path = os.path.normpath(os.path.join(artifacts_dir, name or os.path.basename(file_path)))
+        if not dest_path.startswith(artifacts_dir + os.sep):
+            raise Exception("Artifact name {!r} is outside the artifacts directory".format(name))
+        name = os.path.relpath(dest_path, artifacts_dir)
+
+        artifact = {
+            "name": name,
+            "type": artifact_type,
+            "file_name": os.path.relpath(dest_path, self.run_dir),
+            "source": os.path.abspath(file_path),
+            "metadata": metadata or {},
+            "created_at": time.time(),
+        }
+        future = Future()
+        with self.lock:
+            # Registered together with the active check, under the lock commit takes to set `committed`
+            self.check_active()
+            if step is None and self.metric_summary.next_step > 0:
+                step = self.metric_summary.next_step - 1
+            artifact["step"] = step
+            previous = self.artifact_futures.get(name)
+            self.artifact_futures[name] = future
+            try:
+                # Submitted under the lock, so a placement is always queued after the one it waits for
+                placed = self.mlvc.io_pool.submit(self.place_artifact, file_path, dest_path, artifact, link, previous)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+        placed.add_done_callback(lambda placed: self.set_future_result(future, placed))
+        return future
+
+    @staticmethod
+    def set_future_result(future, placed):
+        if placed.exception() is not None:
+            future.set_exception(placed.exception())
+        else:
+            future.set_result(placed.result())
+
+    def place_artifact(self, file_path, dest_path, artifact, link, previous):
+        """
+        Background part of add_artifact, a failure is recorded in the artifact's status.
+        """
+        if previous is not None:
+            # Same name, the earlier placement must land before this one replaces it
+            wait([previous])
+        try:
+            make_dir_if_not_exist(os.path.dirname(dest_path))
+            method = None
+            if link and link_file(file_path, dest_path):
+                method = "hardlink"
+            elif clone_file(file_path, dest_path):
+                method = "reflink"
+            if method is not None:
+                # A hardlink / reflink is kept as is, it shares the source's data and only gets hashed
+                digest = hash_file(dest_path)
+            elif self.settings["dedup_storage"]:
+                method, digest = self.mlvc.blob_store.add_copy(file_path, dest_path)
+            else:
+                method, digest = copy_file(file_path, dest_path)
+            if self.settings["dedup_storage"] and self.is_primary_rank():
+                self.mlvc.record_blob(self.run_id, artifact["file_name"], digest)
+            artifact.update(status="done", method=method, sha256=digest, size=os.path.getsize(dest_path))
+        except Exception as e:
+            artifact.update(status="failed", error=str(e))
+        with self.lock:
+            self.artifacts[artifact["name"]] = artifact
+        if self.is_primary_rank():
+            self.mlvc.mlvc_db.update_run(self.run_id, self.mlvc.mlvc_db.set_nested(["artifacts", artifact["name"]],
+                                                                                   artifact))
+        return artifact
+
+    def wait_artifacts(self):
+        with self.lock:
+            futures = list(self.artifact_futures.values())
+        wait(futures)
+        return dict(self.artifacts)
+
+    def get_doc(self):
+        return self.mlvc.mlvc_db.get_run(self.run_id)
+
+    # ******************** Add Logs ******************** #
+    def log(self, line):
+        self.check_active()
+        self.run_logger.debug(line)
+
+    def log_metric(self, metric_input, step=None):
+        with self.lock:
+            self.check_active()
+            step = self.metric_summary.update(metric_input, step)
+            if self.metric_store is not None:
+                self.metric_store.append(metric_input, step)
+        if self.live_streamer is not None:
+            self.live_streamer.add_metric(metric_input, step)
+        if self.metric_backend != "columnar":
+            self.metric_logger.debug(metric_input, extra={"step": step})
+
+    def log_metrics_batch(self, metrics, steps=None):
+        """
+        Logs many rows at once, `metrics` being {key: list or NumPy array} of
+        equal lengths and `steps` their steps (default: the next steps). The
+        batch is one summary update and one metric log record.
+        """
+        columns = {key: values.tolist() if hasattr(values, "tolist") else list(values)
+                   for key, values in metrics.items()}
+        with self.lock:
+            self.check_active()
+            steps = self.metric_summary.update_batch(metrics, steps)
+            if self.metric_store is not None:
+                self.metric_store.append_batch(metrics, steps)
+        if not steps:
+            return steps
+        if self.live_streamer is not None:
+            self.live_streamer.add_metrics_batch(columns, steps)
+        if self.metric_backend != "columnar":
+            self.metric_logger.debug(columns, extra={"steps": steps})
+        return steps
+
+    def log_distribution(self, metric_input, step=None, bins=None):
+        """
+        Logs a histogram / percentile summary of every array or tensor in
+        `metric_input` instead of its elements. Needs NumPy.
+        """
+        bins = bins or self.settings["distribution_bins"]
+        distributions = {key: describe_distribution(values, bins) for key, values in metric_input.items()}
+        with self.lock:
+            self.check_active()
+            if step is None:
+                step = self.metric_summary.next_step
+            for key, distribution in distributions.items():
+                self.metric_summary.update_distribution(key, distribution, step)
+        if self.live_streamer is not None:
+            self.live_streamer.add_distribution(distributions, step)
+        # Written to the JSON log whatever the backend, the columnar store only holds scalars
+        self.metric_logger.debug(distributions, extra={"step": step, "kind": "distribution"})
+        return step
+
+    def get_metric_summary(self):
+        with self.lock:
+            return self.metric_summary.get_summary()
+
+    def flush_metric_store(self):
+        with self.lock:
+            if self.metric_store is not None and not self.committed:
+                self.metric_store.flush()
+
+    def get_metric_series(self, key):
+        return self.mlvc.get_metric_series(key, run_id=self.run_id)
+
+    # ******************** Profiling ******************** #
+    def timer(self, name):
+        """
+        Context manager / decorator timing a phase of the training loop, e.g.
+        `with run.timer("data"):` or `@run.timer("forward")`.
+        """
+        return PhaseTimer(lambda: self.profiler, name)
+
+    def step(self, num_samples=None):
+        self.profiler.step(num_samples)
+
+    def get_profile(self):
+        return self.profiler.get_summary()
+
+    # ******************** Commit ******************** #
+    def commit(self, enqueue_upload=False):
+        with self.lock:
+            self.check_active()
+            self.committed = True
+        self.wait_artifacts()
+        # Detach from the system stats sampler, its pending samples are written to our logger first
+        self.system_stats.remove_listener(self.profiler.add_system_stats)
+        self.system_stats.remove_logger(self.system_stats_logger)
+        self.stop_live_streaming()
+        self.finish_git_snapshot()
+        profile = self.write_profile()
+        # Remove Loggers
+        self.remove_loggers()
+        self.mlvc.deactivate_run(self)
+
+        metric_summary = self.metric_summary
+        ranks = None
+        if self.world_size > 1:
+            shards = exchange_shards(self.run_dir, self.run_id, self.rank, self.world_size,
+                                     {"rank": self.rank, "finished_at": time.time(),
+                                      "metric_summary": metric_summary.to_dict(), "profile": profile,
+                                      "sketches": self.profiler.get_sketches(), "artifacts": self.artifacts},
+                                     self.settings["distributed_commit_timeout"])
+            if not self.is_primary_rank():
+                return
+            metric_summary, ranks = self.merge_shards(metric_summary, shards)
+        self.mlvc.submit_run(self.run_id, metric_summary, profile, ranks, enqueue_upload)
+
+    def merge_shards(self, metric_summary, shards):
+        """
+        Rank 0 side of a distributed commit: merges the log shards of the ranks
+        by timestamp into the run's log files and aggregates metrics and
+        profiles across ranks.
+        """
+        for file_name in MERGED_LOG_FILES:
+            shard_paths = {rank: os.path.join(get_shard_dir(self.run_dir, rank), file_name) for rank in shards}
+            merge_log_shards(shard_paths, os.path.join(self.run_dir, file_name))
+
+        merged_summary = MetricSummary.from_dict(metric_summary.to_dict())
+        merged_sketches = {}
+        ranks = {"world_size": self.world_size, "missing": [rank for rank in range(self.world_size) if rank not in shards],
+                 "shards": {}}
+        for rank, shard in sorted(shards.items()):
+            rank_summary = MetricSummary.from_dict(shard["metric_summary"])
+            if rank != self.rank:
+                merged_summary.merge(rank_summary)
+            for name, sketch in shard["sketches"].items():
+                sketch = LatencySketch.from_dict(sketch)
+                if name in merged_sketches:
+                    merged_sketches[name].merge(sketch)
+                else:
+                    merged_sketches[name] = sketch
+            if rank != self.rank:
+                for name, artifact in shard.get("artifacts", {}).items():
+                    self.mlvc.mlvc_db.update_run(self.run_id, self.mlvc.mlvc_db.set_nested(
+                        ["artifacts", "rank{}/{}".format(rank, name)],
+                        # Files of a rank on another filesystem stay on its node
+                        dict(artifact, rank=rank, shared_fs=shard.get("shared_fs", True))))
+            ranks["shards"][str(rank)] = {"metric_summary": rank_summary.get_summary(), "profile": shard["profile"],
+                                          "finished_at": shard["finished_at"]}
+        ranks["profile"] = {name: sketch.get_summary() for name, sketch in merged_sketches.items()}
+        return merged_summary, ranks
+
+    def write_profile(self):
+        """
+        Writes the profile with its mergeable sketches and the downsampled system stats
+        history of the run to the run directory and returns the summary for the run document,
+        with the sampler's own overhead.
+        """
+        profile = self.profiler.get_summary()
+        profile["file_name"] = os.path.relpath(os.path.join(self.log_dir, "profile.json"), self.run_dir)
+        profile["system_stats_overhead"] = self.system_stats.get_overhead()
+        write_json_to_file(dict(profile, sketches=self.profiler.get_sketches(),
+                                system_stats_history=self.system_stats.get_history(self.started_at)),
+                           os.path.join(self.run_dir, profile["file_name"]))
+        return profile
+
+    # ******************** Logging ******************** #
+    def init_loggers(self, capture_output=True):
+        from mlvc.utils.log_helper import make_logger
+        from mlvc.utils.output_capture import OutputCapture
+        logger_details = {
+            "stdout": {"file_name": "stdout.log"},
+            "stderr": {"file_name": "stderr.log"},
+            "run": {"file_name": "run.log"},
+            "metric": {"file_name": "metric.log"},
+            "system": {"file_name": "system_stats.log"},
+        }
+
+        if self.world_size > 1:
+            # Merged into the files above by rank 0's commit
+            logger_details["shards"] = {"dir_name": SHARDS_DIR_NAME, "world_size": self.world_size}
+
+        run_log_file_path = os.path.join(self.log_dir, logger_details["run"]["file_name"])
+        metric_log_file_path = os.path.join(self.log_dir, logger_details["metric"]["file_name"])
+        system_log_file_path = os.path.join(self.log_dir, logger_details["system"]["file_name"])
+
+        self.metric_backend = self.settings["metric_backend"]
+        if self.metric_backend in ("columnar", "both"):
+            metric_store_dir_name = os.path.relpath(os.path.join(self.log_dir, "metrics"), self.run_dir)
+            logger_details["metric_store"] = {"dir_name": metric_store_dir_name, "format": "columnar"}
+            self.metric_store = ColumnarMetricStore(os.path.join(self.run_dir, logger_details["metric_store"]["dir_name"]),
+                                                    self.settings["metric_store_buffer_size"])
+        elif self.metric_backend == "json":
+            self.metric_store = None
+        else:
+            raise Exception("Unknown metric backend: {}".format(self.metric_backend))
+
+        self.output_capture = OutputCapture(self.log_dir, self.settings["output_capture"] if capture_output else "off",
+                                            max_bytes=self.settings["output_max_bytes"],
+                                            backup_count=self.settings["output_backup_count"],
+                                            compress=self.settings["output_compress_rotated"],
+                                            collapse_cr=self.settings["output_collapse_cr"],
+                                            flush_interval=self.settings["output_flush_interval"]).start()
+        for name in ("stdout", "stderr"):
+            logger_details[name]["capture"] = self.output_capture.mode
+
+        queue_params = None
+        if self.settings["async_logging"]:
+            queue_params = {
+                "queue_size": self.settings["log_queue_size"],
+                "flush_interval": self.settings["log_flush_interval"],
+                "batch_size": self.settings["log_batch_size"],
+                "full_policy": self.settings["log_queue_full_policy"],
+            }
+        # Logger names are per run, concurrent runs must not share handlers
+        logger_prefix = self.get_logger_prefix() + "."
+        self.run_logger = make_logger(logger_prefix + "run", logging.DEBUG, run_log_file_path, queue_params)
+        self.metric_logger = make_logger(logger_prefix + "metric", logging.DEBUG, metric_log_file_path, queue_params)
+        self.system_stats_logger = make_logger(logger_prefix + "system_stats", logging.DEBUG, system_log_file_path,
+                                               queue_params)
+
+        return logger_details
+
+    def get_logger_prefix(self):
+        return "mlvc.{}".format(self.run_id)
+
+    def forget_loggers(self):
+        """
+        Closes what is left of the run's loggers and drops them from the logging registry.
+        """
+        from mlvc.utils.log_helper import remove_logger, forget_loggers
+        for logger in (self.run_logger, self.metric_logger, self.system_stats_logger):
+            remove_logger(logger)
+        forget_loggers(self.get_logger_prefix())
+
+    def remove_loggers(self):
+        from mlvc.utils.log_helper import remove_logger
+        if self.output_capture is not None:
+            self.output_capture.stop()
+        # Records dropped by a full log queue ("drop" policy) are counted in the run's log details
+        for name, logger in (("run", self.run_logger), ("metric", self.metric_logger),
+                             ("system", self.system_stats_logger)):
+            dropped = remove_logger(logger)
+            if dropped and self.is_primary_rank():
+                self.mlvc.mlvc_db.update_run(self.run_id, self.mlvc.mlvc_db.set_nested(["logs", name, "dropped"],
+                                                                                       dropped))
+        if self.metric_store is not None:
+            self.metric_store.close()
@@ -0,0 +1,52 @@
+from mlvc.storage.run_query import comparable
+
+
+class RunStorage(object):
+    """
+    Interface of the run document stores behind MLVCDB.
+
+    `update_run` receives either a dict of top-level fields to overwrite or a
+    callable transforming the document in place (see MLVCDB.set_nested).
+
+    `find_runs` returns the runs whose INDEXED_FIELDS equal the given values,
+    backends override it to answer from their indexes instead of a full scan.
+    Values are indexed and looked up by `index_key`, so numbers match
+    numerically ("1" == 1) as they do in run_query.match_filters. Run ids are
+    keys and stay exact.
+    """
+
+    INDEXED_FIELDS = ("run_id", "project_id", "model_id", "status")
+
+    def insert_run(self, run):
+        raise NotImplementedError
+
+    def get_run(self, run_id):
+        raise NotImplementedError
+
+    def get_all_runs(self):
+        raise NotImplementedError
+
+    def update_run(self, run_id, obj):
+        raise NotImplementedError
+
+    def remove_all_runs(self):
+        raise NotImplementedError
+
+    def find_runs(self, equals):
+        return [run for run in self.get_all_runs()
+                if all(self.index_key(key, run.get(key)) == self.index_key(key, val) for key, val in equals.items())]
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def index_key(field, val):
+        return val if field == "run_id" else comparable(val)
+
+    @staticmethod
+    def apply_update(doc, obj):
+        if callable(obj):
+            obj(doc)
+        else:
+            doc.update(obj)
+        return doc
@@ -0,0 +1,164 @@
+import os
+import stat
+import sqlite3
+import hashlib
+import threading
+from shutil import copyfile
+
+from mlvc.utils.gen_utils import make_dir_if_not_exist
+from mlvc.storage.file_copy import clone_file, copy_and_hash, copy_file
+
+
+class BlobStore(object):
+    """
+    Content-addressed file store. Inputs are hashed (sha256) in streaming
+    fashion and kept once per content as <blob_dir>/<hash[:2]>/<hash>, run
+    directories reference them through hardlinks (or a copy when the run
+    directory is on another file system). A file whose content is already
+    stored is never copied again, new content is hashed while it is copied
+    so it is read once.
+
+    Hashes are cached in an SQLite table by (path, size, mtime, inode) so
+    unchanged inputs, e.g. the same annotation file across sweep runs, are not
+    re-read either.
+    """
+
+    HASH_CACHE_FILE_NAME = "hash_cache.sqlite3"
+
+    def __init__(self, blob_dir, chunk_size=1024 * 1024):
+        self.blob_dir = blob_dir
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        make_dir_if_not_exist(self.blob_dir)
+        self.hash_cache = sqlite3.connect(os.path.join(self.blob_dir, self.HASH_CACHE_FILE_NAME),
+                                          check_same_thread=False, isolation_level=None)
+        self.hash_cache.execute("PRAGMA journal_mode=WAL")
+        self.hash_cache.execute("CREATE TABLE IF NOT EXISTS hashes "
+                                "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, ino INTEGER, sha256 TEXT)")
+
+    # ******************** Hashing ******************** #
+    def hash_stream(self, fp):
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: fp.read(self.chunk_size), b""):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def hash_file(self, file_path):
+        return self.hash_files([file_path])[file_path]
+
+    def hash_files(self, file_paths):
+        """
+        Hashes of several files, only files changed since they were last hashed are read.
+        """
+        digests = {}
+        new_entries = []
+        for file_path in file_paths:
+            abs_path = os.path.abspath(file_path)
+            stamp = self.file_stamp(abs_path)
+            digests[file_path] = self.get_cached_hash(abs_path, stamp)
+            if digests[file_path] is not None:
+                continue
+            with open(abs_path, "rb") as fp:
+                digests[file_path] = self.hash_stream(fp)
+            new_entries.append((abs_path,) + stamp + (digests[file_path],))
+        self.cache_hashes(new_entries)
+        return digests
+
+    @staticmethod
+    def file_stamp(abs_path):
+        file_stat = os.stat(abs_path)
+        return file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino
+
+    def get_cached_hash(self, abs_path, stamp):
+        with self.lock:
+            cached = self.hash_cache.execute("SELECT size, mtime_ns, ino, sha256 FROM hashes WHERE path = ?",
+                                             (abs_path,)).fetchone()
+        if cached is not None and tuple(cached[:3]) == stamp:
+            return cached[3]
+        return None
+
+    def cache_hashes(self, entries):
+        if entries:
+            with self.lock:
+                self.hash_cache.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)", entries)
+
+    # ******************** Blobs ******************** #
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def has_blob(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def put_file(self, file_path):
+        abs_path = os.path.abspath(file_path)
+        stamp = self.file_stamp(abs_path)
+        digest = self.get_cached_hash(abs_path, stamp)
+        if digest is not None and self.has_blob(digest):
+            return digest
+
+        # The content is only known once copied, the copy goes to a temporary file renamed to its blob
+        tmp_path = os.path.join(self.blob_dir, "incoming.{}.{}.tmp".format(os.getpid(), threading.get_ident()))
+        try:
+            # A reflink costs no data copy on copy-on-write file systems, only the clone is read to hash it
+            if clone_file(file_path, tmp_path):
+                with open(tmp_path, "rb") as fp:
+                    digest = self.hash_stream(fp)
+            else:
+                digest = copy_and_hash(file_path, tmp_path, self.chunk_size)
+            if self.file_stamp(abs_path) == stamp:
+                self.cache_hashes([(abs_path,) + stamp + (digest,)])
+            blob_path = self.blob_path(digest)
+            if os.path.exists(blob_path):
+                os.remove(tmp_path)
+                return digest
+            make_dir_if_not_exist(os.path.dirname(blob_path))
+            # Blobs are shared by every run linking them, keep them read only
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def link_blob(self, digest, dest_path):
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(self.blob_path(digest), dest_path)
+        except OSError:
+            copyfile(self.blob_path(digest), dest_path)
+
+    def add_copy(self, file_path, dest_path):
+        """
+        add_file for a file the run keeps its own copy of (artifacts): stored
+        content is linked without reading the file, new content is copied once
+        (in the kernel when possible) and the copy itself becomes the blob.
+        Returns (method, hash).
+        """
+        abs_path = os.path.abspath(file_path)
+        stamp = self.file_stamp(abs_path)
+        digest = self.get_cached_hash(abs_path, stamp)
+        if digest is None or not self.has_blob(digest):
+            method, digest = copy_file(file_path, dest_path, self.chunk_size)
+            if self.file_stamp(abs_path) == stamp:
+                self.cache_hashes([(abs_path,) + stamp + (digest,)])
+            if not self.has_blob(digest):
+                make_dir_if_not_exist(os.path.dirname(self.blob_path(digest)))
+                try:
+                    os.link(dest_path, self.blob_path(digest))
+                except OSError:
+                    # Another file system, or added concurrently, the copy stays the run's own
+                    return method, digest
+                os.chmod(dest_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                return "blob", digest
+        self.link_blob(digest, dest_path)
+        return "blob", digest
+
+    def add_file(self, file_path, dest_path):
+        """
+        Stores `file_path` (if its content is new) and places it at `dest_path`, returns the content hash.
+        """
+        digest = self.put_file(file_path)
+        self.link_blob(digest, dest_path)
+        return digest
@@ -0,0 +1,127 @@
+import os
+import sys
+import hashlib
+import threading
+
+# ioctl cloning a whole file on Linux (btrfs, XFS, bcachefs...), _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink(src_path, dest_path):
+    """
+    Copy-on-write clone of `src_path`, only metadata is written. False when the file system cannot do it.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def copy_in_kernel(src_path, dest_path):
+    """
+    Copies through copy_file_range or sendfile so the data never enters user
+    space. Returns the system call used, None when neither is available.
+    """
+    size = os.path.getsize(src_path)
+    with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+        for method in ("copy_file_range", "sendfile"):
+            if not hasattr(os, method):
+                continue
+            copy_fn = getattr(os, method)
+            offset = 0
+            try:
+                while offset < size:
+                    if method == "copy_file_range":
+                        copied = copy_fn(src.fileno(), dest.fileno(), size - offset, offset, offset)
+                    else:
+                        copied = copy_fn(dest.fileno(), src.fileno(), offset, size - offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+            except OSError:
+                # e.g. EXDEV on old kernels or EINVAL for special files, try the next call from the start
+                dest.seek(0)
+                dest.truncate()
+                continue
+            if offset == size:
+                return method
+            dest.seek(0)
+            dest.truncate()
+    return None
+
+
+def copy_and_hash(src_path, dest_path, chunk_size=1024 * 1024):
+    """
+    Plain copy hashing the data on the way, the source is read once.
+    """
+    digest = hashlib.sha256()
+    with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+        for chunk in iter(lambda: src.read(chunk_size), b""):
+            digest.update(chunk)
+            dest.write(chunk)
+    return digest.hexdigest()
+
+
+def tmp_path_of(dest_path):
+    return "{}.{}.{}.tmp".format(dest_path, os.getpid(), threading.get_ident())
+
+
+def link_file(src_path, dest_path):
+    """
+    Hardlinks `src_path` to `dest_path` (replacing it), False across file systems.
+    """
+    tmp_path = tmp_path_of(dest_path)
+    try:
+        os.link(src_path, tmp_path)
+    except OSError:
+        return False
+    os.replace(tmp_path, dest_path)
+    return True
+
+
+def clone_file(src_path, dest_path):
+    """
+    Reflinks `src_path` to `dest_path` (replacing it), False when not supported.
+    """
+    tmp_path = tmp_path_of(dest_path)
+    if not reflink(src_path, tmp_path):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, dest_path)
+    return True
+
+
+def copy_file(src_path, dest_path, chunk_size=1024 * 1024):
+    """
+    Copies `src_path` to `dest_path` in the kernel when possible, with a
+    user space copy as fallback. The destination only appears once complete.
+    Returns (method, sha256).
+    """
+    tmp_path = tmp_path_of(dest_path)
+    try:
+        method = copy_in_kernel(src_path, tmp_path)
+        if method is None:
+            method, digest = "copy", copy_and_hash(src_path, tmp_path, chunk_size)
+        else:
+            # Read back from the page cache, the copy just went through it
+            digest = hash_file(tmp_path, chunk_size)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return method, digest
@@ -0,0 +1,39 @@
+import os
+
+
+def build_manifest(run_dir, blob_store):
+    """
+    Maps every file of a run directory (posix relative path) to its size and sha256.
+    """
+    file_paths = {}
+    for root, dirs, files in os.walk(run_dir):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_path = os.path.join(root, file_name)
+            file_paths[os.path.relpath(file_path, run_dir).replace(os.sep, "/")] = file_path
+
+    digests = blob_store.hash_files(list(file_paths.values()))
+    manifest = {}
+    for rel_path, file_path in file_paths.items():
+        manifest[rel_path] = {
+            "size": os.path.getsize(file_path),
+            "sha256": digests[file_path],
+        }
+    return manifest
+
+
+def check_rel_path(rel_path):
+    """
+    Raises for absolute paths and paths leaving the run directory.
+    """
+    parts = rel_path.replace("\\", "/").split("/")
+    if not rel_path or os.path.isabs(rel_path) or parts[0] == "" or ".." in parts:
+        raise Exception("Invalid run file path: {!r}".format(rel_path))
+    return rel_path
+
+
+def filter_needed_paths(needed, manifest):
+    """
+    Paths requested by the server, validated and limited to files of the local manifest.
+    """
+    return [rel_path for rel_path in needed if check_rel_path(rel_path) in manifest]
@@ -0,0 +1,117 @@
+import heapq
+import operator
+
+from mlvc.modules.metrics.metric_summary import MetricSummary
+
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda val, options: val in options,
+}
+
+_MISSING = object()
+
+
+def get_path(doc, path):
+    current = doc
+    for key in path.split("."):
+        if not isinstance(current, dict) or key not in current:
+            return _MISSING
+        current = current[key]
+    return current
+
+
+def comparable(val):
+    # Numbers are often logged as strings, compare them numerically
+    num = MetricSummary.to_number(val)
+    return val if num is None else num
+
+
+def split_filter(condition):
+    """
+    A filter value is either a plain value (equality) or an (operator, value) tuple.
+    """
+    if isinstance(condition, tuple) and len(condition) == 2 and condition[0] in OPERATORS:
+        return condition
+    return "==", condition
+
+
+def match_filters(doc, filters):
+    for path, condition in filters.items():
+        op, val = split_filter(condition)
+        doc_val = get_path(doc, path)
+        if doc_val is _MISSING:
+            return False
+        if op != "in":
+            doc_val, val = comparable(doc_val), comparable(val)
+        try:
+            if not OPERATORS[op](doc_val, val):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def index_equals(filters, indexed_fields):
+    """
+    Equality conditions on indexed top-level fields, usable by a storage backend to narrow candidates.
+    Backends index normalized values (RunStorage.index_key), so numbers still compare numerically,
+    except run ids which are keyed exactly: a numeric run id filter is not looked up.
+    """
+    equals = {}
+    for path, condition in filters.items():
+        op, val = split_filter(condition)
+        if path == "run_id" and MetricSummary.to_number(val) is not None:
+            continue
+        if path in indexed_fields and op == "==":
+            equals[path] = val
+    return equals
+
+
+def sort_runs(docs, sort_by, descending=False, limit=None):
+    """
+    Sorts by a dotted path. Numeric values come first, then other values
+    ordered as strings, then runs without the field. With a limit only the
+    top-k are selected instead of sorting everything.
+    """
+    numbers, others, missing = [], [], []
+    for doc in docs:
+        val = get_path(doc, sort_by)
+        if val is _MISSING or val is None:
+            missing.append(doc)
+            continue
+        val = comparable(val)
+        if isinstance(val, float):
+            numbers.append((val, doc))
+        else:
+            others.append((str(val), doc))
+
+    sorted_docs = []
+    for group in (numbers, others):
+        if limit is None:
+            group.sort(key=operator.itemgetter(0), reverse=descending)
+        else:
+            select = heapq.nlargest if descending else heapq.nsmallest
+            group = select(limit - len(sorted_docs), group, key=operator.itemgetter(0))
+        sorted_docs.extend(doc for _, doc in group)
+    sorted_docs.extend(missing)
+    return sorted_docs if limit is None else sorted_docs[:limit]
+
+
+def project_fields(doc, fields):
+    projected = {}
+    for path in fields:
+        val = get_path(doc, path)
+        if val is _MISSING:
+            continue
+        keys = path.split(".")
+        current = projected
+        for key in keys[:-1]:
+            current = current.setdefault(key, {})
+        current[keys[-1]] = val
+    return projected
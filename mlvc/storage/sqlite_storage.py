@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import threading
+
+from mlvc.storage.base_storage import RunStorage
+from mlvc.utils import serialization
+from mlvc.utils.gen_utils import read_json_from_file
+
+
+class SQLiteRunStorage(RunStorage):
+    """
+    Run documents in an SQLite database in WAL mode. Every run is one row keyed
+    by `run_id`, with the fields used for lookups (project, model, status) as
+    indexed columns and `config` / `results` / the rest of the document stored
+    as JSON text, so an update only rewrites a single row. The indexed columns
+    hold `index_key` values, the document keeps the original ones.
+    """
+
+    JSON_COLUMNS = ("config", "results")
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+
+    def create_tables(self):
+        with self.lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, "
+                "project_id, "
+                "model_id, "
+                "status TEXT, "
+                "created_at REAL, "
+                "config TEXT, "
+                "results TEXT, "
+                "doc TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS runs_project_model ON runs (project_id, model_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS runs_status ON runs (status)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.normalize_index_columns()
+
+    def normalize_index_columns(self):
+        # Databases written before the columns held index keys are rewritten once
+        if self.conn.execute("SELECT value FROM meta WHERE key = 'index_keys'").fetchone() is not None:
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute("SELECT run_id, project_id, model_id, status FROM runs").fetchall()
+            for run_id, project_id, model_id, status in rows:
+                self.conn.execute(
+                    "UPDATE runs SET project_id = ?, model_id = ?, status = ? WHERE run_id = ?",
+                    (self.index_key("project_id", project_id), self.index_key("model_id", model_id),
+                     self.index_key("status", status), run_id))
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('index_keys', '1')")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    # ******************** Row <-> Doc ******************** #
+    def to_row(self, run):
+        doc = dict(run)
+        json_columns = [serialization.dumps(doc.pop(column, {})) for column in self.JSON_COLUMNS]
+        keys = [self.index_key(field, run.get(field)) for field in ("project_id", "model_id", "status")]
+        return [run["run_id"]] + keys + [run.get("created_at")] + \
+            json_columns + [serialization.dumps(doc)]
+
+    def to_doc(self, row):
+        doc = serialization.loads(row[-1])
+        for column, val in zip(self.JSON_COLUMNS, row[:-1]):
+            doc[column] = serialization.loads(val)
+        return doc
+
+    def write_row(self, run, replace=True):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        self.conn.execute(
+            verb + " INTO runs (run_id, project_id, model_id, status, created_at, config, results, doc) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self.to_row(run))
+
+    # ******************** Runs ******************** #
+    def insert_run(self, run):
+        with self.lock:
+            self.write_row(run)
+
+    def get_run(self, run_id):
+        with self.lock:
+            row = self.conn.execute("SELECT config, results, doc FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        return self.to_doc(row)
+
+    def get_all_runs(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT config, results, doc FROM runs ORDER BY rowid").fetchall()
+        return [self.to_doc(row) for row in rows]
+
+    def find_runs(self, equals):
+        conditions, params = [], []
+        for field, val in equals.items():
+            if field not in self.INDEXED_FIELDS:
+                raise Exception("Field is not indexed: {}".format(field))
+            conditions.append("{} = ?".format(field))
+            params.append(self.index_key(field, val))
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        with self.lock:
+            rows = self.conn.execute("SELECT config, results, doc FROM runs" + where + " ORDER BY rowid", params).fetchall()
+        return [self.to_doc(row) for row in rows]
+
+    def update_run(self, run_id, obj):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT config, results, doc FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+                if row is not None:
+                    self.write_row(self.apply_update(self.to_doc(row), obj))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def remove_all_runs(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM runs")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # ******************** Migration ******************** #
+    def migrate_from_tinydb(self, tinydb_file_path):
+        """
+        One-shot import of the runs of a TinyDB json file. Runs already present
+        are kept and the migration is recorded so it never runs twice.
+        """
+        with self.lock:
+            migrated = self.conn.execute("SELECT value FROM meta WHERE key = 'tinydb_migrated'").fetchone()
+            if migrated is not None or not os.path.exists(tinydb_file_path):
+                return 0
+            tables = read_json_from_file(tinydb_file_path) if os.path.getsize(tinydb_file_path) > 0 else {}
+            runs = [run for run in tables.get("_default", {}).values() if "run_id" in run]
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for run in runs:
+                    self.write_row(run, replace=False)
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('tinydb_migrated', ?)", (tinydb_file_path,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return len(runs)
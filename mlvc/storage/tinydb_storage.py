@@ -0,0 +1,140 @@
+import os
+import copy
+
+from tinydb import TinyDB
+from tinydb.storages import JSONStorage
+
+from mlvc.storage.base_storage import RunStorage
+from mlvc.utils import serialization
+
+
+class FastJSONStorage(JSONStorage):
+    """
+    TinyDB's JSONStorage going through mlvc.utils.serialization, the file is
+    read and written as bytes.
+    """
+
+    def __init__(self, path, **kwargs):
+        super(FastJSONStorage, self).__init__(path, access_mode="rb+", **kwargs)
+
+    def read(self):
+        self._handle.seek(0)
+        data = self._handle.read()
+        if not data:
+            return None
+        return serialization.loads(data)
+
+    def write(self, data):
+        self._handle.seek(0)
+        self._handle.write(serialization.dumpb(data))
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.truncate()
+
+
+class TinyDBRunStorage(RunStorage):
+    """
+    Runs in a TinyDB json file. TinyDB parses the whole file on every read,
+    so the documents of one read are kept in memory with indexes mapping the
+    values of INDEXED_FIELDS (run id, project, model, status) to doc ids:
+    lookups are served from them without reading the file. Both are rebuilt
+    from a single read when the file was changed by another process.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.db = TinyDB(file_path, storage=FastJSONStorage)
+        self.build_indexes()
+
+    # ******************** Indexes ******************** #
+    def file_stamp(self):
+        if not os.path.exists(self.file_path):
+            return None
+        stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def build_indexes(self):
+        self.indexes = {field: {} for field in self.INDEXED_FIELDS}
+        self.indexed_values = {}
+        self.docs = {}
+        for doc in self.db.all():
+            self.docs[doc.doc_id] = doc
+            self.index_doc(doc.doc_id, doc)
+        self.stamp = self.file_stamp()
+
+    def check_indexes(self):
+        if self.file_stamp() != self.stamp:
+            self.build_indexes()
+
+    def index_doc(self, doc_id, doc):
+        self.unindex_doc(doc_id)
+        values = {}
+        for field in self.INDEXED_FIELDS:
+            val = self.index_key(field, doc.get(field))
+            try:
+                self.indexes[field].setdefault(val, set()).add(doc_id)
+            except TypeError:
+                continue
+            values[field] = val
+        self.indexed_values[doc_id] = values
+
+    def unindex_doc(self, doc_id):
+        for field, val in self.indexed_values.pop(doc_id, {}).items():
+            self.indexes[field][val].discard(doc_id)
+
+    # ******************** Runs ******************** #
+    def get_doc(self, doc_id):
+        # Callers may modify what they get, the kept document must not change
+        return copy.deepcopy(self.docs[doc_id])
+
+    def insert_run(self, run):
+        self.check_indexes()
+        doc_id = self.db.insert(run)
+        self.docs[doc_id] = copy.deepcopy(dict(run))
+        self.index_doc(doc_id, run)
+        self.stamp = self.file_stamp()
+
+    def get_run_doc_id(self, run_id):
+        self.check_indexes()
+        doc_ids = self.indexes["run_id"].get(run_id)
+        return min(doc_ids) if doc_ids else None
+
+    def get_run(self, run_id):
+        doc_id = self.get_run_doc_id(run_id)
+        if doc_id is None:
+            return None
+        return self.get_doc(doc_id)
+
+    def get_all_runs(self):
+        return self.db.all()
+
+    def find_runs(self, equals):
+        self.check_indexes()
+        doc_ids = None
+        for field, val in equals.items():
+            try:
+                matches = self.indexes[field].get(self.index_key(field, val), set())
+            except TypeError:
+                matches = set()
+            doc_ids = set(matches) if doc_ids is None else doc_ids & matches
+        if doc_ids is None:
+            return self.db.all()
+        return [self.get_doc(doc_id) for doc_id in sorted(doc_ids)]
+
+    def update_run(self, run_id, obj):
+        doc_id = self.get_run_doc_id(run_id)
+        if doc_id is None:
+            return
+        self.db.update(obj, doc_ids=[doc_id])
+        # The same update on the kept document, instead of reading the file again
+        self.docs[doc_id] = copy.deepcopy(self.apply_update(self.docs[doc_id], obj))
+        if callable(obj) or any(field in obj for field in self.INDEXED_FIELDS):
+            self.index_doc(doc_id, self.docs[doc_id])
+        self.stamp = self.file_stamp()
+
+    def remove_all_runs(self):
+        self.db.truncate()
+        self.build_indexes()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,280 @@
+import os
+import gzip
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from mlvc.storage.manifest import check_rel_path
+
+
+CODEC_EXTENSIONS = {
+    "gzip": ".tar.gz",
+    "pgzip": ".tar.gz",
+    "zstd": ".tar.zst",
+    "store": ".tar",
+    "auto": ".tar",
+}
+
+MEMBER_EXTENSIONS = {
+    "gzip": ".gz",
+    "pgzip": ".gz",
+    "zstd": ".zst",
+    "store": "",
+}
+
+# Already compressed formats which are stored as is by the auto codec
+COMPRESSED_EXTENSIONS = frozenset([
+    ".gz", ".tgz", ".zip", ".zst", ".bz2", ".xz", ".7z", ".lz4",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp",
+    ".mp3", ".mp4", ".mkv", ".avi", ".mov", ".webm",
+    ".parquet", ".pt", ".pth", ".ckpt", ".safetensors",
+])
+
+
+class _ChunkSink(object):
+    """
+    Write-only file object handing fixed-size chunks to a bounded queue.
+    """
+
+    def __init__(self, chunk_queue, chunk_size, stop_event):
+        self.chunk_queue = chunk_queue
+        self.chunk_size = chunk_size
+        self.stop_event = stop_event
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.chunk_size:
+            self.put(bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+        return len(data)
+
+    def put(self, item):
+        while True:
+            if self.stop_event.is_set():
+                raise Exception("Archive stream cancelled")
+            try:
+                self.chunk_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def flush(self):
+        pass
+
+    def close_stream(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer = bytearray()
+
+
+_DONE = object()
+
+
+def iter_tar_gz_chunks(source_dir, chunk_size, max_pending_chunks=4):
+    """
+    Yields a .tar.gz of `source_dir` in `chunk_size` byte chunks while it is
+    being compressed on a background thread, without a temporary file.
+
+    The gzip header carries no timestamp, so the same directory always gives
+    the same byte stream and an interrupted upload can resume at an offset.
+    """
+    chunk_queue = queue.Queue(maxsize=max_pending_chunks)
+    stop_event = threading.Event()
+    sink = _ChunkSink(chunk_queue, chunk_size, stop_event)
+    errors = []
+
+    def produce():
+        try:
+            with gzip.GzipFile(filename="", mode="wb", fileobj=sink, mtime=0) as gz:
+                with tarfile.open(fileobj=gz, mode="w|") as tar:
+                    tar.add(source_dir, arcname=os.path.basename(source_dir))
+            sink.close_stream()
+        except Exception as e:
+            errors.append(e)
+        try:
+            sink.put(_DONE)
+        except Exception:
+            pass
+
+    producer = threading.Thread(target=produce, name="mlvc-archive-stream", daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is _DONE:
+                break
+            yield chunk
+        if errors:
+            raise errors[0]
+    finally:
+        stop_event.set()
+        producer.join()
+
+
+# ******************** Codecs ******************** #
+class ParallelGzipWriter(object):
+    """
+    pigz style gzip writer. Input is cut into `block_size` blocks which are
+    compressed in parallel (zlib releases the GIL) as independent gzip members
+    and written in order, any gzip reader decodes the concatenation.
+    """
+
+    def __init__(self, fileobj, level=6, block_size=4 * 1024 * 1024, workers=None):
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(self.workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self.submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def submit(self, block):
+        self.pending.append(self.executor.submit(gzip.compress, block, self.level, mtime=0))
+        while len(self.pending) > 2 * self.workers:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.buffer:
+            self.submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self.fileobj.write(self.pending.popleft().result())
+        self.executor.shutdown()
+
+
+class _StoreWriter(object):
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def write(self, data):
+        return self.fileobj.write(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def zstd_available():
+    try:
+        import zstandard
+    except ImportError:
+        return False
+    return True
+
+
+def open_codec_writer(fileobj, codec, level=None, workers=None, block_size=4 * 1024 * 1024):
+    """
+    Returns a write-only file object compressing into `fileobj`. Closing it
+    finishes the compressed stream but leaves `fileobj` open.
+    """
+    if codec == "gzip":
+        return gzip.GzipFile(filename="", mode="wb", fileobj=fileobj, mtime=0,
+                             compresslevel=9 if level is None else level)
+    if codec == "pgzip":
+        return ParallelGzipWriter(fileobj, 6 if level is None else level, block_size, workers)
+    if codec == "zstd":
+        if not zstd_available():
+            raise Exception("zstd codec needs the zstandard package")
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level, threads=workers or -1)
+        return compressor.stream_writer(fileobj, closefd=False)
+    if codec == "store":
+        return _StoreWriter(fileobj)
+    raise Exception("Unknown archive codec: {}".format(codec))
+
+
+def choose_codec(file_path, size, small_file_size=1024 * 1024):
+    """
+    Codec for one file: already compressed formats are stored, small files
+    use plain gzip and large ones a multi-threaded codec.
+    """
+    if os.path.splitext(file_path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return "store"
+    if size < small_file_size:
+        return "gzip"
+    return "zstd" if zstd_available() else "pgzip"
+
+
+# ******************** Archives ******************** #
+def make_archive(output_path_prefix, source_dir, codec="gzip", level=None, workers=None,
+                 block_size=4 * 1024 * 1024):
+    """
+    Archives `source_dir` to `output_path_prefix` + the codec extension and
+    returns a description of the archive format for the run document.
+
+    The "auto" codec writes an uncompressed tar whose members are compressed
+    one by one with the codec picked by choose_codec, the member names get the
+    codec extension and `members` maps every file to its codec.
+    """
+    output_path = output_path_prefix + CODEC_EXTENSIONS[codec]
+    archive_format = {"file_name": os.path.basename(output_path), "container": "tar", "codec": codec}
+    with open(output_path, "wb") as fp:
+        if codec == "auto":
+            archive_format["members"] = _write_auto_tar(fp, source_dir, level, workers, block_size)
+        else:
+            writer = open_codec_writer(fp, codec, level, workers, block_size)
+            with tarfile.open(fileobj=writer, mode="w|") as tar:
+                tar.add(source_dir, arcname=os.path.basename(source_dir))
+            writer.close()
+    return output_path, archive_format
+
+
+def _write_auto_tar(fp, source_dir, level, workers, block_size):
+    members = {}
+    base_dir = os.path.dirname(os.path.abspath(source_dir))
+    with tarfile.open(fileobj=fp, mode="w") as tar:
+        for root, dirs, files in os.walk(source_dir):
+            dirs.sort()
+            tar.add(root, arcname=os.path.relpath(root, base_dir), recursive=False)
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                arcname = os.path.relpath(file_path, base_dir)
+                codec = "store" if os.path.islink(file_path) else choose_codec(file_path, os.path.getsize(file_path))
+                members[arcname] = codec
+                if codec == "store":
+                    tar.add(file_path, arcname=arcname)
+                    continue
+                # Member sizes go in the tar header, so compress to a temporary file first
+                with tempfile.TemporaryFile(dir=os.path.dirname(fp.name)) as tmp:
+                    writer = open_codec_writer(tmp, codec, level, workers, block_size)
+                    with open(file_path, "rb") as src:
+                        shutil.copyfileobj(src, writer, block_size)
+                    writer.close()
+                    stat = os.stat(file_path)
+                    tar_info = tarfile.TarInfo(arcname + MEMBER_EXTENSIONS[codec])
+                    tar_info.mode = stat.st_mode & 0o7777
+                    tar_info.mtime = stat.st_mtime
+                    tar_info.size = tmp.tell()
+                    tmp.seek(0)
+                    tar.addfile(tar_info, tmp)
+    return members
+
+
+def make_files_archive(output_path, source_dir, rel_paths):
+    """
+    .tar.gz of only the given files of `source_dir`, laid out as in a full archive.
+    """
+    arc_root = os.path.basename(source_dir)
+    with tarfile.open(output_path, "w:gz") as tar:
+        for rel_path in rel_paths:
+            check_rel_path(rel_path)
+            tar.add(os.path.join(source_dir, rel_path), arcname=arc_root + "/" + rel_path)
+    return output_path
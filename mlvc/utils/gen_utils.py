@@ -1,8 +1,9 @@
 import os
-import json
 import tarfile
 import datetime
 
+from mlvc.utils import serialization
+
 
 def make_dir_if_not_exist(path):
     if not os.path.exists(path):
@@ -10,15 +11,15 @@ def make_dir_if_not_exist(path):
 
 
 def write_json_to_file(data, filepath):
-    with open(filepath, 'w', encoding='utf8') as outfile:
-        json.dump(data, outfile, ensure_ascii=False)
+    with open(filepath, 'wb') as outfile:
+        outfile.write(serialization.dumpb(data))
 
 
 def read_json_from_file(filepath):
-    with open(filepath, 'r', encoding='utf-8') as json_file:
-        data = json.load(json_file)
+    with open(filepath, 'rb') as json_file:
+        data = serialization.loads(json_file.read())
     if type(data) is str:
-        return json.loads(data)
+        return serialization.loads(data)
     return data
 
 
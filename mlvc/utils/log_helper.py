@@ -1,48 +1,168 @@
-import sys
+import time
+import queue
 import logging
-from datetime import datetime
+import warnings
+import threading
+from datetime import datetime, timezone
 from pythonjsonlogger import jsonlogger
 
+from mlvc.utils import serialization
+
 
 class CustomJsonFormatter(jsonlogger.JsonFormatter):
     def add_fields(self, log_record, record, message_dict):
         message_dict = {"payload": message_dict}
         super(CustomJsonFormatter, self).add_fields(log_record, record, message_dict)
         if not log_record.get('timestamp'):
-            # this doesn't use record.created, so it is slightly off
-            now = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            # Use the record creation time, records may be formatted later on a writer thread
+            now = datetime.fromtimestamp(record.created, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
             log_record['timestamp'] = now
         if log_record.get('level'):
             log_record['level'] = log_record['level'].upper()
         else:
             log_record['level'] = record.levelname
 
+    def jsonify_log_record(self, log_record):
+        return serialization.dumps(log_record)
+
+
+class _FlushRequest(object):
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class QueueFileHandler(logging.Handler):
+    """
+    File handler which only enqueues records on the calling thread. A background
+    writer thread formats them and writes them to the file in batches, every
+    `flush_interval` seconds or whenever `batch_size` records are pending.
+
+    When the queue is full `full_policy` decides whether the caller blocks
+    ("block") or the record is dropped and counted in `dropped` ("drop"),
+    a count reported by a warning when the handler closes.
+    """
 
-class StdoutLogger(object):
-    def __init__(self, stdout_log_file_path):
-        self.terminal = sys.stdout
-        self.stdout_log_file = open(stdout_log_file_path, "a")
+    FULL_POLICIES = ("block", "drop")
 
-    def write(self, message):
-        self.terminal.write(message)
-        self.stdout_log_file.write(message)
+    def __init__(self, file_path, queue_size=10000, flush_interval=1.0, batch_size=1000, full_policy="block"):
+        super(QueueFileHandler, self).__init__()
+        if full_policy not in self.FULL_POLICIES:
+            raise Exception("Unknown queue full policy: {}".format(full_policy))
+        self.file_path = file_path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.full_policy = full_policy
+        self.dropped = 0
+        self.stream = open(file_path, "a", encoding="utf-8")
+        self.writer_thread = threading.Thread(target=self._write_loop, name="mlvc-log-writer", daemon=True)
+        self.writer_thread.start()
+
+    def emit(self, record):
+        # Formatting happens later, so freeze the payload the caller handed us
+        if isinstance(record.msg, dict):
+            record.msg = dict(record.msg)
+        if self.full_policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
     def flush(self):
-        pass
+        """
+        Blocks until every record enqueued so far has been written.
+        """
+        if not self.writer_thread.is_alive():
+            return
+        request = _FlushRequest()
+        self.queue.put(request)
+        request.done.wait()
+
+    def close(self):
+        if self.writer_thread.is_alive():
+            self.queue.put(_STOP)
+            self.writer_thread.join()
+        if not self.stream.closed:
+            self.stream.close()
+            if self.dropped:
+                warnings.warn("{} log records dropped from {}, the log queue was full".format(self.dropped, self.file_path),
+                              RuntimeWarning)
+        super(QueueFileHandler, self).close()
+
+    def _write_lines(self, lines):
+        if lines:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+            del lines[:]
+
+    def _write_loop(self):
+        lines = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
 
+            if item is _STOP:
+                self._write_lines(lines)
+                return
+            if isinstance(item, _FlushRequest):
+                self._write_lines(lines)
+                item.done.set()
+                continue
+            if item is not None:
+                try:
+                    lines.append(self.format(item))
+                except Exception:
+                    self.handleError(item)
 
-def make_logger(name, level, file_path):
+            if len(lines) >= self.batch_size or time.monotonic() >= deadline:
+                self._write_lines(lines)
+                deadline = time.monotonic() + self.flush_interval
+
+
+def make_logger(name, level, file_path, queue_params=None):
+    """
+    Creates a JSON file logger. Passing `queue_params` (QueueFileHandler
+    keyword arguments) switches the logger to asynchronous batched writes.
+    """
     file_log_formatter = CustomJsonFormatter('%(timestamp)s %(level)s %(name)s %(message)s')
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    file_handler = logging.FileHandler(file_path)
+    if queue_params is not None:
+        file_handler = QueueFileHandler(file_path, **queue_params)
+    else:
+        file_handler = logging.FileHandler(file_path)
     file_handler.setFormatter(file_log_formatter)
     logger.addHandler(file_handler)
     return logger
 
 
 def remove_logger(logger):
+    """
+    Closes the logger's handlers, returns the number of records they dropped.
+    """
+    dropped = 0
     if logger is not None:
-        while logger.hasHandlers():
-            logger.removeHandler(logger.handlers[0])
-        logger = None
\ No newline at end of file
+        # Closing the handlers drains any queued records to disk
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+            dropped += getattr(handler, "dropped", 0)
+    return dropped
+
+
+def forget_loggers(prefix):
+    """
+    Drops the logger `prefix` and the loggers below it from the logging registry, which otherwise keeps them forever.
+    """
+    logger_dict = logging.Logger.manager.loggerDict
+    for name in list(logger_dict):
+        if name == prefix or name.startswith(prefix + "."):
+            logger_dict.pop(name, None)
@@ -0,0 +1,330 @@
+import os
+import sys
+import gzip
+import queue
+import select
+import shutil
+import threading
+import time
+
+
+class CarriageReturnFilter(object):
+    """
+    Collapses carriage return updates (progress bars) so only the last state
+    of a line is kept: "10%\r50%\r100%\n" becomes "100%\n". Input may be split
+    anywhere, a partial line is held back until its newline arrives or it grows
+    past `max_pending` bytes.
+    """
+
+    def __init__(self, max_pending=64 * 1024):
+        self.max_pending = max_pending
+        self.pending = b""
+
+    @staticmethod
+    def collapse(line):
+        segments = [segment for segment in line.split(b"\r") if segment]
+        return segments[-1] if segments else b""
+
+    def feed(self, data):
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        out = [self.collapse(line) + b"\n" for line in lines]
+
+        if b"\r" in self.pending:
+            # Keep the latest state, and a trailing \r which may still be followed by \n
+            trailing = b"\r" if self.pending.endswith(b"\r") else b""
+            self.pending = self.collapse(self.pending) + trailing
+        if len(self.pending) > self.max_pending:
+            out.append(self.pending)
+            self.pending = b""
+        return b"".join(out)
+
+    def finish(self):
+        data, self.pending = self.collapse(self.pending), b""
+        return data
+
+
+class RotatingFile(object):
+    """
+    Append only file rotated once it reaches `max_bytes`: file -> file.1 ->
+    file.2 ..., keeping `backup_count` segments, gzip compressed when
+    `compress` is set. A `max_bytes` of 0 disables rotation.
+    """
+
+    def __init__(self, file_path, max_bytes=0, backup_count=5, compress=False):
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.fp = open(file_path, "ab")
+        self.size = self.fp.tell()
+
+    def segment_path(self, index):
+        return "{}.{}{}".format(self.file_path, index, ".gz" if self.compress else "")
+
+    def write(self, data):
+        while self.max_bytes and self.size + len(data) > self.max_bytes:
+            # Fill the current segment up to the last line which fits, then rotate
+            room = self.max_bytes - self.size
+            cut = data.rfind(b"\n", 0, room) + 1
+            if cut == 0 and self.size == 0:
+                cut = room
+            self.fp.write(data[:cut])
+            data = data[cut:]
+            self.rotate()
+        self.fp.write(data)
+        self.size += len(data)
+
+    def rotate(self):
+        self.fp.close()
+        if self.backup_count > 0:
+            oldest = self.segment_path(self.backup_count)
+            if os.path.exists(oldest):
+                os.remove(oldest)
+            for index in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(self.segment_path(index)):
+                    os.replace(self.segment_path(index), self.segment_path(index + 1))
+            if self.compress:
+                with open(self.file_path, "rb") as src, gzip.open(self.segment_path(1), "wb") as dest:
+                    shutil.copyfileobj(src, dest)
+                os.remove(self.file_path)
+            else:
+                os.replace(self.file_path, self.segment_path(1))
+        else:
+            os.remove(self.file_path)
+        self.fp = open(self.file_path, "ab")
+        self.size = 0
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
+
+
+_STOP = object()
+
+
+class CaptureWriter(object):
+    """
+    Buffered writer for captured output. Callers only enqueue bytes, a
+    background thread collapses progress bar updates and writes every
+    `flush_interval` seconds or once `buffer_size` bytes are pending.
+    """
+
+    def __init__(self, files, flush_interval=1.0, buffer_size=256 * 1024, collapse_cr=True, queue_size=10000):
+        self.files = files
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.filters = {name: CarriageReturnFilter() for name in files} if collapse_cr else None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writer_thread = threading.Thread(target=self._write_loop, name="mlvc-output-writer", daemon=True)
+        self.writer_thread.start()
+
+    def write(self, name, data):
+        if data:
+            self.queue.put((name, data))
+
+    def flush(self):
+        """
+        Blocks until everything enqueued so far is written.
+        """
+        if self.writer_thread.is_alive():
+            done = threading.Event()
+            self.queue.put(done)
+            done.wait()
+
+    def close(self):
+        if self.writer_thread.is_alive():
+            self.queue.put(_STOP)
+            self.writer_thread.join()
+
+    def _write_pending(self, pending, final=False):
+        # The final write also empties lines held back by the filters
+        names = list(self.files) if final else list(pending)
+        for name in names:
+            data = b"".join(pending.get(name, []))
+            if self.filters is not None:
+                data = self.filters[name].feed(data)
+                if final:
+                    data += self.filters[name].finish()
+            if data:
+                self.files[name].write(data)
+            self.files[name].flush()
+        pending.clear()
+
+    def _write_loop(self):
+        pending = {}
+        num_pending = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write_pending(pending, final=True)
+                for rotating_file in self.files.values():
+                    rotating_file.close()
+                return
+            if isinstance(item, threading.Event):
+                self._write_pending(pending)
+                num_pending = 0
+                item.set()
+                continue
+            if item is not None:
+                name, data = item
+                pending.setdefault(name, []).append(data)
+                num_pending += len(data)
+
+            if num_pending >= self.buffer_size or time.monotonic() >= deadline:
+                self._write_pending(pending)
+                num_pending = 0
+                deadline = time.monotonic() + self.flush_interval
+
+
+class StdoutLogger(object):
+    """
+    Python level tee of a text stream (sys.stdout / sys.stderr) to the terminal and a CaptureWriter.
+    """
+
+    def __init__(self, terminal, writer, name):
+        self.terminal = terminal
+        self.writer = writer
+        self.name = name
+
+    def write(self, message):
+        self.terminal.write(message)
+        self.writer.write(self.name, message.encode("utf-8", "replace"))
+        return len(message)
+
+    def flush(self):
+        # The capture file is flushed by the writer thread
+        self.terminal.flush()
+
+    def __getattr__(self, attr):
+        # isatty, fileno, encoding... of the real stream, progress bars look at them
+        return getattr(self.terminal, attr)
+
+
+class FdTee(object):
+    """
+    File descriptor level tee: `fd` is redirected to a pipe, a reader thread
+    copies everything to the original descriptor and the CaptureWriter.
+    Output of C extensions and subprocesses sharing the descriptor is
+    captured too.
+    """
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, fd, stream, writer, name):
+        self.fd = fd
+        self.stream = stream
+        self.writer = writer
+        self.name = name
+        self.saved_fd = None
+        self.read_fd = None
+        self.stop_event = threading.Event()
+        self.reader_thread = None
+
+    def start(self):
+        self.stream.flush()
+        self.saved_fd = os.dup(self.fd)
+        self.read_fd, write_fd = os.pipe()
+        os.dup2(write_fd, self.fd)
+        os.close(write_fd)
+        self.reader_thread = threading.Thread(target=self._read_loop, name="mlvc-tee-{}".format(self.name),
+                                              daemon=True)
+        self.reader_thread.start()
+
+    def _copy(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.saved_fd, view)
+            view = view[written:]
+        self.writer.write(self.name, data)
+
+    def _read_loop(self):
+        while True:
+            # Subprocesses may keep the pipe open after stop, so do not rely on EOF alone
+            readable, _, _ = select.select([self.read_fd], [], [], 0.1)
+            if not readable:
+                if self.stop_event.is_set():
+                    return
+                continue
+            data = os.read(self.read_fd, self.READ_SIZE)
+            if not data:
+                return
+            self._copy(data)
+
+    def stop(self):
+        self.stream.flush()
+        os.dup2(self.saved_fd, self.fd)
+        self.stop_event.set()
+        self.reader_thread.join()
+        os.close(self.read_fd)
+        os.close(self.saved_fd)
+
+
+class OutputCapture(object):
+    """
+    Captures stdout and stderr of a run to <name>.log files in `log_dir`.
+    `mode` is "python" (sys.stdout / sys.stderr replaced by tees), "fd" (file
+    descriptor tee, POSIX only) or "off".
+
+    "python" is the default: it only wraps two Python objects and is undone
+    by restoring them. "fd" replaces descriptors 1 and 2 of the whole process
+    with a pipe drained by a thread, so every write of C code and
+    subprocesses goes through that thread and stalls with it; it does not
+    work where sys.stdout is not fd 1 (Jupyter kernels, pytest capture) and
+    inherited pipes may outlive the run. Use "fd" when output of native
+    extensions or subprocesses must be captured.
+    """
+
+    MODES = ("python", "fd", "off")
+    STREAMS = ("stdout", "stderr")
+
+    def __init__(self, log_dir, mode="python", max_bytes=0, backup_count=5, compress=False, collapse_cr=True,
+                 flush_interval=1.0):
+        if mode not in self.MODES:
+            raise Exception("Unknown output capture mode: {}".format(mode))
+        if mode == "fd" and os.name != "posix":
+            mode = "python"
+        self.mode = mode
+        self.file_names = {name: "{}.log".format(name) for name in self.STREAMS}
+        self.writer = None
+        self.tees = []
+        self.saved_streams = None
+        if mode == "off":
+            return
+        files = {name: RotatingFile(os.path.join(log_dir, file_name), max_bytes, backup_count, compress)
+                 for name, file_name in self.file_names.items()}
+        self.writer = CaptureWriter(files, flush_interval=flush_interval, collapse_cr=collapse_cr)
+
+    def start(self):
+        if self.mode == "python":
+            self.saved_streams = (sys.stdout, sys.stderr)
+            sys.stdout = StdoutLogger(sys.stdout, self.writer, "stdout")
+            sys.stderr = StdoutLogger(sys.stderr, self.writer, "stderr")
+        elif self.mode == "fd":
+            self.tees = [FdTee(1, sys.stdout, self.writer, "stdout"), FdTee(2, sys.stderr, self.writer, "stderr")]
+            for tee in self.tees:
+                tee.start()
+        return self
+
+    def flush(self):
+        if self.writer is not None:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            self.writer.flush()
+
+    def stop(self):
+        if self.saved_streams is not None:
+            sys.stdout, sys.stderr = self.saved_streams
+            self.saved_streams = None
+        for tee in self.tees:
+            tee.stop()
+        self.tees = []
+        if self.writer is not None:
+            self.writer.close()
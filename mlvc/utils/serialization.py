@@ -0,0 +1,82 @@
+"""
+JSON encoding shared by the log formatter, the run database, JSON files and
+the API client. orjson is used when installed (NumPy scalars and arrays are
+serialized natively), the standard library json module otherwise. NaN and
+infinite floats become null on both paths, inputs orjson rejects (e.g.
+integers above 64 bits, NaN literals written by older versions) go through the
+standard library instead.
+"""
+import json
+import math
+import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def default(obj):
+    """
+    Encodes what JSON does not know: NumPy / torch scalars and arrays, sets, dates, anything else as str.
+    """
+    if hasattr(obj, "tolist") and callable(obj.tolist):
+        # NumPy arrays and scalars (tolist of a scalar is the Python value), CPU torch tensors
+        return replace_non_finite(obj.tolist())
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def replace_non_finite(obj):
+    """
+    Copy of `obj` with NaN and infinite floats replaced by None, as orjson writes them.
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: replace_non_finite(val) for key, val in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [replace_non_finite(val) for val in obj]
+    return obj
+
+
+def stdlib_dumps(obj):
+    return json.dumps(replace_non_finite(obj), ensure_ascii=False, default=default, allow_nan=False)
+
+
+def dumpb(obj):
+    """
+    UTF-8 encoded JSON bytes of `obj`.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+        except TypeError:
+            pass
+    return stdlib_dumps(obj).encode("utf-8")
+
+
+def dumps(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            pass
+    return stdlib_dumps(obj)
+
+
+def loads(data):
+    """
+    Parses JSON from str or bytes.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
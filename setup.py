@@ -17,7 +17,7 @@ setuptools.setup(
     download_url='https://github.com/avilash/mlvc-client/tarball/main',
     keywords=[],
     install_requires=[
-        "tinydb",
+        "tinydb>=4.8",
         "GitPython",
         "psutil",
         "GPUtil",
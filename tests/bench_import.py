@@ -0,0 +1,51 @@
+"""
+Import time guard: importing mlvc and constructing MLVC must not pull in the
+heavy optional components (git, GPU, HTTP, database), those are loaded on
+first use. Run with `python tests/bench_import.py [budget_seconds]`.
+"""
+import sys
+import json
+import subprocess
+
+HEAVY_MODULES = ["git", "GPUtil", "psutil", "requests", "urllib3", "tinydb", "pythonjsonlogger"]
+DEFAULT_BUDGET = 0.25
+REPEATS = 5
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+from mlvc.MLVC import MLVC
+imported = time.perf_counter()
+MLVC()
+constructed = time.perf_counter()
+print(json.dumps({"import": imported - start, "construct": constructed - imported,
+                  "modules": [name for name in %r if name in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure():
+    # Fresh interpreter per measurement, nothing is cached in sys.modules
+    output = subprocess.check_output([sys.executable, "-c", PROBE])
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET
+    results = [measure() for _ in range(REPEATS)]
+    import_time = min(r["import"] for r in results)
+    construct_time = min(r["construct"] for r in results)
+    loaded = results[0]["modules"]
+    print("import: {:.1f} ms, construct: {:.1f} ms".format(import_time * 1000, construct_time * 1000))
+
+    failed = False
+    if loaded:
+        print("Heavy modules loaded eagerly: {}".format(", ".join(loaded)))
+        failed = True
+    if import_time + construct_time > budget:
+        print("Over budget of {:.1f} ms".format(budget * 1000))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Serialization benchmark: times every path going through
+mlvc.utils.serialization (metric log formatter, TinyDB storage, JSON files,
+API payloads) with orjson and with the standard library fallback. Run with
+`python -m tests.bench_serialization [repeats]`.
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+
+from mlvc.utils import serialization
+from mlvc.utils.log_helper import CustomJsonFormatter
+from mlvc.utils.gen_utils import write_json_to_file, read_json_from_file
+from mlvc.storage.tinydb_storage import FastJSONStorage
+
+DEFAULT_REPEATS = 5
+
+
+def make_run(i):
+    return {
+        "run_id": "{:032x}".format(i), "project_id": 1, "model_id": 1, "status": "submitted",
+        "config": {"lr": 0.001, "epochs": 100, "layers": [64, 128, 256]},
+        "results": {"loss": 0.0123, "acc": 0.98},
+        "metric_summary": {"loss": {"last": 0.01, "count": 1000, "mean": 0.2, "min": 0.01, "min_step": 999,
+                                    "max": 2.3, "max_step": 0}},
+        "logs": {"metric": {"file_name": "metric.log"}, "run": {"file_name": "run.log"}},
+    }
+
+
+def bench_log_formatter(tmp_dir):
+    formatter = CustomJsonFormatter()
+    records = [logging.LogRecord("mlvc.metric", logging.DEBUG, __file__, 0,
+                                 {"loss": 1.0 / (i + 1), "acc": i / 10000, "lr": 0.001, "epoch": i // 100},
+                                 None, None) for i in range(20000)]
+    for i, record in enumerate(records):
+        record.step = i
+    start = time.perf_counter()
+    for record in records:
+        # format() replaces record.msg, keep the dict payload for the next repeat
+        msg = record.msg
+        formatter.format(record)
+        record.msg = msg
+    return time.perf_counter() - start
+
+
+def bench_tinydb(tmp_dir):
+    storage = FastJSONStorage(os.path.join(tmp_dir, "db.json"))
+    data = {"_default": {str(i): make_run(i) for i in range(2000)}}
+    start = time.perf_counter()
+    for _ in range(10):
+        storage.write(data)
+        storage.read()
+    elapsed = time.perf_counter() - start
+    storage.close()
+    return elapsed
+
+
+def bench_json_files(tmp_dir):
+    file_path = os.path.join(tmp_dir, "data.json")
+    data = [make_run(i) for i in range(5000)]
+    start = time.perf_counter()
+    for _ in range(5):
+        write_json_to_file(data, file_path)
+        read_json_from_file(file_path)
+    return time.perf_counter() - start
+
+
+def bench_api_payloads(tmp_dir):
+    # Request body encoding and response decoding of MLVCApi.request
+    payloads = [make_run(i) for i in range(5000)]
+    start = time.perf_counter()
+    for payload in payloads:
+        serialization.loads(serialization.dumpb(payload))
+    return time.perf_counter() - start
+
+
+BENCHMARKS = [("log formatter", bench_log_formatter), ("tinydb storage", bench_tinydb),
+              ("json files", bench_json_files), ("api payloads", bench_api_payloads)]
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEATS
+    fast = serialization.orjson
+    if fast is None:
+        print("orjson is not installed, only the standard library path is measured")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, bench in BENCHMARKS:
+            times = {}
+            for label, encoder in (("stdlib", None), ("orjson", fast)):
+                if label == "orjson" and fast is None:
+                    continue
+                serialization.orjson = encoder
+                times[label] = min(bench(tmp_dir) for _ in range(repeats))
+            serialization.orjson = fast
+            line = "{:<16} stdlib {:8.1f} ms".format(name, times["stdlib"] * 1000)
+            if "orjson" in times:
+                line += "   orjson {:8.1f} ms   {:5.1f}x".format(times["orjson"] * 1000, times["stdlib"] / times["orjson"])
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
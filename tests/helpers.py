@@ -0,0 +1,90 @@
+"""
+Shared pieces of the unit tests: an isolated ~/.mlvc and a stand-in for the MLVC server.
+"""
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MLVCHomeTestCase(unittest.TestCase):
+    """
+    Points HOME to a temporary directory holding ~/.mlvc/credentials.json for the duration of a test.
+    """
+
+    def setUp(self):
+        self.home_dir = tempfile.mkdtemp(prefix="mlvc-test-")
+        self.saved_home = os.environ.get("HOME")
+        os.environ["HOME"] = self.home_dir
+        self.mlvc_dir = os.path.join(self.home_dir, ".mlvc")
+        os.makedirs(self.mlvc_dir)
+        with open(os.path.join(self.mlvc_dir, "credentials.json"), "w") as fp:
+            json.dump({"key": "test-key", "secret": "test-secret"}, fp)
+
+    def tearDown(self):
+        if self.saved_home is None:
+            del os.environ["HOME"]
+        else:
+            os.environ["HOME"] = self.saved_home
+        shutil.rmtree(self.home_dir, ignore_errors=True)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Records every request in server.requests as (method, path, headers, body)
+    and answers with server.respond(method, path, headers, body) -> (status, json).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def handle_request(self, method):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.requests.append((method, self.path, dict(self.headers), body))
+            status, response = self.server.respond(method, self.path, self.headers, body)
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+
+class StandInServer(object):
+    """
+    Local HTTP server on a free port, `respond` is called under a lock.
+    """
+
+    def __init__(self, respond):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        self.httpd.requests = []
+        self.httpd.lock = threading.Lock()
+        self.httpd.respond = respond
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.httpd.server_port)
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
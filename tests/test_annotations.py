@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+
+from tests.helpers import MLVCHomeTestCase
+
+
+class AnnotationTest(MLVCHomeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        import pandas as pd
+        from mlvc.MLVC import MLVC
+        self.mlvc = MLVC()
+        self.mlvc.set_params(1, 1)
+        self.mlvc.set_settings(output_capture="off")
+        self.run = self.mlvc.create_run(name="run")
+        self.dataframe = pd.DataFrame({"label": [0, 1, 1]})
+
+    def tearDown(self):
+        self.run.commit()
+        super().tearDown()
+
+    def test_dataframes_are_csv_by_default(self):
+        self.mlvc.add_annotation(self.dataframe, "dataframe")
+        ann_obj = self.run.get_doc()["ann"]
+        self.assertEqual((ann_obj["format"], ann_obj["file_name"]), ("csv", "data.csv"))
+        self.assertEqual(list(self.mlvc.get_annotation()["label"]), [0, 1, 1])
+
+    def test_arrow_is_opt_in_and_memory_map_is_closed(self):
+        import pyarrow as pa
+        self.mlvc.set_settings(dataframe_ann_format="arrow")
+        self.mlvc.add_annotation(self.dataframe, "dataframe")
+        self.assertEqual(self.run.get_doc()["ann"]["num_rows"], 3)
+        opened = []
+
+        def memory_map(*args):
+            opened.append(pa_memory_map(*args))
+            return opened[-1]
+
+        pa_memory_map = pa.memory_map
+        with mock.patch.object(pa, "memory_map", memory_map):
+            table = self.mlvc.get_annotation()
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+        self.assertEqual(table.column("label").to_pylist(), [0, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import threading
+import unittest
+from unittest import mock
+
+from tests.helpers import MLVCHomeTestCase
+
+
+class ArtifactTest(MLVCHomeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        from mlvc.MLVC import MLVC
+        self.mlvc = MLVC()
+        self.mlvc.set_params(1, 1)
+        self.mlvc.set_settings(output_capture="off")
+        self.run = self.mlvc.create_run(name="run")
+        self.file_path = os.path.join(self.home_dir, "model.bin")
+        with open(self.file_path, "wb") as fp:
+            fp.write(b"weights")
+
+    def tearDown(self):
+        if not self.run.committed:
+            self.run.commit()
+        super().tearDown()
+
+    def test_names_outside_the_artifacts_directory_are_rejected(self):
+        for name in ["../x", "../../../.bashrc", "/etc/passwd", "a/../../x", "."]:
+            with self.assertRaises(Exception, msg=name):
+                self.run.add_artifact(self.file_path, name=name)
+        self.assertEqual(self.run.artifact_futures, {})
+
+    def test_names_are_normalized(self):
+        artifact = self.run.add_artifact(self.file_path, name="ckpt/./last.bin").result()
+        self.assertEqual(artifact["name"], os.path.join("ckpt", "last.bin"))
+        self.assertEqual(artifact["status"], "done")
+        self.assertTrue(os.path.isfile(os.path.join(self.run.run_dir, artifact["file_name"])))
+
+    def test_commit_waits_for_artifact_being_added(self):
+        cloning = threading.Event()
+        release = threading.Event()
+
+        def slow_clone(src_path, dest_path):
+            cloning.set()
+            release.wait(10)
+            return False
+
+        with mock.patch("mlvc.run.clone_file", slow_clone):
+            adder = threading.Thread(target=self.run.add_artifact, args=(self.file_path,))
+            adder.start()
+            self.assertTrue(cloning.wait(10))
+            committer = threading.Thread(target=self.run.commit)
+            committer.start()
+            committer.join(0.3)
+            self.assertTrue(committer.is_alive())
+            release.set()
+            adder.join(10)
+            committer.join(10)
+        self.assertEqual(self.run.artifacts["model.bin"]["status"], "done")
+        run_id, run_doc = self.mlvc.get_run(self.run.run_id)
+        self.assertEqual(run_doc["artifacts"]["model.bin"]["status"], "done")
+
+    def test_reused_name_does_not_block_the_caller(self):
+        release = threading.Event()
+
+        def slow_clone(src_path, dest_path):
+            release.wait(10)
+            return False
+
+        with mock.patch("mlvc.run.clone_file", slow_clone):
+            first = self.run.add_artifact(self.file_path, name="last.bin")
+            second = self.run.add_artifact(self.file_path, name="last.bin", metadata={"epoch": 2})
+            self.assertFalse(first.done() or second.done())
+            release.set()
+            self.assertEqual(second.result(10)["metadata"], {"epoch": 2})
+        self.assertTrue(first.done())
+        self.assertEqual(self.run.artifacts["last.bin"]["metadata"], {"epoch": 2})
+
+    def test_links_are_not_copied_again(self):
+        with mock.patch("mlvc.storage.blob_store.copy_and_hash") as copy_and_hash, \
+                mock.patch("mlvc.storage.blob_store.copy_file") as copy_file:
+            artifact = self.run.add_artifact(self.file_path, link=True).result()
+        copy_and_hash.assert_not_called()
+        copy_file.assert_not_called()
+        self.assertEqual(artifact["method"], "hardlink")
+        dest_path = os.path.join(self.run.run_dir, artifact["file_name"])
+        self.assertEqual(os.stat(dest_path).st_ino, os.stat(self.file_path).st_ino)
+        self.assertEqual(self.run.get_doc()["blobs"][artifact["file_name"]], artifact["sha256"])
+
+    def test_copies_become_blobs_shared_by_later_artifacts(self):
+        with mock.patch("mlvc.run.clone_file", return_value=False):
+            first = self.run.add_artifact(self.file_path, name="a.bin").result()
+            with mock.patch("mlvc.storage.blob_store.copy_file") as copy_file:
+                second = self.run.add_artifact(self.file_path, name="b.bin").result()
+        copy_file.assert_not_called()
+        self.assertEqual((first["method"], second["method"]), ("blob", "blob"))
+        first_path, second_path = [os.path.join(self.run.run_dir, artifact["file_name"]) for artifact in (first, second)]
+        self.assertEqual(os.stat(first_path).st_ino, os.stat(second_path).st_ino)
+        with open(second_path, "rb") as fp:
+            self.assertEqual(fp.read(), b"weights")
+
+    def test_add_after_commit_fails(self):
+        self.run.commit()
+        with self.assertRaises(Exception):
+            self.run.add_artifact(self.file_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
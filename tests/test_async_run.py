@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+
+from tests.helpers import MLVCHomeTestCase
+
+
+class AsyncRunTest(MLVCHomeTestCase):
+
+    def run_async(self, fn):
+        from mlvc.MLVC import MLVC
+        from mlvc.AsyncMLVC import AsyncMLVC
+
+        async def main():
+            async with AsyncMLVC(MLVC()) as mlvc:
+                mlvc.set_params(1, 1)
+                return await fn(mlvc)
+        return asyncio.run(main())
+
+    def test_runs_do_not_capture_output_by_default(self):
+        async def create(mlvc):
+            run = await mlvc.create_run(name="run")
+            mode, owner = run.run.output_capture.mode, mlvc.mlvc.output_capture_run
+            await run.commit()
+            return mode, owner
+        self.assertEqual(self.run_async(create), ("off", None))
+
+    def test_capture_output_opt_in(self):
+        async def create(mlvc):
+            mlvc.set_settings(output_capture="python")
+            run = await mlvc.create_run(name="run", capture_output=True)
+            mode, owned = run.run.output_capture.mode, mlvc.mlvc.output_capture_run is run.run
+            await run.commit()
+            return mode, owned
+        self.assertEqual(self.run_async(create), ("python", True))
+
+    def log_on_loop(self, **settings):
+        import threading
+
+        async def log(mlvc):
+            mlvc.set_settings(**settings)
+            run = await mlvc.create_run(name="run")
+            threads = []
+            log_metric = run.run.log_metric
+            run.run.log_metric = lambda *args: threads.append(threading.current_thread()) or log_metric(*args)
+            await run.log_metric({"loss": 1.0})
+            await run.commit()
+            return threads == [threading.current_thread()]
+        return self.run_async(log)
+
+    def test_log_calls_which_may_block_are_offloaded(self):
+        self.assertFalse(self.log_on_loop(async_logging=False))
+        self.assertFalse(self.log_on_loop(async_logging=True, log_queue_full_policy="block"))
+        self.assertFalse(self.log_on_loop(async_logging=True, log_queue_full_policy="drop", metric_backend="columnar"))
+
+    def test_enqueue_only_log_calls_stay_on_the_loop(self):
+        self.assertTrue(self.log_on_loop(async_logging=True, log_queue_full_policy="drop"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+
+from tests.helpers import MLVCHomeTestCase, StandInServer
+
+
+class AsyncUploadTest(MLVCHomeTestCase):
+    """
+    AsyncMLVC goes through MLVC's upload steps, including the checks of the paths requested by the server.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.needed = []
+        self.server = StandInServer(self.respond)
+        self.addCleanup(self.server.close)
+
+    def respond(self, method, path, headers, body):
+        if method == "POST" and path.endswith("/run/"):
+            return 200, {"data": {"id": 7}}
+        if path.endswith("/sync/manifest"):
+            return 200, {"data": {"needed": self.needed}}
+        return 200, {}
+
+    def upload(self, upload_mode):
+        from mlvc.MLVC import MLVC
+        from mlvc.AsyncMLVC import AsyncMLVC
+
+        async def main():
+            async with AsyncMLVC(MLVC()) as mlvc:
+                mlvc.set_params(1, 1)
+                mlvc.set_settings(api_url=self.server.url, api_retries=0, upload_mode=upload_mode,
+                                  output_capture="off")
+                run = await mlvc.create_run(name="run")
+                await run.add_result({"acc": 1.0})
+                await run.commit()
+                await run.upload()
+                return await mlvc.get_run(run.run_id)
+        return asyncio.run(main())
+
+    def paths(self):
+        return [path.split("/run/", 1)[-1] for _, path, _, _ in self.server.requests]
+
+    def test_tarball(self):
+        run_id, run_doc = self.upload("tarball")
+        self.assertEqual(run_doc["status"], "uploaded")
+        self.assertEqual(run_doc["remote_run_id"], 7)
+        self.assertIn("7/upload", self.paths())
+
+    def test_sync_uploads_needed_files(self):
+        self.needed = ["metric.log"]
+        run_id, run_doc = self.upload("sync")
+        self.assertEqual(run_doc["status"], "uploaded")
+        self.assertIn("7/sync/upload", self.paths())
+
+    def test_sync_rejects_paths_outside_the_run(self):
+        self.needed = ["../../.mlvc/credentials.json"]
+        with self.assertRaises(Exception):
+            self.upload("sync")
+        self.assertNotIn("7/sync/upload", self.paths())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import stat
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+from mlvc.storage import blob_store
+from mlvc.storage.blob_store import BlobStore
+
+
+class BlobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.store = BlobStore(os.path.join(self.tmp_dir.name, "blobs"))
+        self.file_path = os.path.join(self.tmp_dir.name, "data.bin")
+        self.content = os.urandom(300 * 1024)
+        with open(self.file_path, "wb") as fp:
+            fp.write(self.content)
+
+    def leftovers(self):
+        return [file_name for file_name in os.listdir(self.store.blob_dir) if file_name.endswith(".tmp")]
+
+    def test_new_file_is_read_once(self):
+        with mock.patch.object(blob_store, "clone_file", return_value=False), \
+                mock.patch.object(blob_store, "copy_and_hash", wraps=blob_store.copy_and_hash) as copy, \
+                mock.patch.object(BlobStore, "hash_stream", wraps=self.store.hash_stream) as hash_stream:
+            digest = self.store.put_file(self.file_path)
+        self.assertEqual(digest, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(copy.call_count, 1)
+        self.assertEqual(hash_stream.call_count, 0)
+        blob_path = self.store.blob_path(digest)
+        with open(blob_path, "rb") as fp:
+            self.assertEqual(fp.read(), self.content)
+        self.assertFalse(os.stat(blob_path).st_mode & stat.S_IWUSR)
+        self.assertEqual(self.leftovers(), [])
+
+    def test_known_content_is_not_copied_again(self):
+        digest = self.store.put_file(self.file_path)
+        with mock.patch.object(blob_store, "copy_and_hash") as copy, mock.patch.object(blob_store, "clone_file") as clone:
+            self.assertEqual(self.store.put_file(self.file_path), digest)
+        copy.assert_not_called()
+        clone.assert_not_called()
+
+    def test_same_content_in_another_file(self):
+        digest = self.store.put_file(self.file_path)
+        other_path = os.path.join(self.tmp_dir.name, "other.bin")
+        with open(other_path, "wb") as fp:
+            fp.write(self.content)
+        self.assertEqual(self.store.put_file(other_path), digest)
+        self.assertEqual(self.store.hash_file(other_path), digest)
+        self.assertEqual(self.leftovers(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
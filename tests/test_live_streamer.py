@@ -0,0 +1,74 @@
+import os
+import gzip
+import json
+import time
+import unittest
+
+from tests.helpers import MLVCHomeTestCase, StandInServer
+from mlvc.modules.live.live_streamer import LiveStreamer
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+class LiveStreamerSpoolTest(MLVCHomeTestCase):
+    """
+    Batches are spooled while the server is down and drain in `seq` order once it is back.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.server_up = False
+        self.received = []
+        self.server = StandInServer(self.respond)
+        self.addCleanup(self.server.close)
+
+    def respond(self, method, path, headers, body):
+        if not self.server_up:
+            return 503, {}
+        self.received.append((int(path.rsplit("/", 1)[-1]), json.loads(gzip.decompress(body))))
+        return 200, {}
+
+    def test_spooled_batches_drain_in_order(self):
+        from mlvc.mlvc_api import MLVCApi
+        from mlvc.config.settings import load_settings
+
+        api = MLVCApi(dict(load_settings(), api_url=self.server.url, api_retries=0))
+        spool_dir = os.path.join(self.home_dir, "spool")
+        streamer = LiveStreamer(lambda seq, body: api.send_live_batch(1, 1, "remote", seq, body), spool_dir,
+                                batch_size=1, flush_interval=0.01, retry_backoff=0.01, max_backoff=0.05)
+        streamer.start()
+        for step in range(5):
+            streamer.add_metric({"loss": float(step)}, step)
+        wait_until(lambda: streamer.stats["spooled_batches"] == 5)
+        self.assertEqual(len(os.listdir(spool_dir)), 5)
+        self.assertEqual(self.received, [])
+
+        self.server_up = True
+        streamer.add_metric({"loss": 5.0}, 5)
+        wait_until(lambda: len(self.received) == 6)
+        stats = streamer.stop(timeout=10)
+        seqs = [seq for seq, _ in self.received]
+        self.assertEqual(seqs, list(range(6)))
+        self.assertEqual([batch["records"][0]["step"] for _, batch in self.received], list(range(6)))
+        self.assertEqual(stats["spooled"], 0)
+        self.assertFalse(os.path.exists(spool_dir))
+
+    def test_spool_of_a_stopped_process_is_recovered(self):
+        spool_dir = os.path.join(self.home_dir, "spool")
+        os.makedirs(spool_dir)
+        for file_name in ("000000000003.json.gz", "000000000004.json.gz.tmp"):
+            with open(os.path.join(spool_dir, file_name), "wb") as fp:
+                fp.write(gzip.compress(b"{}"))
+        streamer = LiveStreamer(lambda seq, body: None, spool_dir)
+        self.assertEqual(os.listdir(spool_dir), ["000000000003.json.gz"])
+        self.assertEqual(streamer.next_seq, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from array import array
+from unittest import mock
+
+import numpy as np
+
+from mlvc.modules.metrics import metric_store
+from mlvc.modules.metrics.metric_store import ColumnarMetricStore
+
+
+class MetricStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.store = ColumnarMetricStore(self.tmp_dir.name)
+
+    def test_series_round_trip(self):
+        self.store.append({"loss": 0.5, "name": "x"}, 0, timestamp=10.0)
+        self.store.append_batch({"loss": np.array([0.25, np.nan, 0.125])}, [1, 2, 3], timestamp=11.0)
+        self.store.close()
+        self.assertEqual(list(self.store.iter_series("loss")), [(0, 10.0, 0.5), (1, 11.0, 0.25), (3, 11.0, 0.125)])
+        series = self.store.get_series("loss")
+        self.assertEqual(series["step"].tolist(), [0, 1, 3])
+        self.assertEqual(series["value"].tolist(), [0.5, 0.25, 0.125])
+
+    def test_files_are_little_endian_on_big_endian_hosts(self):
+        # Swapping on write is what a big-endian host does, the files must hold the little-endian encoding
+        with mock.patch.object(metric_store, "SWAP_BYTES", True):
+            self.store.append({"loss": 0.5}, 1, timestamp=10.0)
+            self.store.close()
+            self.assertEqual(list(self.store.iter_series("loss")), [(1, 10.0, 0.5)])
+        with open(self.store.column_file_path("loss", "step"), "rb") as fp:
+            data = fp.read()
+        swapped = array("q", [1])
+        swapped.byteswap()
+        self.assertEqual(data, swapped.tobytes())
+        self.assertEqual(os.path.getsize(self.store.column_file_path("loss", "value")), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
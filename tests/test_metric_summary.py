@@ -0,0 +1,98 @@
+import os
+import math
+import logging
+import tempfile
+import unittest
+
+import numpy as np
+
+from mlvc.modules.metrics.metric_summary import MetricSummary
+from mlvc.modules.metrics.distribution import describe_distribution
+from mlvc.utils.log_helper import make_logger, remove_logger
+
+COLUMNS = {
+    "loss": [0.5, float("nan"), 0.25, 2.0, 0.75],
+    "acc": ["0.9", "n/a", 0.95, True, 1],
+    "flag": [True, False, True, True, False],
+    "epoch": [1, 1, 2, 2, 3],
+    "mixed": [1.0, True, 2.0, False, 0.5],
+}
+STEPS = [10, 3, 7, 12, 11]
+
+
+def per_row_summary(columns, steps):
+    metric_summary = MetricSummary()
+    for i, step in enumerate(steps):
+        metric_summary.update({key: values[i] for key, values in columns.items()}, step)
+    return metric_summary
+
+
+def assert_summaries_equal(test, summary, expected):
+    test.assertEqual(set(summary), set(expected))
+    for key, expected_stats in expected.items():
+        for stat, expected_val in expected_stats.items():
+            val = summary[key][stat]
+            if isinstance(expected_val, float) and math.isnan(expected_val):
+                test.assertTrue(math.isnan(val), (key, stat))
+            elif isinstance(expected_val, float):
+                test.assertAlmostEqual(val, expected_val, msg=(key, stat))
+            else:
+                test.assertEqual(val, expected_val, (key, stat))
+
+
+class BatchSummaryTest(unittest.TestCase):
+
+    def test_batch_matches_per_row_updates(self):
+        expected = per_row_summary(COLUMNS, STEPS)
+        metric_summary = MetricSummary()
+        self.assertEqual(metric_summary.update_batch(COLUMNS, STEPS), STEPS)
+        assert_summaries_equal(self, metric_summary.get_summary(), expected.get_summary())
+        self.assertEqual(metric_summary.next_step, expected.next_step)
+
+    def test_numpy_columns_match_per_row_updates(self):
+        columns = {"loss": np.array(COLUMNS["loss"]), "flag": np.array(COLUMNS["flag"]),
+                   "epoch": np.array(COLUMNS["epoch"], dtype=np.int32)}
+        expected = per_row_summary({key: values.tolist() for key, values in columns.items()}, STEPS)
+        metric_summary = MetricSummary()
+        metric_summary.update_batch(columns, STEPS)
+        assert_summaries_equal(self, metric_summary.get_summary(), expected.get_summary())
+
+    def test_default_steps_follow_previous_rows(self):
+        metric_summary = MetricSummary()
+        metric_summary.update({"loss": 1.0})
+        self.assertEqual(metric_summary.update_batch({"loss": [0.5, 0.25]}), [1, 2])
+
+    def test_rejects_2d_columns(self):
+        metric_summary = MetricSummary()
+        with self.assertRaises(Exception):
+            metric_summary.update_batch({"loss": np.zeros((2, 3))}, [0, 1])
+        with self.assertRaises(Exception):
+            MetricSummary.to_float_array([[1.0, 2.0], [3.0, 4.0]])
+        self.assertEqual(metric_summary.get_summary(), {})
+
+
+class LogReplayTest(unittest.TestCase):
+
+    def test_from_log_file_replays_rows_batches_and_distributions(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_file_path = os.path.join(tmp_dir, "metric.log")
+            logger = make_logger("mlvc.test.replay", logging.DEBUG, log_file_path)
+            expected = MetricSummary()
+
+            step = expected.update({"loss": 3.0, "acc": "0.5"})
+            logger.debug({"loss": 3.0, "acc": "0.5"}, extra={"step": step})
+            steps = expected.update_batch(COLUMNS, STEPS)
+            logger.debug(COLUMNS, extra={"steps": steps})
+            distributions = {"weights": describe_distribution(np.arange(100.0), 8)}
+            expected.update_distribution("weights", distributions["weights"], 13)
+            logger.debug(distributions, extra={"step": 13, "kind": "distribution"})
+            remove_logger(logger)
+
+            replayed = MetricSummary.from_log_file(log_file_path)
+        assert_summaries_equal(self, replayed.get_summary(), expected.get_summary())
+        self.assertEqual(replayed.next_step, expected.next_step)
+        self.assertEqual(replayed.get_summary()["weights"]["distribution"]["step"], 13)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import logging
+import unittest
+
+from tests.helpers import MLVCHomeTestCase
+
+
+class RunLifecycleTest(MLVCHomeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        from mlvc.MLVC import MLVC
+        self.mlvc = MLVC()
+        self.mlvc.set_params(1, 1)
+        self.mlvc.set_settings(output_capture="python")
+
+    def run_loggers(self, run):
+        prefix = "mlvc.{}".format(run.run_id)
+        return [name for name in logging.Logger.manager.loggerDict if name.startswith(prefix)]
+
+    def test_loggers_are_forgotten_on_commit(self):
+        run = self.mlvc.create_run(name="run")
+        run.log_metric({"loss": 1.0})
+        self.assertTrue(self.run_loggers(run))
+        run.commit()
+        self.assertEqual(self.run_loggers(run), [])
+
+    def test_system_stats_overhead_and_history_are_kept(self):
+        from mlvc.utils.gen_utils import read_json_from_file
+        run = self.mlvc.create_run(name="run")
+        run.system_stats.add_sample(run.system_stats.sample())
+        run.commit()
+        profile = run.get_doc()["profile"]
+        self.assertIn("cpu_time", profile["system_stats_overhead"])
+        history = read_json_from_file(os.path.join(run.run_dir, profile["file_name"]))["system_stats_history"]
+        self.assertGreaterEqual(len(history), 1)
+
+    def test_dropped_log_records_are_reported(self):
+        self.mlvc.set_settings(async_logging=True, log_queue_full_policy="drop")
+        run = self.mlvc.create_run(name="run")
+        run.run_logger.handlers[0].dropped = 3
+        with self.assertWarns(RuntimeWarning):
+            run.commit()
+        logs = run.get_doc()["logs"]
+        self.assertEqual(logs["run"]["dropped"], 3)
+        self.assertNotIn("dropped", logs["metric"])
+
+    def test_first_active_run_captures_output(self):
+        first = self.mlvc.create_run(name="first")
+        second = self.mlvc.create_run(name="second")
+        self.assertEqual((first.output_capture.mode, second.output_capture.mode), ("python", "off"))
+        first.commit()
+        third = self.mlvc.create_run(name="third")
+        self.assertEqual(third.output_capture.mode, "python")
+        third.commit()
+        second.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
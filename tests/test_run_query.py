@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from mlvc.storage.run_query import match_filters, index_equals
+from mlvc.storage.tinydb_storage import FastJSONStorage, TinyDBRunStorage
+from mlvc.storage.sqlite_storage import SQLiteRunStorage
+
+
+def make_run(i, project_id=1):
+    return {"run_id": "run{}".format(i), "project_id": project_id, "model_id": 1, "status": "submitted",
+            "config": {"lr": 0.1 * i}}
+
+
+class MatchFiltersTest(unittest.TestCase):
+
+    def test_equality_is_numeric(self):
+        doc = {"config": {"lr": 0.9, "name": "a"}, "project_id": "1"}
+        self.assertTrue(match_filters(doc, {"config.lr": "0.9"}))
+        self.assertTrue(match_filters(doc, {"config.lr": ("==", "9e-1")}))
+        self.assertFalse(match_filters(doc, {"config.lr": ("!=", "0.9")}))
+        self.assertTrue(match_filters(doc, {"project_id": 1}))
+        self.assertTrue(match_filters(doc, {"config.name": "a"}))
+        self.assertTrue(match_filters(doc, {"config.name": ("!=", "b")}))
+
+    def test_index_lookups(self):
+        fields = TinyDBRunStorage.INDEXED_FIELDS
+        self.assertEqual(index_equals({"project_id": 1, "status": "submitted", "run_id": ("==", "abc"),
+                                       "config.lr": 0.1, "model_id": (">", 1)}, fields),
+                         {"project_id": 1, "status": "submitted", "run_id": "abc"})
+        self.assertEqual(index_equals({"run_id": "1e5"}, fields), {})
+
+
+class TinyDBRunStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.file_path = os.path.join(self.tmp_dir.name, "mlvc.json")
+        self.storage = TinyDBRunStorage(self.file_path)
+        self.addCleanup(self.storage.close)
+        for i in range(5):
+            self.storage.insert_run(make_run(i, project_id=1 if i % 2 else "2"))
+
+    def count_reads(self):
+        return mock.patch.object(FastJSONStorage, "read", autospec=True, side_effect=FastJSONStorage.read)
+
+    def test_indexed_lookups_do_not_read_the_file(self):
+        with self.count_reads() as read:
+            self.assertEqual(self.storage.get_run("run3")["config"]["lr"], 0.1 * 3)
+            self.assertEqual([run["run_id"] for run in self.storage.find_runs({"status": "submitted",
+                                                                               "project_id": "2"})],
+                             ["run0", "run2", "run4"])
+        self.assertEqual(read.call_count, 0)
+
+    def test_numbers_are_looked_up_numerically(self):
+        with mock.patch.object(self.storage.db, "all") as scan:
+            self.assertEqual([run["run_id"] for run in self.storage.find_runs({"project_id": 2, "model_id": "1"})],
+                             ["run0", "run2", "run4"])
+            self.assertEqual([run["run_id"] for run in self.storage.find_runs({"project_id": "1.0"})],
+                             ["run1", "run3"])
+        scan.assert_not_called()
+
+    def test_returned_documents_are_copies(self):
+        self.storage.get_run("run1")["config"]["lr"] = 100
+        self.assertEqual(self.storage.get_run("run1")["config"]["lr"], 0.1)
+
+    def test_updates_are_seen(self):
+        self.storage.update_run("run1", {"status": "uploaded"})
+        self.storage.update_run("run1", lambda doc: doc["config"].update(lr=0.5))
+        self.assertEqual(self.storage.get_run("run1")["config"]["lr"], 0.5)
+        self.assertEqual([run["run_id"] for run in self.storage.find_runs({"status": "uploaded"})], ["run1"])
+        reopened = TinyDBRunStorage(self.file_path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get_run("run1"), self.storage.get_run("run1"))
+
+    def test_changes_by_another_process_are_read_once(self):
+        other = TinyDBRunStorage(self.file_path)
+        self.addCleanup(other.close)
+        other.update_run("run2", {"status": "uploaded"})
+        with self.count_reads() as read:
+            self.assertEqual(self.storage.get_run("run2")["status"], "uploaded")
+            self.storage.get_run("run4")
+        self.assertEqual(read.call_count, 1)
+
+
+class SQLiteRunStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.file_path = os.path.join(self.tmp_dir.name, "mlvc.db")
+
+    def open_storage(self):
+        storage = SQLiteRunStorage(self.file_path)
+        self.addCleanup(storage.close)
+        return storage
+
+    def test_numbers_are_looked_up_numerically(self):
+        storage = self.open_storage()
+        for i in range(4):
+            storage.insert_run(make_run(i, project_id=1 if i % 2 else "2"))
+        self.assertEqual([run["run_id"] for run in storage.find_runs({"project_id": 2, "model_id": "1"})],
+                         ["run0", "run2"])
+        self.assertEqual([run["run_id"] for run in storage.find_runs({"project_id": "1", "status": "submitted"})],
+                         ["run1", "run3"])
+        self.assertEqual(storage.get_run("run0")["project_id"], "2")
+        plan = storage.conn.execute("EXPLAIN QUERY PLAN SELECT doc FROM runs WHERE project_id = ? AND model_id = ?",
+                                    (2.0, 1.0)).fetchall()
+        self.assertIn("runs_project_model", str(plan))
+
+    def test_existing_rows_are_normalized_once(self):
+        storage = self.open_storage()
+        storage.conn.execute("INSERT INTO runs (run_id, project_id, model_id, status, config, results, doc) "
+                             "VALUES ('old', '3', 1, 'submitted', '{}', '{}', ?)",
+                             ('{"run_id": "old", "project_id": "3", "model_id": 1, "status": "submitted"}',))
+        storage.conn.execute("DELETE FROM meta WHERE key = 'index_keys'")
+        storage.close()
+        reopened = self.open_storage()
+        self.assertEqual([run["run_id"] for run in reopened.find_runs({"project_id": 3, "model_id": 1})], ["old"])
+
+
+if __name__ == "__main__":
+    unittest.main()
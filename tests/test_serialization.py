@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from mlvc.utils import serialization
+
+
+class SerializationTest(unittest.TestCase):
+
+    def dumps_both(self, obj):
+        """
+        dumps of `obj` with orjson and with the standard library fallback.
+        """
+        fast = serialization.orjson
+        try:
+            serialization.orjson = None
+            stdlib = serialization.dumps(obj)
+        finally:
+            serialization.orjson = fast
+        return serialization.dumps(obj), stdlib
+
+    def test_non_finite_floats_are_null(self):
+        obj = {"nan": float("nan"), "inf": [float("inf"), -float("inf")], "x": (1.5, {"y": float("nan")})}
+        expected = {"nan": None, "inf": [None, None], "x": [1.5, {"y": None}]}
+        for encoded in self.dumps_both(obj):
+            self.assertEqual(serialization.loads(encoded), expected)
+
+    def test_fallback_for_big_integers_matches(self):
+        # orjson rejects integers above 64 bits, the whole object goes through the standard library
+        obj = {"a": float("nan"), "b": 2 ** 70}
+        self.assertEqual(serialization.loads(serialization.dumps(obj)), {"a": None, "b": 2 ** 70})
+        self.assertEqual(serialization.dumpb(obj), serialization.dumps(obj).encode("utf-8"))
+
+    def test_numpy_values(self):
+        obj = {"arr": np.array([1.0, np.nan]), "f32": np.float32(np.inf), "f64": np.float64(np.nan),
+               "i": np.int64(3)}
+        for encoded in self.dumps_both(obj):
+            self.assertEqual(serialization.loads(encoded), {"arr": [1.0, None], "f32": None, "f64": None, "i": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import sys
+import types
+import tempfile
+import unittest
+from unittest import mock
+
+from mlvc.modules.distributed.shards import (exchange_shards, get_rank_info, get_shard_dir, resolve_run_id,
+                                             wait_for_shards)
+from tests.helpers import MLVCHomeTestCase
+
+
+class FakeDistributed(object):
+    """
+    Stands in for torch.distributed with an initialized process group, gather_object returns `gathered` on rank 0.
+    """
+
+    def __init__(self, gathered=None):
+        self.gathered = gathered
+        self.sent = []
+
+    def is_available(self):
+        return True
+
+    def is_initialized(self):
+        return True
+
+    def gather_object(self, obj, object_gather_list=None, dst=0):
+        self.sent.append(obj)
+        if object_gather_list is not None:
+            object_gather_list[:] = self.gathered
+
+
+def fake_torch(dist):
+    return mock.patch.dict(sys.modules, {"torch": types.SimpleNamespace(distributed=dist)})
+
+
+class RankInfoTest(unittest.TestCase):
+
+    def test_plain_srun_step_is_not_distributed(self):
+        with mock.patch.dict(os.environ, {"SLURM_PROCID": "2", "SLURM_NTASKS": "4", "SLURM_JOB_ID": "1"}, clear=True):
+            self.assertEqual(get_rank_info(), (0, 1))
+
+    def test_slurm_with_rendezvous_address(self):
+        with mock.patch.dict(os.environ, {"SLURM_PROCID": "2", "SLURM_NTASKS": "4", "MASTER_ADDR": "node1"},
+                             clear=True):
+            self.assertEqual(get_rank_info(), (2, 4))
+
+    def test_torchrun(self):
+        with mock.patch.dict(os.environ, {"RANK": "1", "WORLD_SIZE": "2"}, clear=True):
+            self.assertEqual(get_rank_info(), (1, 2))
+
+
+class ExchangeShardsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        # Two nodes: rank 1 does not see rank 0's run directory
+        self.run_dirs = [os.path.join(self.tmp_dir.name, "node{}".format(rank), "run") for rank in range(2)]
+        for rank, run_dir in enumerate(self.run_dirs):
+            os.makedirs(get_shard_dir(run_dir, rank))
+        with open(os.path.join(get_shard_dir(self.run_dirs[1], 1), "metric.log"), "w") as fp:
+            fp.write('{"timestamp": "1", "loss": 1.0}\n')
+        self.env = mock.patch.dict(os.environ, {}, clear=True)
+        self.env.start()
+        self.addCleanup(self.env.stop)
+
+    def test_rank_without_shared_filesystem_fails(self):
+        with self.assertRaises(Exception):
+            exchange_shards(self.run_dirs[1], "run", 1, 2, {"rank": 1}, timeout=0)
+
+    def test_rank_zero_does_not_merge_partial_results(self):
+        with self.assertRaises(Exception):
+            wait_for_shards(self.run_dirs[0], 2, timeout=0)
+
+    def test_logs_travel_with_the_shard_over_torch_distributed(self):
+        dist = FakeDistributed()
+        with fake_torch(dist):
+            self.assertEqual(exchange_shards(self.run_dirs[1], "run", 1, 2, {"rank": 1}, timeout=0), {})
+        sent = dist.sent[0]
+        self.assertFalse(sent["shared_fs"])
+        self.assertIn("loss", sent["files"]["metric.log"])
+
+        dist = FakeDistributed([{"rank": 0}, sent])
+        with fake_torch(dist):
+            received = exchange_shards(self.run_dirs[0], "run", 0, 2, {"rank": 0}, timeout=0)
+        self.assertEqual(sorted(received), [0, 1])
+        self.assertNotIn("files", received[1])
+        with open(os.path.join(get_shard_dir(self.run_dirs[0], 1), "metric.log")) as fp:
+            self.assertIn("loss", fp.read())
+
+
+class ResolveRunIdTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.env = mock.patch.dict(os.environ, {"MASTER_ADDR": "node1", "MASTER_PORT": "29500"}, clear=True)
+        self.env.start()
+        self.addCleanup(self.env.stop)
+
+    def test_launcher_run_id_is_used(self):
+        os.environ["MLVC_RUN_ID"] = "launched"
+        self.assertEqual(resolve_run_id(0, self.tmp_dir.name), "launched")
+        self.assertEqual(resolve_run_id(0, self.tmp_dir.name), "launched")
+
+    def test_exported_run_id_is_not_reused_by_the_next_run(self):
+        first = resolve_run_id(0, self.tmp_dir.name)
+        self.assertEqual(os.environ["MLVC_RUN_ID"], first)
+        second = resolve_run_id(0, self.tmp_dir.name)
+        self.assertNotEqual(first, second)
+        self.assertEqual(os.environ["MLVC_RUN_ID"], second)
+
+
+class RankRunTest(MLVCHomeTestCase):
+
+    def test_stale_shard_is_removed_when_the_run_starts(self):
+        from mlvc.MLVC import MLVC
+        run_dir = os.path.join(self.mlvc_dir, "launched")
+        shard_dir = get_shard_dir(run_dir, 1)
+        os.makedirs(shard_dir)
+        # Rank 0's directory, seen by rank 1 on a shared filesystem
+        os.makedirs(get_shard_dir(run_dir, 0))
+        with open(os.path.join(shard_dir, "shard.json"), "w") as fp:
+            fp.write('{"rank": 1}')
+        with mock.patch.dict(os.environ, {"RANK": "1", "WORLD_SIZE": "2", "MLVC_RUN_ID": "launched"}):
+            mlvc = MLVC()
+            mlvc.set_params(1, 1)
+            mlvc.set_settings(output_capture="off")
+            run = mlvc.create_run(name="run")
+            self.assertFalse(os.path.exists(os.path.join(shard_dir, "shard.json")))
+            run.commit()
+        self.assertTrue(os.path.exists(os.path.join(shard_dir, "shard.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+from tests.helpers import MLVCHomeTestCase, StandInServer
+from mlvc.storage.manifest import check_rel_path, filter_needed_paths
+from mlvc.utils.archive_utils import make_files_archive
+
+
+class NeededPathsTest(unittest.TestCase):
+
+    def test_keeps_manifest_paths_only(self):
+        manifest = {"code/a.py": {}, "metric.log": {}}
+        self.assertEqual(filter_needed_paths(["metric.log", "other.txt", "code/a.py"], manifest),
+                         ["metric.log", "code/a.py"])
+
+    def test_rejects_escaping_paths(self):
+        for rel_path in ["../../.ssh/id_rsa", "/etc/passwd", "code/../../x", "..", "", "\\\\host\\share"]:
+            with self.assertRaises(Exception):
+                check_rel_path(rel_path)
+
+    def test_archive_rejects_escaping_paths(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(Exception):
+                make_files_archive(os.path.join(tmp_dir, "out.tar.gz"), tmp_dir, ["../secret"])
+
+
+class SyncRunFilesTest(MLVCHomeTestCase):
+
+    def sync(self, needed):
+        from mlvc.mlvc_api import MLVCApi
+        from mlvc.config.settings import load_settings
+
+        server = StandInServer(lambda method, path, headers, body: (200, {"data": {"needed": needed}}))
+        self.addCleanup(server.close)
+        settings = dict(load_settings(), api_url=server.url, api_retries=0)
+        archived = []
+        MLVCApi(settings).sync_run_files(1, 1, "remote", {"metric.log": {"size": 1, "sha256": "x"}},
+                                         lambda rel_paths: archived.append(rel_paths))
+        return archived
+
+    def test_server_cannot_request_local_files(self):
+        with self.assertRaises(Exception):
+            self.sync(["metric.log", "../../.ssh/id_rsa"])
+
+    def test_unknown_paths_are_ignored(self):
+        self.assertEqual(self.sync(["not-in-manifest.txt"]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import sys
+import time
+import subprocess
+import unittest
+
+from mlvc.modules.system.system_stats import SystemStats
+
+
+class SystemStatsTest(unittest.TestCase):
+
+    def test_cpu_time_includes_exited_children(self):
+        cpu_start = SystemStats.get_cpu_time()
+        subprocess.run([sys.executable, "-c", "import time\nend = time.process_time() + 0.3\n"
+                                              "while time.process_time() < end: pass"], check=True)
+        self.assertGreater(SystemStats.get_cpu_time() - cpu_start, 0.2)
+
+    def test_overhead_follows_recent_samples(self):
+        system_stats = SystemStats(process_metrics=False)
+        for _ in range(10):
+            system_stats.update_overhead(0.5, 1.0)
+        for _ in range(10):
+            system_stats.update_overhead(0.0, 1.0)
+        overhead = system_stats.get_overhead()
+        self.assertEqual(overhead["cpu_time"], 5.0)
+        self.assertLess(overhead["overhead"], 0.1)
+
+    def test_history_covers_evicted_and_buffered_samples(self):
+        system_stats = SystemStats(buffer_size=4, downsample=2, process_metrics=False)
+        for i in range(9):
+            system_stats.add_sample({"timestamp": float(i), "cpu": {"percentage": i, "memory": 1.0}, "gpu": []})
+        history = system_stats.get_history()
+        self.assertEqual([averaged["num_samples"] for averaged in history], [2, 2, 1, 2, 2])
+        self.assertEqual([averaged["cpu"]["percentage"] for averaged in history], [0.5, 2.5, 4, 5.5, 7.5])
+        self.assertEqual([averaged["timestamp"] for averaged in system_stats.get_history(since=5.0)], [6.0, 8.0])
+
+    def test_failing_listener_does_not_stop_sampling(self):
+        samples = []
+
+        def failing_listener(system_stats):
+            raise ValueError("listener failed")
+
+        system_stats = SystemStats(interval=0.01, process_metrics=False)
+        system_stats.add_listener(failing_listener)
+        system_stats.add_listener(samples.append)
+        system_stats.start()
+        deadline = time.time() + 10
+        while len(samples) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        alive = system_stats.is_alive()
+        system_stats.stop()
+        self.assertTrue(alive)
+        self.assertGreaterEqual(len(samples), 3)
+        self.assertGreaterEqual(system_stats.get_overhead()["listener_errors"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
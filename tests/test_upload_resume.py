@@ -0,0 +1,64 @@
+import os
+import unittest
+
+from tests.helpers import MLVCHomeTestCase, StandInServer
+from mlvc.utils.archive_utils import iter_tar_gz_chunks
+
+
+class UploadResumeTest(MLVCHomeTestCase):
+    """
+    An interrupted streamed upload resumes from the offset the server reports.
+    """
+
+    CHUNK_SIZE = 4096
+
+    def setUp(self):
+        super().setUp()
+        self.received = bytearray()
+        self.complete = False
+        self.fail_chunk = 3
+        self.chunk_offsets = []
+        self.server = StandInServer(self.respond)
+        self.addCleanup(self.server.close)
+
+        self.run_dir = os.path.join(self.home_dir, "run")
+        os.makedirs(self.run_dir)
+        for i in range(4):
+            with open(os.path.join(self.run_dir, "data{}.bin".format(i)), "wb") as fp:
+                fp.write(os.urandom(16 * 1024))
+
+    def respond(self, method, path, headers, body):
+        if path.endswith("/upload/status"):
+            return 200, {"data": {"offset": len(self.received), "complete": self.complete}}
+        offset = int(headers["X-Upload-Offset"])
+        self.chunk_offsets.append(offset)
+        if len(self.chunk_offsets) == self.fail_chunk:
+            # The connection drops once, in the middle of the stream
+            self.fail_chunk = None
+            return 503, {}
+        if offset != len(self.received):
+            return 409, {}
+        self.received += body
+        self.complete = headers["X-Upload-Final"] == "1"
+        return 200, {}
+
+    def test_resume_from_server_offset(self):
+        from mlvc.mlvc_api import MLVCApi
+        from mlvc.config.settings import load_settings
+
+        api = MLVCApi(dict(load_settings(), api_url=self.server.url, api_retries=0))
+        with self.assertRaises(Exception):
+            api.upload_run_stream(1, 1, "remote", iter_tar_gz_chunks(self.run_dir, self.CHUNK_SIZE))
+        interrupted_at = len(self.received)
+        self.assertEqual(interrupted_at, 2 * self.CHUNK_SIZE)
+        self.assertFalse(self.complete)
+
+        del self.chunk_offsets[:]
+        api.upload_run_stream(1, 1, "remote", iter_tar_gz_chunks(self.run_dir, self.CHUNK_SIZE))
+        self.assertEqual(self.chunk_offsets[0], interrupted_at)
+        self.assertTrue(self.complete)
+        self.assertEqual(bytes(self.received), b"".join(iter_tar_gz_chunks(self.run_dir, self.CHUNK_SIZE)))
+
+
+if __name__ == "__main__":
+    unittest.main()